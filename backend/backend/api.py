@@ -2,12 +2,13 @@
 后端 API 服务
 使用 FastAPI 框架，后续接入 Seedance 1.0 Fast
 """
-from fastapi import FastAPI, HTTPException, Header, UploadFile, File
+from fastapi import FastAPI, HTTPException, Header, UploadFile, File, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 import httpx
+import asyncio
 import os
 import sys
 from pathlib import Path
@@ -17,15 +18,37 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import (
     API_KEY, SEEDANCE_API_ENDPOINT, DEFAULT_VIDEO_SETTINGS,
     VOLCENGINE_ACCESS_KEY_ID, VOLCENGINE_SECRET_ACCESS_KEY, JIMENG_API_ENDPOINT,
-    JIMENG_VIDEO_VERSION, JIMENG_V35_PRO_REQ_KEYS
+    JIMENG_VIDEO_VERSION, JIMENG_V35_PRO_REQ_KEYS, FIRST_FRAME_MAX_BYTES,
+    FIRST_FRAME_NORMALIZE, RAG_WARMUP, BATCH_MAX_ITEMS, BATCH_CONCURRENCY,
+    STATUS_STREAM_HEARTBEAT_SECONDS, STATUS_STREAM_RETRY_MS, STATUS_STREAM_MAX_TASKS,
+    STATUS_LONG_POLL_MAX_WAIT_SECONDS, STATUS_BATCH_MAX_TASKS
 )
 from backend.assets_api import (
     upload_asset, get_assets_by_character, delete_asset, 
     get_asset_path, AssetMetadata
 )
 from backend.volcengine_auth import generate_signature, generate_simple_signature
-from backend.volcengine_sdk_helper import create_visual_service, submit_video_task
+from backend.frame_codec import decode_base64_frame, FrameDecodeError
+from backend.frame_store import frame_store, is_valid_frame_id, frame_mime_type, FRAMES_ROUTE
+from backend.frame_pipeline import normalize_frame, get_cache_stats as get_frame_cache_stats
+from backend.prompt_enhancer import prompt_enhancer
+from backend.idempotency import submission_deduplicator, content_fingerprint, frame_digest
+from backend.jimeng_client import extract_task_id
+from backend.write_behind import generation_writer
+from backend.status_tracker import status_tracker, TaskState, not_found_response, STATUS_NOT_FOUND
+from backend.status_cache import status_cache
+from backend.archiver import video_archiver
+from backend.multipart_upload import multipart_uploader
+from backend.storage_executor import storage_executor
+from backend.storage import storage_registry
+from backend.timeout_sweeper import timeout_sweeper
+from backend.task_events import task_events, TooManyConnectionsError
+from backend.submission_scheduler import (
+    submission_scheduler, QueueFullError, TICKET_SUBMITTED, TICKET_FAILED
+)
+from backend.client_registry import get_jimeng_client, close_all_clients, get_registry_stats
 from backend.api_history import router as history_router
+from backend.database import get_session_stats, ensure_schema
 import json
 
 app = FastAPI(title="视频生成 API", version="1.0.0")
@@ -102,11 +125,22 @@ class VideoGenerationRequest(BaseModel):
     negative_prompt: Optional[str] = None
     api_key: Optional[str] = None  # 前端传入的 API Key
     first_frame: Optional[str] = None  # 首帧图片（base64 或 URL）
+    first_frame_id: Optional[str] = None  # 已通过 /api/v1/frames 上传的首帧 ID（优先于 first_frame）
     last_frame: Optional[str] = None  # 尾帧图片（base64 或 URL）
     resolution: Optional[str] = "1080p"  # 分辨率：仅支持 1080p（3.5pro要求）
     version: Optional[str] = "3.5pro"  # 版本：仅支持 3.5pro
 
 
+class BatchGenerationRequest(BaseModel):
+    """批量视频生成请求模型"""
+    items: List[VideoGenerationRequest]
+
+
+class StatusBatchRequest(BaseModel):
+    """批量状态查询请求模型"""
+    task_ids: List[str]
+
+
 class VideoGenerationResponse(BaseModel):
     """视频生成响应模型"""
     success: bool
@@ -114,6 +148,82 @@ class VideoGenerationResponse(BaseModel):
     video_url: Optional[str] = None
     message: str
     error: Optional[str] = None
+    deduplicated: Optional[bool] = None  # 是否为重复请求（返回的是首次提交的结果）
+    status: Optional[str] = None  # queued：并发已满，任务在本地队列中等待提交
+    ticket_id: Optional[str] = None  # 排队票据 ID（通过 /api/v1/video/queue/{ticket_id} 查询）
+    queue_position: Optional[int] = None  # 队列中的位置（从 1 开始）
+
+
+def calculate_frames(duration: Optional[int], fps: Optional[int]) -> int:
+    """
+    计算 frames（总帧数）
+    根据文档：frames = 24 * n + 1，支持 5秒(121帧) 和 10秒(241帧)
+    """
+    calculated_frames = (duration or DEFAULT_VIDEO_SETTINGS["duration"]) * (fps or DEFAULT_VIDEO_SETTINGS["fps"])
+    if calculated_frames <= 121:
+        return 121  # 5秒
+    return 241  # 10秒
+
+
+def submission_key(
+    request: VideoGenerationRequest,
+    x_api_key: Optional[str],
+    idempotency_key: Optional[str],
+    client_host: Optional[str] = None
+) -> Optional[str]:
+    """
+    提交去重键：优先使用 Idempotency-Key，否则使用请求内容指纹
+    
+    匿名请求（没有 API Key）无法区分用户：只按 Idempotency-Key 去重（限定在同一客户端地址内），
+    不按请求内容去重，避免不同用户的相同请求拿到同一个 task_id；返回 None 表示不去重
+    """
+    user_scope = x_api_key or request.api_key
+    if idempotency_key:
+        return content_fingerprint({
+            "user": user_scope or "",
+            "client": None if user_scope else client_host,
+            "idempotency_key": idempotency_key,
+        })
+    if not user_scope:
+        return None
+    return content_fingerprint({
+        "user": user_scope,
+        "prompt": request.prompt,
+        "first_frame": request.first_frame_id or frame_digest(request.first_frame),
+        "last_frame": frame_digest(request.last_frame),
+        "seed": request.seed,
+        "frames": calculate_frames(request.duration, request.fps),
+        "resolution": request.resolution,
+        "version": request.version,
+    })
+
+
+@app.on_event("startup")
+async def startup_services():
+    """解析并预热 RAG 提示词增强服务，解析对象存储，补充数据库新列，启动提交调度器、生成记录延迟写入、任务状态跟踪、视频转存和超时任务清理"""
+    prompt_enhancer.start(warm=RAG_WARMUP)
+    storage_registry.resolve_all()
+    # 先补充新列，再启动会读写这些列的生成记录写入和状态跟踪
+    await asyncio.to_thread(ensure_schema)
+    submission_scheduler.start()
+    generation_writer.start()
+    status_tracker.start()
+    video_archiver.start()
+    timeout_sweeper.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    """写入缓冲区中的生成记录和后台保存中的首帧，关闭注册表中的上游客户端及其连接池和存储线程池"""
+    await timeout_sweeper.stop()
+    await submission_scheduler.stop()
+    await status_tracker.stop()
+    await video_archiver.stop()
+    await generation_writer.stop()
+    await frame_store.drain()
+    await close_all_clients()
+    prompt_enhancer.shutdown()
+    storage_executor.shutdown()
 
 
 @app.get("/")
@@ -128,15 +238,100 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/api/v1/system/stats")
+async def system_stats():
+    """运行时统计（上游客户端复用情况等）"""
+    return {
+        "clients": get_registry_stats(),
+        "frame_cache": get_frame_cache_stats(),
+        "prompt_enhancer": prompt_enhancer.stats(),
+        "submission_dedup": submission_deduplicator.stats(),
+        "submission_scheduler": submission_scheduler.stats(),
+        "generation_writer": generation_writer.stats(),
+        "status_tracker": status_tracker.stats(),
+        "status_cache": status_cache.stats(),
+        "archiver": video_archiver.stats(),
+        "storage": storage_registry.stats(),
+        "storage_uploads": multipart_uploader.stats(),
+        "storage_executor": storage_executor.stats(),
+        "timeout_sweeper": timeout_sweeper.stats(),
+        "db_sessions": get_session_stats(),
+        "status_stream": task_events.stats(),
+    }
+
+
 @app.post("/api/v1/video/generate", response_model=VideoGenerationResponse)
 async def generate_video(
     request: VideoGenerationRequest,
-    x_api_key: Optional[str] = None
+    http_request: Request,
+    x_api_key: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     生成视频接口
     
     支持 RAG 增强提示词：根据提示词检索相似视频帧，增强生成效果
+    
+    相同的 Idempotency-Key（或同一用户的相同请求内容）在去重窗口内只会提交一次上游任务，
+    重复请求返回首次提交的 task_id
+    """
+    client_host = http_request.client.host if http_request.client else None
+    result, deduplicated = await submission_deduplicator.run(
+        submission_key(request, x_api_key, idempotency_key, client_host),
+        lambda: _generate_video(request, x_api_key),
+        is_success=lambda response: response.success and bool(response.task_id or response.ticket_id)
+    )
+    if deduplicated:
+        print(f"♻️ 重复的生成请求，返回已提交的任务: task_id={result.task_id}, ticket_id={result.ticket_id}")
+        return result.model_copy(update={"deduplicated": True})
+    return result
+
+
+class PreparedSubmission:
+    """已校验、待提交到即梦 API 的生成任务"""
+    
+    def __init__(
+        self,
+        request: VideoGenerationRequest,
+        access_key: str,
+        secret_key: str,
+        req_key: str,
+        version: str,
+        resolution: str,
+        prompt: str,
+        frames: int,
+        seed: int,
+        image_urls: Optional[List[str]],
+        binary_data_base64: Optional[List[str]],
+        first_frame_ref: Optional[str],
+        rag_references: Optional[List[Any]],
+        pending_frame: Optional[bytes] = None
+    ):
+        self.request = request
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.req_key = req_key
+        self.version = version
+        self.resolution = resolution
+        self.prompt = prompt
+        self.frames = frames
+        self.seed = seed
+        self.image_urls = image_urls
+        self.binary_data_base64 = binary_data_base64
+        self.first_frame_ref = first_frame_ref
+        self.rag_references = rag_references
+        # 尚未保存到图片存储的首帧（由 _finalize_submission 保存）
+        self.pending_frame = pending_frame
+
+
+async def _prepare_submission(request: VideoGenerationRequest):
+    """
+    校验请求、解码首帧，构建待提交的任务
+    
+    不保存首帧、不增强提示词（由 _finalize_submission 完成），校验失败时没有副作用
+    
+    Returns:
+        PreparedSubmission；参数无效时返回失败的 VideoGenerationResponse
     """
     # 验证提示词
     if not request.prompt:
@@ -146,424 +341,359 @@ async def generate_video(
             error="提示词不能为空"
         )
     
-    try:
-        # RAG 增强提示词（可选）
-        enhanced_prompt = request.prompt
-        rag_references = None
-        
-        try:
-            # 尝试导入 RAG 服务
-            import sys
-            from pathlib import Path
-            rag_path = Path(__file__).parent.parent.parent / "doubao-rag" / "backend"
-            if str(rag_path) not in sys.path:
-                sys.path.insert(0, str(rag_path))
-            
-            from rag_service import RAGService
-            
-            # 初始化 RAG 服务
-            rag_service = RAGService()
-            
-            # 增强提示词
-            enhanced_result = rag_service.enhance_prompt(
-                original_prompt=request.prompt,
-                n_references=3  # 参考 3 个相似帧
-            )
+    # 调用即梦 API 生成视频（仅支持 3.5pro）
+    # 3.5pro 参考：https://www.volcengine.com/docs/85621/1777001?lang=zh
+    
+    # 使用火山引擎 AK/SK 认证
+    # 优先使用环境变量中的配置，如果没有则使用请求中的 api_key（兼容旧方式）
+    volc_access_key = VOLCENGINE_ACCESS_KEY_ID or request.api_key or API_KEY
+    volc_secret_key = VOLCENGINE_SECRET_ACCESS_KEY
+    
+    if not volc_access_key:
+        return VideoGenerationResponse(
+            success=False,
+            message="即梦 API 认证信息未配置",
+            error="请设置环境变量 VOLCENGINE_ACCESS_KEY_ID，或在请求中传入 api_key"
+        )
+    
+    if not volc_secret_key:
+        return VideoGenerationResponse(
+            success=False,
+            message="即梦 API 认证信息未配置",
+            error="请设置环境变量 VOLCENGINE_SECRET_ACCESS_KEY"
+        )
+    
+    # 根据即梦 API 文档构建请求体（仅支持 3.5pro）
+    # 3.5pro 参考：https://www.volcengine.com/docs/85621/1777001?lang=zh
+    # 注意：3.5pro 只支持 1080p 首帧功能（不支持尾帧和720p）
+    
+    # 确定分辨率（仅支持1080p）
+    resolution = request.resolution or "1080p"
+    if resolution != "1080p":
+        return VideoGenerationResponse(
+            success=False,
+            message="仅支持 1080p 分辨率",
+            error="当前版本仅支持 1080p 分辨率，请切换到 1080p"
+        )
+    
+    # 确定版本（仅支持3.5pro）
+    version = request.version or "3.5pro"
+    if version != "3.5pro":
+        version = "3.5pro"  # 强制使用3.5pro
+    
+    # 验证 3.5pro 的限制：只支持 1080p 首帧（不支持尾帧）
+    if request.first_frame_id and not is_valid_frame_id(request.first_frame_id):
+        return VideoGenerationResponse(
+            success=False,
+            message="首帧图片 ID 无效",
+            error=f"无效的 first_frame_id: {request.first_frame_id}"
+        )
+    if not request.first_frame and not request.first_frame_id:
+        return VideoGenerationResponse(
+            success=False,
+            message="需要首帧图片",
+            error="请上传首帧图片"
+        )
+    if request.last_frame:
+        return VideoGenerationResponse(
+            success=False,
+            message="不支持尾帧",
+            error="当前版本不支持尾帧功能，请移除尾帧图片"
+        )
+    
+    # 使用 3.5pro 的 req_key 映射
+    req_key_map = JIMENG_V35_PRO_REQ_KEYS
+    print(f"使用即梦AI 3.5pro版本")
+    
+    # 确定 req_key：3.5pro 只支持 1080p 首帧
+    resolution_keys = req_key_map.get("1080p")
+    if not resolution_keys:
+        return VideoGenerationResponse(
+            success=False,
+            message="配置错误",
+            error="3.5pro 1080p 配置缺失"
+        )
+    
+    # 3.5pro 只支持首帧模式
+    req_key = resolution_keys["first_frame"]
+    mode = "单首帧+提示词"
+    
+    print(f"✅ 选择的模式: {mode}")
+    print(f"✅ req_key: {req_key} (版本: {version}, 分辨率: {resolution}, 首帧: {bool(request.first_frame or request.first_frame_id)}, 尾帧: {bool(request.last_frame)})")
+    
+    # 处理图片输入（二选一：binary_data_base64 或 image_urls）
+    # 文档：https://www.volcengine.com/docs/85621/1785204?lang=zh
+    binary_data_base64 = []
+    image_urls = []
+    
+    # 记录到历史中的首帧地址
+    first_frame_ref = request.first_frame
+    pending_frame = None
+    
+    # 处理首帧（必选，当使用图片时）
+    if request.first_frame_id:
+        # 已暂存的首帧：对象存储可用时传 URL，否则读取本地副本
+        hosted_url = await frame_store.hosted_url(request.first_frame_id)
+        if hosted_url:
+            image_urls.append(hosted_url)
+            first_frame_ref = hosted_url
+        else:
+            base64_data = await frame_store.load_base64(request.first_frame_id)
+            if not base64_data:
+                return VideoGenerationResponse(
+                    success=False,
+                    message="首帧图片不存在",
+                    error=f"未找到首帧图片: {request.first_frame_id}，请重新上传"
+                )
+            binary_data_base64.append(base64_data)
+            first_frame_ref = f"{FRAMES_ROUTE}/{request.first_frame_id}"
+    elif request.first_frame:
+        if request.first_frame.startswith("http"):
+            # URL 格式
+            image_urls.append(request.first_frame)
+        else:
+            # base64 数据：一次性解析 data URL 前缀、校验字符集、补齐填充并解码
+            try:
+                decoded_frame = decode_base64_frame(request.first_frame, FIRST_FRAME_MAX_BYTES)
+            except FrameDecodeError as e:
+                return VideoGenerationResponse(
+                    success=False,
+                    message=e.message,
+                    error=e.detail
+                )
             
-            enhanced_prompt = enhanced_result["enhanced_prompt"]
-            rag_references = enhanced_result["references"]
+            print(f"[DEBUG] 首帧图片: {decoded_frame.width}x{decoded_frame.height}, {decoded_frame.size} 字节")
             
-        except ImportError:
-            # RAG 服务不可用，使用原始提示词
-            pass
-        except Exception as e:
-            # RAG 增强失败，使用原始提示词
-            print(f"RAG 增强失败，使用原始提示词: {e}")
-            pass
-        
-        # 调用即梦 API 生成视频（仅支持 3.5pro）
-        # 3.5pro 参考：https://www.volcengine.com/docs/85621/1777001?lang=zh
-        
-        # 使用火山引擎 AK/SK 认证
-        # 优先使用环境变量中的配置，如果没有则使用请求中的 api_key（兼容旧方式）
-        volc_access_key = VOLCENGINE_ACCESS_KEY_ID or request.api_key or API_KEY
-        volc_secret_key = VOLCENGINE_SECRET_ACCESS_KEY
-        
-        if not volc_access_key:
-            return VideoGenerationResponse(
-                success=False,
-                message="即梦 API 认证信息未配置",
-                error="请设置环境变量 VOLCENGINE_ACCESS_KEY_ID，或在请求中传入 api_key"
-            )
-        
-        if not volc_secret_key:
-            return VideoGenerationResponse(
-                success=False,
-                message="即梦 API 认证信息未配置",
-                error="请设置环境变量 VOLCENGINE_SECRET_ACCESS_KEY"
-            )
-        
-        # 根据即梦 API 文档构建请求体（仅支持 3.5pro）
-        # 3.5pro 参考：https://www.volcengine.com/docs/85621/1777001?lang=zh
-        # 注意：3.5pro 只支持 1080p 首帧功能（不支持尾帧和720p）
-        
-        # 确定分辨率（仅支持1080p）
-        resolution = request.resolution or "1080p"
-        if resolution != "1080p":
+            try:
+                if FIRST_FRAME_NORMALIZE:
+                    # 缩放到目标分辨率以内并转为 JPEG，减小上传体积
+                    frame = await normalize_frame(decoded_frame.data, resolution)
+                else:
+                    frame = decoded_frame
+            except FrameDecodeError as e:
+                return VideoGenerationResponse(
+                    success=False,
+                    message=e.message,
+                    error=e.detail
+                )
+            base64_data = frame.to_base64()
+            binary_data_base64.append(base64_data)
+            pending_frame = frame.data
+            first_frame_ref = None
+            print(f"[DEBUG] 提交的 base64 长度: {len(base64_data)}")
+    
+    # 3.5pro 不支持尾帧，如果传入了尾帧会在前面验证时返回错误
+    
+    # 根据文档，binary_data_base64 和 image_urls 二选一
+    if binary_data_base64:
+        print(f"✅ 使用 binary_data_base64，包含 {len(binary_data_base64)} 张图片")
+    elif image_urls:
+        print(f"✅ 使用 image_urls，包含 {len(image_urls)} 张图片")
+    else:
+        # 纯文本模式（仅提示词，无图片）
+        print(f"✅ 纯文本模式，无图片数据")
+    
+    # 注意：即梦 API 不支持 negative_prompt、width、height 等参数
+    return PreparedSubmission(
+        request=request,
+        access_key=volc_access_key,
+        secret_key=volc_secret_key,
+        req_key=req_key,
+        version=version,
+        resolution=resolution,
+        prompt=request.prompt,
+        frames=calculate_frames(request.duration, request.fps),
+        seed=request.seed if request.seed is not None else -1,  # -1 表示随机种子
+        image_urls=image_urls or None,
+        binary_data_base64=binary_data_base64 or None,
+        first_frame_ref=first_frame_ref,
+        rag_references=None,
+        pending_frame=pending_frame
+    )
+
+
+async def _finalize_submission(prepared: PreparedSubmission):
+    """
+    提交前的最后处理：保存首帧、RAG 增强提示词
+    
+    Raises:
+        FrameDecodeError: 首帧无效
+    """
+    if prepared.pending_frame is not None:
+        # 图片按内容哈希在后台保存（提交使用 binary_data_base64，不等待上传），
+        # 历史记录中只保存地址（不把 base64 写入数据库）
+        stored = frame_store.save_in_background(prepared.pending_frame, FIRST_FRAME_MAX_BYTES)
+        prepared.first_frame_ref = frame_store.reference(stored)
+        prepared.pending_frame = None
+    
+    # RAG 增强提示词（可选，超过延迟预算时使用原始提示词）
+    enhancement = await prompt_enhancer.enhance(prepared.request.prompt, n_references=3)
+    prepared.prompt = enhancement.enhanced_prompt
+    prepared.rag_references = enhancement.references
+
+
+async def _submit_to_jimeng(prepared: PreparedSubmission) -> str:
+    """
+    提交任务到即梦 API（使用异步客户端，复用连接池，不阻塞事件循环）
+    
+    Returns:
+        task_id
+    
+    Raises:
+        JimengAPIError: 上游返回错误
+    """
+    jimeng_client = get_jimeng_client(prepared.access_key, prepared.secret_key, JIMENG_API_ENDPOINT)
+    
+    print(f"📤 准备提交视频生成任务:")
+    print(f"  - req_key: {prepared.req_key}")
+    print(f"  - prompt: {prepared.prompt[:50]}...")
+    print(f"  - frames: {prepared.frames}")
+    print(f"  - 有首帧: {bool(prepared.binary_data_base64 or prepared.image_urls)}")
+    if prepared.binary_data_base64:
+        print(f"  - 首帧数据长度: {len(prepared.binary_data_base64[0])}")
+    
+    api_result = await jimeng_client.submit_video_task(
+        req_key=prepared.req_key,
+        prompt=prepared.prompt,
+        frames=prepared.frames,
+        seed=prepared.seed,
+        image_urls=prepared.image_urls,
+        binary_data_base64=prepared.binary_data_base64
+    )
+    
+    print(f"📥 即梦 API 响应: {api_result}")
+    return extract_task_id(api_result)
+
+
+def _video_size(resolution: str):
+    """根据分辨率设置16:9格式的宽高"""
+    if resolution == "1080p":
+        return 1920, 1080
+    return 1280, 720  # 720p
+
+
+def _generation_record_fields(prepared: PreparedSubmission, task_id: str) -> Dict[str, Any]:
+    """生成记录字段（VideoHistoryService.build_generation_record 的参数，user_id 在写入时解析）"""
+    request = prepared.request
+    video_width, video_height = _video_size(prepared.resolution)
+    return {
+        "task_id": task_id,
+        "prompt": request.prompt,
+        "duration": request.duration,
+        "fps": request.fps or DEFAULT_VIDEO_SETTINGS["fps"],
+        "width": video_width,
+        "height": video_height,
+        "seed": request.seed,
+        "negative_prompt": request.negative_prompt,
+        "first_frame_url": prepared.first_frame_ref,
+        "last_frame_url": request.last_frame,
+        "status": "pending",
+        "req_key": prepared.req_key,
+        "version": prepared.version,
+    }
+
+
+async def _save_generation_record(prepared: PreparedSubmission, task_id: str, x_api_key: Optional[str]):
+    """
+    保存生成记录（加入延迟写入缓冲区，由后台批量写入数据库，不阻塞提交响应）
+    
+    数据库未配置时跳过；保存失败不影响视频生成
+    """
+    try:
+        await generation_writer.add(_generation_record_fields(prepared, task_id), x_api_key)
+    except Exception as e:
+        print(f"❌ 保存视频生成记录失败: {str(e)}")
+
+
+def _submission_job(prepared: PreparedSubmission, x_api_key: Optional[str]):
+    """调度器执行的提交：提交到即梦 API、保存生成记录、开始跟踪任务状态"""
+    async def job() -> str:
+        task_id = await _submit_to_jimeng(prepared)
+        await _save_generation_record(prepared, task_id, x_api_key)
+        status_tracker.track(task_id, req_key=prepared.req_key)
+        return task_id
+    return job
+
+
+def _submission_error_response(error: Exception) -> VideoGenerationResponse:
+    """即梦 API 调用错误 -> 响应"""
+    error_msg = str(error)
+    print(f"即梦 API 调用错误: {error_msg}")
+    
+    # 提取更友好的错误信息（如果是 Access Denied）
+    if "50400" in error_msg or "Access Denied" in error_msg or "认证失败" in error_msg:
+        user_friendly_msg = (
+            "即梦 API 认证失败：请检查 API 密钥配置。"
+            "详细解决方案请查看 jubianai/ACCESS_DENIED_FIX.md"
+        )
+    else:
+        user_friendly_msg = error_msg
+    
+    return VideoGenerationResponse(
+        success=False,
+        message=f"视频生成失败:调用即梦API失败: {user_friendly_msg}",
+        error=error_msg
+    )
+
+
+async def _generate_video(
+    request: VideoGenerationRequest,
+    x_api_key: Optional[str] = None
+) -> VideoGenerationResponse:
+    """提交视频生成任务（校验参数、处理首帧、经调度器提交到即梦 API、保存历史记录）"""
+    try:
+        prepared = await _prepare_submission(request)
+        if isinstance(prepared, VideoGenerationResponse):
+            return prepared
+        try:
+            await _finalize_submission(prepared)
+        except FrameDecodeError as e:
             return VideoGenerationResponse(
                 success=False,
-                message="仅支持 1080p 分辨率",
-                error="当前版本仅支持 1080p 分辨率，请切换到 1080p"
+                message=e.message,
+                error=e.detail
             )
         
-        # 确定版本（仅支持3.5pro）
-        version = request.version or "3.5pro"
-        if version != "3.5pro":
-            version = "3.5pro"  # 强制使用3.5pro
+        job = _submission_job(prepared, x_api_key)
         
-        # 验证 3.5pro 的限制：只支持 1080p 首帧（不支持尾帧）
-        if not request.first_frame:
-            return VideoGenerationResponse(
-                success=False,
-                message="需要首帧图片",
-                error="请上传首帧图片"
-            )
-        if request.last_frame:
+        # 经调度器提交：并发槽位已满时进入队列，返回排队票据
+        try:
+            ticket = await submission_scheduler.submit(prepared.access_key, job, user=x_api_key)
+        except QueueFullError as e:
             return VideoGenerationResponse(
                 success=False,
-                message="不支持尾帧",
-                error="当前版本不支持尾帧功能，请移除尾帧图片"
+                message="提交队列已满，请稍后重试",
+                error=str(e)
             )
         
-        # 使用 3.5pro 的 req_key 映射
-        req_key_map = JIMENG_V35_PRO_REQ_KEYS
-        print(f"使用即梦AI 3.5pro版本")
+        if ticket.status == TICKET_FAILED:
+            return _submission_error_response(Exception(ticket.error))
         
-        # 确定 req_key：3.5pro 只支持 1080p 首帧
-        resolution_keys = req_key_map.get("1080p")
-        if not resolution_keys:
+        if ticket.status != TICKET_SUBMITTED:
+            queue_position = submission_scheduler.queue_position(ticket)
             return VideoGenerationResponse(
-                success=False,
-                message="配置错误",
-                error="3.5pro 1080p 配置缺失"
+                success=True,
+                status="queued",
+                ticket_id=ticket.ticket_id,
+                queue_position=queue_position,
+                message=f"即梦 API 并发已满，任务已进入队列（第 {queue_position} 位），将自动提交"
             )
         
-        # 3.5pro 只支持首帧模式
-        req_key = resolution_keys["first_frame"]
-        mode = "单首帧+提示词"
-        
-        print(f"✅ 选择的模式: {mode}")
-        print(f"✅ req_key: {req_key} (版本: {version}, 分辨率: {resolution}, 首帧: {bool(request.first_frame)}, 尾帧: {bool(request.last_frame)})")
-        
-        # 根据即梦 API 文档构建请求体
-        # 文档：https://www.volcengine.com/docs/85621/1785204?lang=zh
-        api_payload = {
-            "req_key": req_key,
-            "prompt": enhanced_prompt,  # 使用增强后的提示词（必选）
+        # 构建响应数据
+        response_data = {
+            "success": True,
+            "task_id": ticket.task_id,
+            "message": "视频生成任务已提交",
         }
         
-        # 处理图片输入（二选一：binary_data_base64 或 image_urls）
-        # 支持两种模式：
-        # 1. 单首帧 + 提示词：只有 first_frame，使用 first_frame 的 req_key
-        # 2. 首尾帧 + 提示词：有 first_frame 和 last_frame，使用 first_last_frame 的 req_key
-        binary_data_base64 = []
-        image_urls = []
+        # 如果使用了 RAG，添加参考信息
+        if prepared.rag_references:
+            response_data["rag_enhanced"] = True
+            response_data["original_prompt"] = request.prompt
+            response_data["enhanced_prompt"] = prepared.prompt
+            response_data["rag_references_count"] = len(prepared.rag_references)
         
-        # 处理首帧（必选，当使用图片时）
-        if request.first_frame:
-            if request.first_frame.startswith("http"):
-                # URL 格式
-                image_urls.append(request.first_frame)
-            else:
-                # base64 数据，移除 data:image/...;base64, 前缀
-                base64_data = request.first_frame
-                
-                # 移除 data:image/...;base64, 前缀（如果有）
-                if "," in base64_data:
-                    # 找到最后一个逗号，取后面的部分
-                    base64_data = base64_data.split(",")[-1]
-                elif "base64," in base64_data:
-                    base64_data = base64_data.split("base64,")[-1]
-                
-                # 验证 base64 数据格式
-                if not base64_data or len(base64_data) < 100:
-                    return VideoGenerationResponse(
-                        success=False,
-                        message="首帧图片数据无效",
-                        error="首帧图片 base64 数据格式不正确或数据过短"
-                    )
-                
-                # 确保 base64 数据是纯字符串（移除可能的换行符、空格和其他空白字符）
-                base64_data = base64_data.strip()
-                # 移除所有空白字符（包括换行符、制表符等）
-                import re
-                base64_data = re.sub(r'\s+', '', base64_data)
-                
-                # 验证 base64 字符集（只包含 A-Z, a-z, 0-9, +, /, =）
-                if not re.match(r'^[A-Za-z0-9+/=]+$', base64_data):
-                    return VideoGenerationResponse(
-                        success=False,
-                        message="首帧图片数据格式错误",
-                        error="base64 数据包含非法字符"
-                    )
-                
-                # 验证 base64 长度（必须是4的倍数，或者末尾有=填充）
-                if len(base64_data) % 4 != 0:
-                    # 自动补齐 = 填充
-                    padding = 4 - (len(base64_data) % 4)
-                    base64_data += "=" * padding
-                
-                binary_data_base64.append(base64_data)
-                print(f"[DEBUG] 处理后的 base64 数据长度: {len(base64_data)}, 前50字符: {base64_data[:50]}")
-        
-        # 3.5pro 不支持尾帧，如果传入了尾帧会在前面验证时返回错误
-        # 这里不再处理尾帧
-        
-        # 根据文档，binary_data_base64 和 image_urls 二选一
-        # 只有当有图片数据时才添加到 payload
-        if binary_data_base64:
-            api_payload["binary_data_base64"] = binary_data_base64
-            print(f"✅ 使用 binary_data_base64，包含 {len(binary_data_base64)} 张图片")
-        elif image_urls:
-            api_payload["image_urls"] = image_urls
-            print(f"✅ 使用 image_urls，包含 {len(image_urls)} 张图片")
-        else:
-            # 纯文本模式（仅提示词，无图片）
-            print(f"✅ 纯文本模式，无图片数据")
-        
-        # 计算 frames（总帧数）
-        # 根据文档：frames = 24 * n + 1，支持 5秒(121帧) 和 10秒(241帧)
-        calculated_frames = request.duration * request.fps
-        if calculated_frames <= 121:
-            frames = 121  # 5秒
-        elif calculated_frames <= 241:
-            frames = 241  # 10秒
-        else:
-            frames = 241  # 默认 10秒
-        
-        api_payload["frames"] = frames
-        
-        # 添加可选参数
-        if request.seed is not None:
-            api_payload["seed"] = request.seed
-        else:
-            api_payload["seed"] = -1  # 默认值（随机种子）
-        
-        # 注意：即梦 API 不支持 negative_prompt、width、height 等参数
-        # 这些参数可能需要通过其他方式传递或忽略
-        
-        # 使用官方 SDK 调用即梦 API
-        # 官方 SDK 会自动处理签名、Action、Version 等参数
-        # 参考：https://github.com/volcengine/volc-sdk-python
-        try:
-            # 创建 VisualService 实例
-            visual_service = create_visual_service(volc_access_key, volc_secret_key)
-            
-            # 准备图片数据
-            image_urls_list = image_urls if image_urls else None
-            binary_data_list = binary_data_base64 if binary_data_base64 else None
-            
-            # 验证 binary_data_base64 格式
-            if binary_data_list:
-                if not isinstance(binary_data_list, list):
-                    return VideoGenerationResponse(
-                        success=False,
-                        message="图片数据格式错误",
-                        error="binary_data_base64 必须是列表格式"
-                    )
-                if len(binary_data_list) == 0:
-                    return VideoGenerationResponse(
-                        success=False,
-                        message="图片数据为空",
-                        error="binary_data_base64 列表为空"
-                    )
-                # 确保所有元素都是字符串
-                for i, data in enumerate(binary_data_list):
-                    if not isinstance(data, str):
-                        binary_data_list[i] = str(data)
-                    if len(data) < 100:
-                        return VideoGenerationResponse(
-                            success=False,
-                            message="图片数据无效",
-                            error=f"第 {i+1} 张图片的 base64 数据过短或无效"
-                        )
-            
-            print(f"📤 准备提交视频生成任务:")
-            print(f"  - req_key: {req_key}")
-            print(f"  - prompt: {enhanced_prompt[:50]}...")
-            print(f"  - frames: {frames}")
-            print(f"  - 有首帧: {bool(binary_data_list or image_urls_list)}")
-            if binary_data_list and len(binary_data_list) > 0:
-                print(f"  - 首帧数据长度: {len(binary_data_list[0])}")
-                print(f"  - 首帧数据前50字符: {binary_data_list[0][:50]}...")
-            
-            # 调用官方 SDK 提交任务
-            api_result = submit_video_task(
-                service=visual_service,
-                req_key=req_key,
-                prompt=enhanced_prompt,
-                frames=frames,
-                seed=api_payload.get("seed", -1),
-                image_urls=image_urls_list,
-                binary_data_base64=binary_data_list
-            )
-            
-            print(f"📥 即梦 API 响应: {api_result}")
-            
-            # 解析响应
-            # 官方 SDK 返回的格式可能是：
-            # 1. 直接返回 {"code": 10000, "data": {"task_id": "..."}, ...}
-            # 2. 或者返回 {"ResponseMetadata": {...}, "Result": {...}}
-            response_code = api_result.get("code")
-            if response_code is None:
-                # 可能是火山引擎格式，检查 ResponseMetadata
-                if "ResponseMetadata" in api_result:
-                    metadata = api_result["ResponseMetadata"]
-                    if "Error" in metadata:
-                        error_info = metadata["Error"]
-                        error_code = error_info.get("Code", "Unknown")
-                        error_message = error_info.get("Message", "未知错误")
-                        request_id = metadata.get("RequestId", "")
-                        raise Exception(f"即梦 API 调用失败: 错误码={error_code}, 错误信息={error_message}, RequestId={request_id}")
-                    # 如果没有错误，检查 Result
-                    if "Result" in api_result:
-                        result = api_result["Result"]
-                        task_id = result.get("task_id") or result.get("TaskId")
-                        if task_id:
-                            api_result = {"code": 10000, "data": {"task_id": task_id}, "message": "Success"}
-                        else:
-                            raise Exception("即梦 API 响应格式异常，未找到 task_id")
-            
-            if response_code != 10000:
-                error_msg = api_result.get("message", "未知错误")
-                request_id = api_result.get("request_id", "")
-                
-                # 特殊处理 Access Denied 错误 (50400)
-                if response_code == 50400 or "Access Denied" in error_msg:
-                    detailed_error = (
-                        f"即梦 API 认证失败 (50400): {error_msg}\n"
-                        f"请检查：\n"
-                        f"1. 环境变量 VOLCENGINE_ACCESS_KEY_ID 和 VOLCENGINE_SECRET_ACCESS_KEY 是否正确配置\n"
-                        f"2. API 密钥是否有权限访问即梦 API 服务\n"
-                        f"3. API 密钥是否已过期或被禁用\n"
-                        f"4. 即梦 API 服务是否已开通\n"
-                        f"RequestId: {request_id}\n"
-                        f"详细说明请查看: jubianai/ACCESS_DENIED_FIX.md"
-                    )
-                    raise Exception(detailed_error)
-                
-                # 特殊处理并发限制错误
-                if response_code == 50430 or "concurrent" in error_msg.lower() or "Concurrent Limit" in error_msg:
-                    raise Exception(f"即梦 API 并发限制: {error_msg}。请稍后重试，或等待其他任务完成。")
-                
-                raise Exception(f"即梦 API 调用失败: code={response_code}, message={error_msg}, request_id={request_id}")
-        
-            # 从即梦 API 响应中提取任务 ID
-            task_id = api_result.get("data", {}).get("task_id")
-            if not task_id:
-                raise Exception("即梦 API 响应中未找到 task_id，请检查响应格式")
-            
-            # 保存到数据库（可选，如果数据库未配置则跳过）
-            try:
-                from backend.database import SessionLocal
-                from backend.video_history import VideoHistoryService
-                from backend.auth import AuthService
-                
-                # 检查数据库是否可用
-                if SessionLocal:
-                    # 创建数据库会话（使用 SessionLocal 直接创建，而不是 get_db）
-                    db = SessionLocal()
-                    try:
-                        # 获取用户ID
-                        user_id = None
-                        if x_api_key:
-                            user = AuthService.get_user_by_api_key(db, x_api_key)
-                            if user:
-                                user_id = user.id
-                        
-                        if not user_id:
-                            # 使用默认用户
-                            default_user = AuthService.get_or_create_default_user(db)
-                            user_id = default_user.id
-                        
-                        # 创建生成记录
-                        # 根据分辨率设置16:9格式的宽高
-                        if resolution == "1080p":
-                            video_width = 1920
-                            video_height = 1080
-                        else:  # 720p
-                            video_width = 1280
-                            video_height = 720
-                        
-                        print(f"🔍 准备保存视频生成记录: task_id={task_id}, user_id={user_id}, resolution={resolution}, size={video_width}x{video_height}, req_key={req_key}, version={version}")
-                        generation = VideoHistoryService.create_generation_record(
-                            db=db,
-                            task_id=task_id,
-                            user_id=user_id,
-                            prompt=request.prompt,
-                            duration=request.duration,
-                            fps=request.fps or DEFAULT_VIDEO_SETTINGS["fps"],
-                            width=video_width,
-                            height=video_height,
-                            seed=request.seed,
-                            negative_prompt=request.negative_prompt,
-                            first_frame_url=request.first_frame,
-                            last_frame_url=request.last_frame,
-                            status="pending",
-                            req_key=req_key,
-                            version=version
-                        )
-                        print(f"✅ 视频生成记录已保存: task_id={task_id}, user_id={user_id}, record_id={generation.id}")
-                    except Exception as save_error:
-                        # 回滚事务
-                        db.rollback()
-                        raise save_error
-                    finally:
-                        # 确保关闭数据库连接
-                        db.close()
-                else:
-                    print("⚠️ 数据库未配置，跳过保存历史记录（SUPABASE_DB_URL 未设置）")
-            except Exception as db_error:
-                import traceback
-                print(f"❌ 保存视频生成记录失败: {str(db_error)}")
-                traceback.print_exc()
-                # 数据库保存失败不影响视频生成，只记录错误
-        
-            # 构建响应数据（在 try 块内）
-            response_data = {
-                "success": True,
-                "task_id": task_id,
-                "message": "视频生成任务已提交",
-            }
-            
-            # 如果使用了 RAG，添加参考信息
-            if rag_references:
-                response_data["rag_enhanced"] = True
-                response_data["original_prompt"] = request.prompt
-                response_data["enhanced_prompt"] = enhanced_prompt
-                response_data["rag_references_count"] = len(rag_references)
-            
-            return VideoGenerationResponse(**response_data)
-            
-        except Exception as e:
-            # 处理即梦 API 调用错误
-            error_msg = str(e)
-            print(f"即梦 API 调用错误: {error_msg}")
-            
-            # 提取更友好的错误信息（如果是 Access Denied）
-            if "50400" in error_msg or "Access Denied" in error_msg or "认证失败" in error_msg:
-                user_friendly_msg = (
-                    "即梦 API 认证失败：请检查 API 密钥配置。"
-                    "详细解决方案请查看 jubianai/ACCESS_DENIED_FIX.md"
-                )
-            else:
-                user_friendly_msg = error_msg
-            
-            return VideoGenerationResponse(
-                success=False,
-                message=f"视频生成失败:调用即梦API失败: {user_friendly_msg}",
-                error=error_msg
-            )
+        return VideoGenerationResponse(**response_data)
         
     except HTTPException as e:
         return VideoGenerationResponse(
@@ -583,338 +713,396 @@ async def generate_video(
         )
 
 
-@app.get("/api/v1/video/status/{task_id}")
-async def get_video_status(task_id: str):
+@app.post("/api/v1/video/generate/batch")
+async def generate_video_batch(
+    request: BatchGenerationRequest,
+    x_api_key: Optional[str] = None
+):
     """
-    查询视频生成状态
+    批量生成视频接口
     
-    调用即梦 API 查询任务状态
-    参考：https://www.volcengine.com/docs/85621/1785204?lang=zh
+    先校验全部条目（任一条目无效时整批拒绝，不保存首帧、不提交任何任务），再以有限并发经调度器提交：
+    每个条目先预留提交队列位置（队列已满时等待，不会被拒绝），再保存首帧、增强提示词并提交。
+    结果按完成顺序以 NDJSON 流式返回（每行一个条目：index、task_id 或 ticket_id 或 error），
+    最后一行为汇总。生成记录经延迟写入缓冲区批量写入数据库。
     """
-    try:
-        # 首先检查数据库中任务的创建时间，如果超过合理时间，直接返回失败
-        try:
-            from backend.database import get_db
-            from backend.video_history import VideoHistoryService
-            from datetime import datetime, timedelta
-            
-            db = next(get_db())
-            generation = VideoHistoryService.get_generation_by_task_id(db, task_id)
-            
-            if generation:
-                # 检查任务创建时间
-                created_at = generation.created_at
-                if isinstance(created_at, str):
-                    created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                
-                elapsed_time = datetime.utcnow() - created_at.replace(tzinfo=None) if created_at.tzinfo else datetime.utcnow() - created_at
-                elapsed_minutes = elapsed_time.total_seconds() / 60
-                
-                # 如果任务创建超过5分钟仍未完成，标记为失败
-                # 5秒视频通常1-3分钟完成，5分钟已经远超正常时间
-                # 缩短超时时间，避免用户等待过久
-                if elapsed_minutes > 5 and generation.status in ["pending", "processing"]:
-                    print(f"⚠️ 任务 {task_id} 已等待 {elapsed_minutes:.1f} 分钟，超过5分钟，标记为失败")
-                    VideoHistoryService.update_generation_status(
-                        db=db,
-                        task_id=task_id,
-                        status="failed",
-                        error_message=f"任务超时：已等待 {elapsed_minutes:.1f} 分钟（正常应在1-3分钟内完成）"
-                    )
-                    return {
-                        "task_id": task_id,
-                        "status": "failed",
-                        "progress": 0,
-                        "video_url": None,
-                        "error": f"任务超时：已等待 {elapsed_minutes:.1f} 分钟。视频生成通常在1-3分钟内完成，请重新生成。"
-                    }
-        except Exception as db_check_error:
-            # 数据库检查失败不影响后续查询，只记录错误
-            print(f"检查任务创建时间失败: {str(db_check_error)}")
-        
-        # 使用火山引擎 AK/SK 认证
-        volc_access_key = VOLCENGINE_ACCESS_KEY_ID or API_KEY
-        volc_secret_key = VOLCENGINE_SECRET_ACCESS_KEY
-        
-        if not volc_access_key or not volc_secret_key:
-            return {
-                "task_id": task_id,
-                "status": "error",
-                "progress": 0,
-                "video_url": None,
-                "error": "即梦 API 认证信息未配置"
-            }
-        
-        # 创建 VisualService 实例
-        from backend.volcengine_sdk_helper import create_visual_service, query_video_task
-        
-        visual_service = create_visual_service(volc_access_key, volc_secret_key)
-        
-        # 尝试不同的 req_key（可能是首帧或首尾帧，720P或1080P，3.0pro或3.5pro）
-        # 优先使用数据库中保存的 req_key
-        req_keys = []
-        
-        # 首先尝试从数据库获取保存的 req_key
-        try:
-            from backend.database import get_db
-            from backend.video_history import VideoHistoryService
-            db = next(get_db())
-            generation = VideoHistoryService.get_generation_by_task_id(db, task_id)
-            if generation and generation.extra_metadata:
-                saved_req_key = generation.extra_metadata.get("req_key")
-                if saved_req_key:
-                    req_keys.append(saved_req_key)
-                    print(f"✅ 从数据库获取保存的 req_key: {saved_req_key}")
-        except Exception as e:
-            print(f"⚠️ 获取保存的 req_key 失败: {str(e)}")
-        
-        # 3.5pro 的 req_key（只有 1080p 首帧）
-        pro_req_key = JIMENG_V35_PRO_REQ_KEYS["1080p"]["first_frame"]
-        if pro_req_key not in req_keys:
-            req_keys.append(pro_req_key)
-        
-        print(f"🔍 将尝试以下 req_key 查询任务状态: {req_keys}")
-        
-        for req_key in req_keys:
+    items = request.items
+    if not items:
+        raise HTTPException(status_code=400, detail="items 不能为空")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单批最多 {BATCH_MAX_ITEMS} 个条目，当前 {len(items)} 个")
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def prepare(item: VideoGenerationRequest):
+        async with semaphore:
             try:
-                print(f"🔍 尝试使用 req_key={req_key} 查询任务 {task_id} 状态...")
-                # 查询任务状态
-                api_result = query_video_task(
-                    service=visual_service,
-                    req_key=req_key,
-                    task_id=task_id
+                return await _prepare_submission(item)
+            except Exception as e:
+                return VideoGenerationResponse(success=False, message="参数处理失败", error=str(e))
+    
+    # 校验全部条目
+    prepared_items = await asyncio.gather(*(prepare(item) for item in items))
+    invalid = [
+        {"index": index, "message": result.message, "error": result.error}
+        for index, result in enumerate(prepared_items)
+        if isinstance(result, VideoGenerationResponse)
+    ]
+    if invalid:
+        return JSONResponse(
+            status_code=422,
+            content={"success": False, "message": f"{len(invalid)} 个条目无效，未提交任何任务", "errors": invalid}
+        )
+    
+    async def submit(index: int, prepared: PreparedSubmission) -> Dict[str, Any]:
+        async with semaphore:
+            # 背压：等待提交队列有空位后再保存首帧、提交
+            await submission_scheduler.reserve(prepared.access_key)
+            try:
+                await _finalize_submission(prepared)
+            except Exception as e:
+                submission_scheduler.cancel_reservation(prepared.access_key)
+                return {"index": index, "success": False, "message": "首帧处理失败", "error": str(e)}
+            try:
+                ticket = await submission_scheduler.submit(
+                    prepared.access_key, _submission_job(prepared, x_api_key), user=x_api_key, reserved=True
                 )
-                
-                print(f"📥 查询响应 (req_key={req_key}): {api_result}")
-                
-                # 解析响应
-                # 根据即梦 API 文档，响应格式为：
-                # {
-                #   "code": 10000,
-                #   "data": {
-                #     "status": "done",  # in_queue, generating, done, not_found, expired
-                #     "video_url": "https://..."
-                #   },
-                #   "message": "Success"
-                # }
-                response_code = api_result.get("code")
-                
-                if response_code == 10000:
-                    data = api_result.get("data", {})
-                    status = data.get("status", "processing")
-                    video_url = data.get("video_url")
-                    
-                    # 转换状态
-                    if status == "done":
-                        # 视频生成完成，上传到对象存储并更新数据库
-                        final_video_url = video_url
-                        
-                        try:
-                            from backend.database import get_db
-                            from backend.video_history import VideoHistoryService
-                            from backend.storage import get_storage_service
-                            import uuid
-                            from datetime import datetime
-                            
-                            # 获取数据库会话
-                            db = next(get_db())
-                            
-                            # 获取生成记录
-                            generation = VideoHistoryService.get_generation_by_task_id(db, task_id)
-                            
-                            if generation and video_url:
-                                # 尝试上传到对象存储
-                                storage_service = get_storage_service()
-                                if storage_service:
-                                    try:
-                                        # 生成视频文件名
-                                        video_name = f"{task_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp4"
-                                        
-                                        # 上传到对象存储
-                                        storage_url = await storage_service.upload_video(video_url, video_name)
-                                        
-                                        if storage_url:
-                                            final_video_url = storage_url
-                                            print(f"视频已上传到对象存储: {storage_url}")
-                                        else:
-                                            print(f"对象存储上传失败，使用原始URL: {video_url}")
-                                    except Exception as storage_error:
-                                        print(f"对象存储上传错误: {str(storage_error)}")
-                                        # 上传失败不影响，使用原始URL
-                                
-                                # 更新数据库状态
-                                VideoHistoryService.update_generation_status(
-                                    db=db,
-                                    task_id=task_id,
-                                    status="completed",
-                                    video_url=final_video_url,
-                                    video_name=generation.video_name or f"{task_id}.mp4"
-                                )
-                                print(f"视频生成记录已更新: task_id={task_id}, video_url={final_video_url}")
-                        except Exception as db_error:
-                            # 数据库更新失败不影响状态返回，只记录错误
-                            print(f"更新视频生成记录失败: {str(db_error)}")
-                        
-                        return {
-                            "task_id": task_id,
-                            "status": "completed",
-                            "progress": 100,
-                            "video_url": final_video_url
-                        }
-                    elif status == "in_queue":
-                        # 更新数据库状态为 processing
-                        try:
-                            from backend.database import get_db
-                            from backend.video_history import VideoHistoryService
-                            db = next(get_db())
-                            VideoHistoryService.update_generation_status(
-                                db=db,
-                                task_id=task_id,
-                                status="processing"
-                            )
-                        except Exception:
-                            pass
-                        
-                        return {
-                            "task_id": task_id,
-                            "status": "processing",
-                            "progress": 10,
-                            "video_url": None
-                        }
-                    elif status == "generating":
-                        # 更新数据库状态为 processing
-                        try:
-                            from backend.database import get_db
-                            from backend.video_history import VideoHistoryService
-                            db = next(get_db())
-                            VideoHistoryService.update_generation_status(
-                                db=db,
-                                task_id=task_id,
-                                status="processing"
-                            )
-                        except Exception:
-                            pass
-                        
-                        return {
-                            "task_id": task_id,
-                            "status": "processing",
-                            "progress": 50,
-                            "video_url": None
-                        }
-                    elif status in ["not_found", "expired"]:
-                        # 更新数据库状态为 failed
-                        try:
-                            from backend.database import get_db
-                            from backend.video_history import VideoHistoryService
-                            db = next(get_db())
-                            VideoHistoryService.update_generation_status(
-                                db=db,
-                                task_id=task_id,
-                                status="failed",
-                                error_message=f"任务状态: {status}"
-                            )
-                        except Exception:
-                            pass
-                        
-                        return {
-                            "task_id": task_id,
-                            "status": "failed",
-                            "progress": 0,
-                            "video_url": None,
-                            "error": f"任务状态: {status}"
-                        }
-                    else:
-                        return {
-                            "task_id": task_id,
-                            "status": "processing",
-                            "progress": 30,
-                            "video_url": None,
-                            "status_detail": status
-                        }
-                else:
-                    # 如果 code != 10000，记录错误但继续尝试下一个 req_key
-                    error_msg = api_result.get("message", "未知错误")
-                    print(f"查询任务失败 (req_key={req_key}): code={response_code}, message={error_msg}")
-                    # 检查是否是并发限制错误
-                    if response_code == 50430 or "Concurrent Limit" in error_msg or "concurrent" in error_msg.lower():
-                        return {
-                            "task_id": task_id,
-                            "status": "failed",
-                            "progress": 0,
-                            "video_url": None,
-                            "error": "API 并发限制，请稍后重试。即梦 API 有并发请求限制，请等待其他任务完成后再试。"
-                        }
-                    continue
-                    
             except Exception as e:
-                # 如果查询失败，记录错误但继续尝试下一个 req_key
-                error_msg = str(e)
-                print(f"查询任务异常 (req_key={req_key}): {error_msg}")
-                # 检查是否是并发限制错误
-                if "Concurrent Limit" in error_msg or "50430" in error_msg:
-                    return {
-                        "task_id": task_id,
-                        "status": "processing",
-                        "progress": 30,
-                        "video_url": None,
-                        "warning": "API 并发限制，请稍后重试"
-                    }
+                # 预留的位置已在 submit 开始时使用，不需要归还
+                print(f"❌ 批量提交第 {index} 条失败: {str(e)}")
+                return {"index": index, "success": False, "message": "提交失败", "error": str(e)}
+        if ticket.status == TICKET_SUBMITTED:
+            return {"index": index, "success": True, "status": "submitted", "task_id": ticket.task_id}
+        if ticket.status == TICKET_FAILED:
+            return {"index": index, "success": False, "message": "调用即梦API失败", "error": ticket.error}
+        return {
+            "index": index,
+            "success": True,
+            "status": "queued",
+            "ticket_id": ticket.ticket_id,
+            "queue_position": submission_scheduler.queue_position(ticket),
+        }
+    
+    async def stream():
+        counts = {"submitted": 0, "queued": 0, "failed": 0}
+        # 客户端断开时剩余条目继续在后台提交
+        tasks = [asyncio.ensure_future(submit(index, prepared)) for index, prepared in enumerate(prepared_items)]
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if not result["success"]:
+                counts["failed"] += 1
+            else:
+                counts[result["status"]] += 1
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True, "total": len(items), **counts}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/api/v1/video/queue/{ticket_id}")
+async def get_queue_ticket(ticket_id: str):
+    """
+    查询排队票据状态
+    
+    提交后 status 变为 submitted 并返回 task_id，之后通过 /api/v1/video/status/{task_id} 查询生成进度
+    """
+    ticket = submission_scheduler.get_ticket(ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="排队票据不存在或已过期")
+    return ticket.to_dict(queue_position=submission_scheduler.queue_position(ticket))
+
+
+# ========== 任务状态推送 ==========
+
+def _parse_task_ids(task_ids: str) -> List[str]:
+    """解析逗号分隔的 task_id 列表"""
+    parsed = list(dict.fromkeys(task_id.strip() for task_id in task_ids.split(",") if task_id.strip()))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="task_ids 不能为空")
+    if len(parsed) > STATUS_STREAM_MAX_TASKS:
+        raise HTTPException(status_code=400, detail=f"单个连接最多订阅 {STATUS_STREAM_MAX_TASKS} 个任务")
+    return parsed
+
+
+def _status_response(task_id: str, state: Optional[TaskState]) -> Dict[str, Any]:
+    """状态查询响应（任务不存在时返回 not_found）"""
+    return state.to_response() if state is not None else not_found_response(task_id)
+
+
+def _stream_user(x_api_key: Optional[str], client_host: Optional[str]) -> str:
+    """连接数限制的用户标识（API Key，未提供时使用客户端 IP）"""
+    return f"key:{x_api_key}" if x_api_key else f"ip:{client_host or 'unknown'}"
+
+
+async def _initial_status_events(task_ids: List[str], last_event_id: Optional[int]) -> List[tuple]:
+    """
+    连接建立（或新增订阅）时发送的事件
+    
+    Last-Event-ID 仍在缓冲区范围内时补发断线期间的事件，否则发送各任务的当前状态
+    """
+    if last_event_id is not None:
+        events, complete = task_events.replay(last_event_id, task_ids)
+        if complete:
+            return [(event.event_id, event.data) for event in events]
+    
+    states = await status_tracker.status_many(task_ids)
+    return [(task_events.last_event_id, _status_response(task_id, states[task_id])) for task_id in task_ids]
+
+
+class _StreamCursor:
+    """单个推送连接已发送的各任务状态版本（过滤补发与实时推送之间的重复事件）"""
+    
+    def __init__(self, task_ids: List[str]):
+        self.versions: Dict[str, int] = {}
+        self.terminal: Dict[str, bool] = {task_id: False for task_id in task_ids}
+    
+    def add(self, task_ids: List[str]):
+        for task_id in task_ids:
+            self.terminal.setdefault(task_id, False)
+    
+    def accept(self, data: Dict[str, Any]) -> bool:
+        task_id = data["task_id"]
+        if data.get("version", 0) <= self.versions.get(task_id, -1):
+            return False
+        self.versions[task_id] = data.get("version", 0)
+        self.terminal[task_id] = data.get("status") in ("completed", "failed", STATUS_NOT_FOUND)
+        return True
+    
+    @property
+    def all_terminal(self) -> bool:
+        return all(self.terminal.values())
+
+
+@app.get("/api/v1/video/status/stream")
+async def stream_video_status(
+    request: Request,
+    task_ids: str,
+    x_api_key: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    任务状态推送（Server-Sent Events）
+    
+    订阅一个或多个任务（task_ids 逗号分隔），状态变化时立即推送 status 事件；
+    定期发送心跳注释。断线重连时浏览器自动带上 Last-Event-ID，补发断线期间的事件。
+    所有订阅的任务结束后服务端关闭连接
+    """
+    parsed_task_ids = _parse_task_ids(task_ids)
+    try:
+        subscription = task_events.subscribe(
+            _stream_user(x_api_key, request.client.host if request.client else None),
+            parsed_task_ids
+        )
+    except TooManyConnectionsError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    resume_from = task_events.parse_event_id(last_event_id_header or last_event_id)
+    
+    def format_event(event_id: int, data: Dict[str, Any]) -> str:
+        return (
+            f"id: {task_events.format_event_id(event_id)}\n"
+            f"event: status\n"
+            f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        )
+    
+    async def stream():
+        with subscription:
+            cursor = _StreamCursor(parsed_task_ids)
+            yield f"retry: {STATUS_STREAM_RETRY_MS}\n\n"
+            for event_id, data in await _initial_status_events(parsed_task_ids, resume_from):
+                if cursor.accept(data):
+                    yield format_event(event_id, data)
+            
+            while not cursor.all_terminal:
+                event = await subscription.next(timeout=STATUS_STREAM_HEARTBEAT_SECONDS)
+                if subscription.overflowed:
+                    # 客户端读取过慢：关闭连接，由客户端按 Last-Event-ID 重连
+                    break
+                if event is None:
+                    yield ": ping\n\n"
+                elif cursor.accept(event.data):
+                    yield format_event(event.event_id, event.data)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/api/v1/video/status/ws")
+async def status_websocket(websocket: WebSocket, x_api_key: Optional[str] = None):
+    """
+    任务状态推送（WebSocket）
+    
+    客户端发送 {"action": "subscribe", "task_ids": [...], "last_event_id": "..."} 订阅任务（可多次发送），
+    服务端推送 {"type": "status", "id": "...", "data": {...}}，并定期发送 {"type": "ping"}。
+    单个连接累计最多订阅 STATUS_STREAM_MAX_TASKS 个任务，超出的任务推送 status 为 error 的状态
+    """
+    try:
+        subscription = task_events.subscribe(
+            _stream_user(x_api_key, websocket.client.host if websocket.client else None),
+            []
+        )
+    except TooManyConnectionsError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    
+    await websocket.accept()
+    cursor = _StreamCursor([])
+    
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            if message.get("action") != "subscribe":
                 continue
-        
-        # 所有 req_key 都失败，检查任务创建时间
-        # 如果任务创建时间超过5分钟，标记为失败（可能是任务不存在或已过期）
+            requested = list(dict.fromkeys(str(task_id) for task_id in message.get("task_ids") or []))
+            room = max(0, STATUS_STREAM_MAX_TASKS - len(subscription.task_ids))
+            new_task_ids = [task_id for task_id in requested if task_id not in subscription.task_ids]
+            rejected = set(new_task_ids[room:])
+            task_ids = [task_id for task_id in requested if task_id not in rejected]
+            subscription.add(task_ids)
+            cursor.add(task_ids)
+            # 经订阅队列发送，避免与推送循环同时写入连接
+            for task_id in rejected:
+                subscription.push(task_events.last_event_id, {
+                    "task_id": task_id,
+                    "status": "error",
+                    "progress": 0,
+                    "video_url": None,
+                    "error": f"单个连接最多订阅 {STATUS_STREAM_MAX_TASKS} 个任务",
+                })
+            if not task_ids:
+                continue
+            resume_from = task_events.parse_event_id(message.get("last_event_id"))
+            for event_id, data in await _initial_status_events(task_ids, resume_from):
+                subscription.push(event_id, data)
+    
+    async def send():
+        while True:
+            event = await subscription.next(timeout=STATUS_STREAM_HEARTBEAT_SECONDS)
+            if subscription.overflowed:
+                await websocket.close(code=1013, reason="消息积压，请重新连接")
+                return
+            if event is None:
+                await websocket.send_json({"type": "ping"})
+            elif cursor.accept(event.data):
+                await websocket.send_json({"type": "status", "id": task_events.format_event_id(event.event_id), "data": event.data})
+    
+    with subscription:
+        receiver = asyncio.ensure_future(receive())
+        sender = asyncio.ensure_future(send())
         try:
-            from backend.database import get_db
-            from backend.video_history import VideoHistoryService
-            from datetime import datetime
-            
-            db = next(get_db())
-            generation = VideoHistoryService.get_generation_by_task_id(db, task_id)
-            
-            if generation:
-                created_at = generation.created_at
-                if isinstance(created_at, str):
-                    created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                
-                elapsed_time = datetime.utcnow() - created_at.replace(tzinfo=None) if created_at.tzinfo else datetime.utcnow() - created_at
-                elapsed_minutes = elapsed_time.total_seconds() / 60
-                
-                # 如果超过5分钟且无法查询到状态，标记为失败
-                if elapsed_minutes > 5:
-                    print(f"⚠️ 任务 {task_id} 无法查询到状态且已等待 {elapsed_minutes:.1f} 分钟，标记为失败")
-                    VideoHistoryService.update_generation_status(
-                        db=db,
-                        task_id=task_id,
-                        status="failed",
-                        error_message=f"无法查询到任务状态，可能任务不存在或已过期（已等待 {elapsed_minutes:.1f} 分钟）"
-                    )
-                    return {
-                        "task_id": task_id,
-                        "status": "failed",
-                        "progress": 0,
-                        "video_url": None,
-                        "error": f"无法查询到任务状态，可能任务不存在或已过期（已等待 {elapsed_minutes:.1f} 分钟）。请重新生成。"
-                    }
-        except Exception:
-            pass
-        
-        # 如果任务创建时间较短，返回处理中状态
+            done, _ = await asyncio.wait([receiver, sender], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is not None and not isinstance(error, WebSocketDisconnect):
+                    print(f"状态推送连接异常: {str(error)}")
+        finally:
+            for task in (receiver, sender):
+                task.cancel()
+
+
+@app.post("/api/v1/video/status/batch")
+async def get_video_status_batch(request: StatusBatchRequest):
+    """
+    批量查询视频生成状态
+    
+    未跟踪的任务用一次数据库查询读取，需要查询上游的任务与后台轮询共享同一次查询。
+    返回 {"statuses": {task_id: 状态}}，状态格式与 /api/v1/video/status/{task_id} 相同
+    """
+    task_ids = list(dict.fromkeys(task_id.strip() for task_id in request.task_ids if task_id and task_id.strip()))
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="task_ids 不能为空")
+    if len(task_ids) > STATUS_BATCH_MAX_TASKS:
+        raise HTTPException(status_code=400, detail=f"单次最多查询 {STATUS_BATCH_MAX_TASKS} 个任务")
+    
+    try:
+        states = await status_tracker.status_many(task_ids)
+    except Exception as e:
         return {
-            "task_id": task_id,
-            "status": "processing",
-            "progress": 30,
-            "video_url": None,
-            "note": "无法查询到任务状态，可能任务不存在或仍在处理中"
+            "statuses": {
+                task_id: {"task_id": task_id, "status": "error", "progress": 0, "video_url": None, "error": str(e)}
+                for task_id in task_ids
+            }
         }
-        
+    return {"statuses": {task_id: _status_response(task_id, states[task_id]) for task_id in task_ids}}
+
+
+@app.get("/api/v1/video/status/{task_id}")
+async def get_video_status(task_id: str, wait: Optional[float] = None, since: Optional[str] = None):
+    """
+    查询视频生成状态
+    
+    读取后台状态跟踪的结果（后台统一轮询即梦 API，不随每次查询调用上游）
+    参考：https://www.volcengine.com/docs/85621/1785204?lang=zh
+    
+    长轮询：传入 wait（秒）和 since（上次返回的 version，或 status / phase）时，
+    状态与 since 相同则等待状态变化或超时后再返回
+    """
+    try:
+        if wait and since is not None:
+            state = await status_tracker.wait(task_id, since, min(wait, STATUS_LONG_POLL_MAX_WAIT_SECONDS))
+        else:
+            state = await status_tracker.status(task_id)
+        return _status_response(task_id, state)
     except Exception as e:
         return {
             "task_id": task_id,
             "status": "error",
             "progress": 0,
-        "video_url": None,
+            "video_url": None,
             "error": str(e)
-    }
+        }
+
+
+# ========== 首帧暂存 API ==========
+
+@app.post("/api/v1/frames")
+async def upload_frame(file: UploadFile = File(...)):
+    """
+    上传首帧图片（multipart 二进制）
+    
+    图片按内容哈希存储，返回 frame_id；生成视频时通过 first_frame_id 引用，
+    重试时无需重复上传 base64 数据
+    """
+    data = await file.read()
+    try:
+        if len(data) > FIRST_FRAME_MAX_BYTES:
+            raise FrameDecodeError(
+                "首帧图片过大",
+                f"首帧图片超过 {FIRST_FRAME_MAX_BYTES // (1024 * 1024)}MB 限制"
+            )
+        if FIRST_FRAME_NORMALIZE:
+            # 存储标准化后的图片，之后的生成请求直接引用
+            data = (await normalize_frame(data)).data
+        stored = await frame_store.save(data, FIRST_FRAME_MAX_BYTES)
+    except FrameDecodeError as e:
+        raise HTTPException(status_code=400, detail=e.detail)
+    return {"success": True, **stored.to_dict()}
+
+
+@app.get("/api/v1/frames/{frame_id}")
+async def get_frame(frame_id: str):
+    """获取已暂存的首帧图片"""
+    if not is_valid_frame_id(frame_id):
+        raise HTTPException(status_code=404, detail="首帧图片不存在")
+    
+    path = frame_store.local_path(frame_id)
+    if path.exists():
+        return FileResponse(path=path, media_type=frame_mime_type(frame_id))
+    
+    # 提交时内联的首帧在后台保存完成前直接从内存返回
+    pending = frame_store.load_pending(frame_id)
+    if pending is not None:
+        return Response(content=pending, media_type=frame_mime_type(frame_id))
+    
+    hosted_url = await frame_store.hosted_url(frame_id)
+    if hosted_url:
+        return RedirectResponse(hosted_url)
+    
+    raise HTTPException(status_code=404, detail="首帧图片不存在")
 
 
 # ========== 资产管理 API ==========
@@ -4,11 +4,11 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, Header
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from .database import get_db, VideoGeneration
+from .database import get_db, session_scope, SessionLocal, VideoGeneration
 from .video_history import VideoHistoryService
 from .auth import AuthService
 from .video_processing import VideoProcessingService
@@ -89,87 +89,75 @@ async def get_video_history(
     - **status**: 筛选状态（pending/processing/completed/failed）
     - **x_api_key**: API Key（可选，用于多用户模式）
     """
+    if not SessionLocal:
+        # 数据库未配置，返回空列表
+        print("数据库未配置，返回空历史记录")
+        return VideoGenerationHistoryResponse(total=0, items=[], limit=limit, offset=offset)
+    
     try:
-        # 尝试获取数据库连接
-        try:
-            from .database import get_db
-            db_gen = get_db()
-            db = next(db_gen)
-        except Exception as db_error:
-            # 数据库未配置，返回空列表
-            print(f"数据库未配置，返回空历史记录: {str(db_error)}")
-            db = None
-        
-        # 获取用户ID（如果数据库不可用，返回默认用户ID）
-        try:
-            user_id = get_current_user_id(x_api_key, db)
-        except Exception as db_init_error:
-            # 数据库未初始化或表不存在，返回空列表
-            print(f"数据库初始化错误: {str(db_init_error)}")
-            return VideoGenerationHistoryResponse(
-                total=0,
-                items=[],
-                limit=limit,
-                offset=offset
-            )
-        
-        # 在获取历史记录前，先清理超时的任务
-        try:
-            cleaned_count = VideoHistoryService.cleanup_timeout_tasks(db, timeout_minutes=5)
-            if cleaned_count > 0:
-                print(f"✅ 已清理 {cleaned_count} 个超时任务")
-        except Exception as cleanup_error:
-            # 清理失败不影响历史记录查询
-            print(f"清理超时任务失败: {str(cleanup_error)}")
-        
-        # 获取历史记录
-        try:
-            generations = VideoHistoryService.get_user_generations(
-                db, user_id, limit=limit, offset=offset, status=status
-            )
+        with session_scope() as db:
+            # 获取用户ID（如果数据库不可用，返回默认用户ID）
+            try:
+                user_id = get_current_user_id(x_api_key, db)
+            except Exception as db_init_error:
+                # 数据库未初始化或表不存在，返回空列表
+                print(f"数据库初始化错误: {str(db_init_error)}")
+                return VideoGenerationHistoryResponse(
+                    total=0,
+                    items=[],
+                    limit=limit,
+                    offset=offset
+                )
+        
+            # 超时任务由后台定时清理（timeout_sweeper），这里只读取
+            # 获取历史记录
+            try:
+                generations = VideoHistoryService.get_user_generations(
+                    db, user_id, limit=limit, offset=offset, status=status
+                )
             
-            # 获取总数
-            total = VideoHistoryService.get_user_generation_count(db, user_id, status=status)
-        except Exception as query_error:
-            # 查询失败，可能是表不存在，返回空列表
-            print(f"查询历史记录失败: {str(query_error)}")
+                # 获取总数
+                total = VideoHistoryService.get_user_generation_count(db, user_id, status=status)
+            except Exception as query_error:
+                # 查询失败，可能是表不存在，返回空列表
+                print(f"查询历史记录失败: {str(query_error)}")
+                return VideoGenerationHistoryResponse(
+                    total=0,
+                    items=[],
+                    limit=limit,
+                    offset=offset
+                )
+        
+            # 转换为响应模型
+            items = [
+                VideoGenerationHistoryItem(
+                    id=gen.id,
+                    task_id=gen.task_id,
+                    prompt=gen.prompt,
+                    duration=gen.duration,
+                    fps=gen.fps,
+                    width=gen.width,
+                    height=gen.height,
+                    status=gen.status,
+                    video_url=gen.video_url,
+                    video_name=gen.video_name,
+                    first_frame_url=getattr(gen, 'first_frame_url', None),
+                    last_frame_url=getattr(gen, 'last_frame_url', None),
+                    created_at=gen.created_at,
+                    completed_at=gen.completed_at,
+                    is_ultra_hd=getattr(gen, 'is_ultra_hd', False),
+                    is_favorite=getattr(gen, 'is_favorite', False),
+                    is_liked=getattr(gen, 'is_liked', False)
+                )
+                for gen in generations
+            ]
+        
             return VideoGenerationHistoryResponse(
-                total=0,
-                items=[],
+                total=total,
+                items=items,
                 limit=limit,
                 offset=offset
             )
-        
-        # 转换为响应模型
-        items = [
-            VideoGenerationHistoryItem(
-                id=gen.id,
-                task_id=gen.task_id,
-                prompt=gen.prompt,
-                duration=gen.duration,
-                fps=gen.fps,
-                width=gen.width,
-                height=gen.height,
-                status=gen.status,
-                video_url=gen.video_url,
-                video_name=gen.video_name,
-                first_frame_url=getattr(gen, 'first_frame_url', None),
-                last_frame_url=getattr(gen, 'last_frame_url', None),
-                created_at=gen.created_at,
-                completed_at=gen.completed_at,
-                is_ultra_hd=getattr(gen, 'is_ultra_hd', False),
-                is_favorite=getattr(gen, 'is_favorite', False),
-                is_liked=getattr(gen, 'is_liked', False)
-            )
-            for gen in generations
-        ]
-        
-        return VideoGenerationHistoryResponse(
-            total=total,
-            items=items,
-            limit=limit,
-            offset=offset
-        )
     except HTTPException:
         raise
     except Exception as e:
@@ -183,13 +171,6 @@ async def get_video_history(
             limit=limit,
             offset=offset
         )
-    finally:
-        # 确保关闭数据库连接
-        if 'db' in locals() and db:
-            try:
-                db.close()
-            except:
-                pass
 
 
 @router.get("/history/{task_id}")
@@ -397,21 +378,13 @@ class EnhanceFPSRequest(BaseModel):
     auto_switch: bool = True  # 是否自动检测大运动并切换
 
 
-@router.post("/history/{generation_id}/enhance-resolution")
-async def enhance_resolution(
-    generation_id: int,
-    request: EnhanceResolutionRequest,
-    x_api_key: Optional[str] = Header(None, alias="X-API-Key"),
-    db: Session = Depends(get_db)
-):
+def _load_enhance_source(generation_id: int, x_api_key: Optional[str]) -> Dict[str, Any]:
     """
-    提升视频分辨率（超分辨率）
+    读取待增强的视频
     
-    支持的方法：
-    - real_esrgan: Real-ESRGAN（默认）
-    - waifu2x: Waifu2x
+    读取后立即关闭会话，视频处理（下载、推理、上传）期间不占用数据库连接
     """
-    try:
+    with session_scope() as db:
         user_id = get_current_user_id(x_api_key, db)
         
         generation = db.query(VideoGeneration).filter(
@@ -428,10 +401,58 @@ async def enhance_resolution(
         if generation.status != "completed":
             raise HTTPException(status_code=400, detail="视频尚未生成完成")
         
+        return {"user_id": user_id, "video_url": generation.video_url}
+
+
+def _save_enhance_result(
+    generation_id: int,
+    source: Dict[str, Any],
+    values: Dict[str, Any],
+    metadata_key: str,
+    metadata: Dict[str, Any]
+):
+    """
+    保存增强结果（重新打开会话）
+    
+    仅当视频在处理期间未被其他请求修改（video_url 未变化）时更新，否则返回 409
+    """
+    with session_scope() as db:
+        generation = db.query(VideoGeneration).filter(
+            VideoGeneration.id == generation_id,
+            VideoGeneration.user_id == source["user_id"],
+            VideoGeneration.video_url == source["video_url"]
+        ).with_for_update().first()
+        
+        if not generation:
+            raise HTTPException(status_code=409, detail="视频在处理期间已被修改或删除，请刷新后重试")
+        
+        for key, value in values.items():
+            setattr(generation, key, value)
+        # JSON 列需要整体赋值才会被识别为修改
+        generation.extra_metadata = {**(generation.extra_metadata or {}), metadata_key: metadata}
+        db.commit()
+
+
+@router.post("/history/{generation_id}/enhance-resolution")
+async def enhance_resolution(
+    generation_id: int,
+    request: EnhanceResolutionRequest,
+    x_api_key: Optional[str] = Header(None, alias="X-API-Key")
+):
+    """
+    提升视频分辨率（超分辨率）
+    
+    支持的方法：
+    - real_esrgan: Real-ESRGAN（默认）
+    - waifu2x: Waifu2x
+    """
+    try:
+        source = _load_enhance_source(generation_id, x_api_key)
+        
         # 调用视频处理服务
         processing_service = VideoProcessingService()
         result = await processing_service.enhance_resolution(
-            video_url=generation.video_url,
+            video_url=source["video_url"],
             method=request.method,
             scale=request.scale
         )
@@ -442,23 +463,24 @@ async def enhance_resolution(
                 detail=f"分辨率提升失败: {result.get('error', '未知错误')}"
             )
         
-        # 更新视频URL和分辨率
-        generation.video_url = result["output_url"]
-        generation.width = result["enhanced_resolution"][0]
-        generation.height = result["enhanced_resolution"][1]
-        generation.is_ultra_hd = True
-        
-        # 更新元数据
-        if not generation.extra_metadata:
-            generation.extra_metadata = {}
-        generation.extra_metadata["enhanced_resolution"] = {
-            "method": result["method"],
-            "original": result["original_resolution"],
-            "enhanced": result["enhanced_resolution"],
-            "processing_time": result["processing_time"]
-        }
-        
-        db.commit()
+        # 更新视频URL、分辨率和元数据
+        _save_enhance_result(
+            generation_id,
+            source,
+            values={
+                "video_url": result["output_url"],
+                "width": result["enhanced_resolution"][0],
+                "height": result["enhanced_resolution"][1],
+                "is_ultra_hd": True,
+            },
+            metadata_key="enhanced_resolution",
+            metadata={
+                "method": result["method"],
+                "original": result["original_resolution"],
+                "enhanced": result["enhanced_resolution"],
+                "processing_time": result["processing_time"]
+            }
+        )
         
         return {
             "success": True,
@@ -480,8 +502,7 @@ async def enhance_resolution(
 async def enhance_fps(
     generation_id: int,
     request: EnhanceFPSRequest,
-    x_api_key: Optional[str] = Header(None, alias="X-API-Key"),
-    db: Session = Depends(get_db)
+    x_api_key: Optional[str] = Header(None, alias="X-API-Key")
 ):
     """
     提升视频帧率（插帧）
@@ -493,21 +514,7 @@ async def enhance_fps(
     如果启用 auto_switch，系统会自动检测大运动并切换到 FILM
     """
     try:
-        user_id = get_current_user_id(x_api_key, db)
-        
-        generation = db.query(VideoGeneration).filter(
-            VideoGeneration.id == generation_id,
-            VideoGeneration.user_id == user_id
-        ).first()
-        
-        if not generation:
-            raise HTTPException(status_code=404, detail="视频记录不存在")
-        
-        if not generation.video_url:
-            raise HTTPException(status_code=400, detail="视频URL不存在")
-        
-        if generation.status != "completed":
-            raise HTTPException(status_code=400, detail="视频尚未生成完成")
+        source = _load_enhance_source(generation_id, x_api_key)
         
         # 如果切换到 FILM，给出提示
         if request.method == "film" or (request.auto_switch and request.method == "rife"):
@@ -517,7 +524,7 @@ async def enhance_fps(
         # 调用视频处理服务
         processing_service = VideoProcessingService()
         result = await processing_service.enhance_fps(
-            video_url=generation.video_url,
+            video_url=source["video_url"],
             target_fps=request.target_fps,
             method=request.method,
             auto_switch=request.auto_switch
@@ -529,22 +536,23 @@ async def enhance_fps(
                 detail=f"帧率提升失败: {result.get('error', '未知错误')}"
             )
         
-        # 更新视频URL和帧率
-        generation.video_url = result["output_url"]
-        generation.fps = result["enhanced_fps"]
-        
-        # 更新元数据
-        if not generation.extra_metadata:
-            generation.extra_metadata = {}
-        generation.extra_metadata["enhanced_fps"] = {
-            "method": result["method"],
-            "original_fps": result["original_fps"],
-            "enhanced_fps": result["enhanced_fps"],
-            "auto_switched": result.get("auto_switched", False),
-            "processing_time": result["processing_time"]
-        }
-        
-        db.commit()
+        # 更新视频URL、帧率和元数据
+        _save_enhance_result(
+            generation_id,
+            source,
+            values={
+                "video_url": result["output_url"],
+                "fps": result["enhanced_fps"],
+            },
+            metadata_key="enhanced_fps",
+            metadata={
+                "method": result["method"],
+                "original_fps": result["original_fps"],
+                "enhanced_fps": result["enhanced_fps"],
+                "auto_switched": result.get("auto_switched", False),
+                "processing_time": result["processing_time"]
+            }
+        )
         
         return {
             "success": True,
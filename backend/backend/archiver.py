@@ -0,0 +1,232 @@
+"""
+已完成视频的转存（归档）
+上游任务完成后，视频由后台工作协程从即梦下载并上传到对象存储，状态查询不等待转存：
+- 同一 task_id 只转存一次（重复提交返回进行中的任务）
+- 边下载边分片上传（内存占用受分片大小限制），报告已下载字节数，用于 archiving 阶段的进度
+- 失败后按指数退避重试，超过最大次数后放弃（继续使用上游 URL）
+"""
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ARCHIVE_WORKERS, ARCHIVE_MAX_ATTEMPTS, ARCHIVE_RETRY_BASE_SECONDS
+
+# 转存任务状态
+ARCHIVE_QUEUED = "queued"
+ARCHIVE_TRANSFERRING = "transferring"
+ARCHIVE_RETRYING = "retrying"
+ARCHIVE_DONE = "done"
+ARCHIVE_FAILED = "failed"
+
+# 下载进度回调的最小间隔（秒）
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+
+class ArchiveJob:
+    """一个视频的转存任务"""
+
+    __slots__ = (
+        "task_id", "source_url", "video_name", "state", "attempts", "bytes_done", "bytes_total",
+        "error", "storage_url", "on_progress", "on_done", "reported_at"
+    )
+
+    def __init__(
+        self,
+        task_id: str,
+        source_url: str,
+        video_name: str,
+        on_progress: Optional[Callable[["ArchiveJob"], None]],
+        on_done: Optional[Callable[["ArchiveJob"], None]]
+    ):
+        self.task_id = task_id
+        self.source_url = source_url
+        self.video_name = video_name
+        self.state = ARCHIVE_QUEUED
+        self.attempts = 0
+        self.bytes_done = 0
+        self.bytes_total: Optional[int] = None
+        self.error: Optional[str] = None
+        self.storage_url: Optional[str] = None
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.reported_at = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "attempts": self.attempts,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+        }
+
+
+class VideoArchiver:
+    """视频转存工作池"""
+
+    def __init__(self, workers: int, max_attempts: int, retry_base_seconds: float):
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self._queue: "asyncio.Queue[ArchiveJob]" = asyncio.Queue()
+        # task_id -> 未结束的转存任务（排队、进行中或等待重试）
+        self._jobs: Dict[str, ArchiveJob] = {}
+        self._tasks: List[asyncio.Task] = []
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.archived = 0
+        self.retries = 0
+        self.failed = 0
+        self.bytes_archived = 0
+
+    def submit(
+        self,
+        task_id: str,
+        source_url: str,
+        video_name: str,
+        on_progress: Optional[Callable[[ArchiveJob], None]] = None,
+        on_done: Optional[Callable[[ArchiveJob], None]] = None
+    ) -> ArchiveJob:
+        """
+        提交转存任务（同一 task_id 已在转存时返回现有任务）
+
+        Args:
+            task_id: 任务 ID
+            source_url: 上游视频 URL
+            video_name: 对象存储中的文件名（保存在 videos/ 下）
+            on_progress: 下载进度回调（限频）
+            on_done: 转存结束回调（job.storage_url 为 None 表示放弃转存）
+        """
+        job = self._jobs.get(task_id)
+        if job is not None:
+            self.deduplicated += 1
+            return job
+        job = self._jobs[task_id] = ArchiveJob(task_id, source_url, video_name, on_progress, on_done)
+        self.submitted += 1
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, task_id: str) -> Optional[ArchiveJob]:
+        return self._jobs.get(task_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                print(f"视频转存异常 (task_id={job.task_id}): {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: ArchiveJob):
+        from .storage import get_storage_service
+
+        storage_service = get_storage_service()
+        if storage_service is None:
+            self._finish(job, None)
+            return
+
+        job.attempts += 1
+        job.state = ARCHIVE_TRANSFERRING
+        job.bytes_done = 0
+        self._report(job, force=True)
+        try:
+            storage_url = await storage_service.upload_from_url(
+                job.source_url,
+                f"videos/{job.video_name}",
+                "video/mp4",
+                progress=lambda downloaded, total: self._on_download(job, downloaded, total)
+            )
+        except Exception as e:
+            job.error = str(e)
+            if job.attempts < self.max_attempts:
+                delay = self.retry_base_seconds * 2 ** (job.attempts - 1)
+                self.retries += 1
+                job.state = ARCHIVE_RETRYING
+                self._report(job, force=True)
+                print(f"⚠️ 视频转存失败，{delay:.0f}s 后重试 (task_id={job.task_id}, 第 {job.attempts} 次): {job.error}")
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job)
+                return
+            self.failed += 1
+            print(f"❌ 视频转存失败，使用原始URL (task_id={job.task_id}): {job.error}")
+            self._finish(job, None)
+            return
+
+        self.archived += 1
+        self.bytes_archived += job.bytes_done
+        print(f"视频已上传到对象存储: {storage_url}")
+        self._finish(job, storage_url)
+
+    def _on_download(self, job: ArchiveJob, downloaded: int, total: Optional[int]):
+        """记录已下载字节数"""
+        job.bytes_done = downloaded
+        job.bytes_total = total
+        self._report(job)
+
+    def _report(self, job: ArchiveJob, force: bool = False):
+        now = time.monotonic()
+        if job.on_progress is None or (not force and now - job.reported_at < PROGRESS_INTERVAL_SECONDS):
+            return
+        job.reported_at = now
+        try:
+            job.on_progress(job)
+        except Exception as e:
+            print(f"转存进度回调失败: {str(e)}")
+
+    def _finish(self, job: ArchiveJob, storage_url: Optional[str]):
+        job.storage_url = storage_url
+        job.state = ARCHIVE_DONE if storage_url else ARCHIVE_FAILED
+        self._jobs.pop(job.task_id, None)
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                print(f"转存完成回调失败: {str(e)}")
+
+    def start(self):
+        """启动转存工作协程"""
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """停止转存（未完成的任务保留上游 URL）"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._jobs:
+            print(f"⚠️ {len(self._jobs)} 个视频未完成转存，继续使用上游 URL")
+
+    def stats(self) -> Dict[str, Any]:
+        states: Dict[str, int] = {}
+        for job in self._jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "workers": self.workers,
+            "jobs": len(self._jobs),
+            "queued": self._queue.qsize(),
+            "states": states,
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "archived": self.archived,
+            "retries": self.retries,
+            "failed": self.failed,
+            "bytes_archived": self.bytes_archived,
+        }
+
+
+video_archiver = VideoArchiver(
+    workers=ARCHIVE_WORKERS,
+    max_attempts=ARCHIVE_MAX_ATTEMPTS,
+    retry_base_seconds=ARCHIVE_RETRY_BASE_SECONDS
+)
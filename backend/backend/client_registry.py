@@ -0,0 +1,161 @@
+"""
+上游客户端注册表
+按 Access Key 为每组凭证保留一个长期存在的客户端（JimengClient），
+避免每次生成、每次状态轮询都重新构造 SDK 对象并重新进行 TCP/TLS 握手
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .jimeng_client import JimengClient
+
+
+def _fingerprint(secret: str) -> str:
+    """Secret Key 的指纹（不在内存中以明文作为比较键）"""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    """注册表中的一条记录"""
+
+    def __init__(self, client: Any, fingerprint: str):
+        self.client = client
+        self.fingerprint = fingerprint
+        self.created_at = time.time()
+        self.hits = 0
+
+
+class ClientRegistry:
+    """
+    凭证 -> 客户端 注册表
+
+    - 同一 Access Key 复用同一个客户端
+    - Secret Key 或 endpoint 变化（凭证轮换）时重建客户端，旧客户端在进行中的请求结束后关闭
+    - 记录 hits / misses / rebuilds 计数
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[..., Any],
+        closer: Optional[Callable[[Any], Any]] = None,
+        retirer: Optional[Callable[[Any], Any]] = None
+    ):
+        """
+        Args:
+            name: 注册表名称（用于统计输出）
+            factory: 创建客户端的函数 factory(access_key_id, secret_access_key, **kwargs)
+            closer: 关闭客户端的函数（可返回协程，应用关闭时使用）
+            retirer: 凭证轮换时关闭旧客户端的函数（可返回协程，应等待进行中的请求结束；未设置时使用 closer）
+        """
+        self.name = name
+        self._factory = factory
+        self._closer = closer
+        self._retirer = retirer or closer
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def get(self, access_key_id: str, secret_access_key: str, **kwargs) -> Any:
+        """获取（或创建）凭证对应的客户端"""
+        fingerprint = _fingerprint(secret_access_key + "|" + repr(sorted(kwargs.items())))
+        stale = None
+
+        with self._lock:
+            entry = self._entries.get(access_key_id)
+            if entry is not None and entry.fingerprint == fingerprint and not self._is_closed(entry.client):
+                entry.hits += 1
+                self.hits += 1
+                return entry.client
+
+            if entry is not None:
+                # 凭证已轮换或客户端已关闭，重建
+                self.rebuilds += 1
+                stale = entry.client
+            else:
+                self.misses += 1
+
+            client = self._factory(access_key_id, secret_access_key, **kwargs)
+            self._entries[access_key_id] = _Entry(client, fingerprint)
+
+        if stale is not None:
+            self._retire(stale)
+        return client
+
+    async def aclose_all(self):
+        """关闭所有客户端（应用关闭时调用）"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            result = self._closer(entry.client) if self._closer else None
+            if asyncio.iscoroutine(result):
+                await result
+
+    def stats(self) -> Dict[str, Any]:
+        """统计信息"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "clients": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "rebuilds": self.rebuilds,
+                "entries": [
+                    {
+                        # 只暴露 Access Key 前缀
+                        "access_key": f"{key[:6]}***" if key else "",
+                        "hits": entry.hits,
+                        "age_seconds": round(time.time() - entry.created_at, 1),
+                    }
+                    for key, entry in self._entries.items()
+                ],
+            }
+
+    @staticmethod
+    def _is_closed(client: Any) -> bool:
+        return bool(getattr(client, "is_closed", False))
+
+    def _retire(self, client: Any):
+        """关闭旧客户端；异步关闭函数在当前事件循环中后台执行（不阻塞获取新客户端的调用方）"""
+        if not self._retirer:
+            return
+        try:
+            result = self._retirer(client)
+            if asyncio.iscoroutine(result):
+                try:
+                    asyncio.get_running_loop().create_task(result)
+                except RuntimeError:
+                    # 没有运行中的事件循环，放弃关闭（连接会随对象回收）
+                    result.close()
+        except Exception as e:
+            print(f"关闭旧客户端失败 ({self.name}): {str(e)}")
+
+
+jimeng_clients = ClientRegistry(
+    "jimeng",
+    factory=lambda ak, sk, endpoint: JimengClient(ak, sk, endpoint=endpoint),
+    closer=lambda client: client.aclose(),
+    retirer=lambda client: client.aclose_when_idle()
+)
+
+
+def get_jimeng_client(access_key_id: str, secret_access_key: str, endpoint: str) -> JimengClient:
+    """获取凭证对应的即梦异步客户端"""
+    return jimeng_clients.get(access_key_id, secret_access_key, endpoint=endpoint.rstrip("/"))
+
+
+async def close_all_clients():
+    """关闭所有注册的客户端"""
+    await jimeng_clients.aclose_all()
+
+
+def get_registry_stats() -> Dict[str, Any]:
+    """所有注册表的统计信息"""
+    return {
+        "jimeng": jimeng_clients.stats(),
+    }
@@ -3,11 +3,15 @@
 使用 Supabase PostgreSQL
 """
 import os
+import threading
+import traceback
+from contextlib import contextmanager
+from fastapi import HTTPException
 from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 # Supabase 数据库连接字符串格式：
 # postgresql://postgres:[YOUR-PASSWORD]@[PROJECT-REF].supabase.co:5432/postgres
@@ -108,8 +112,8 @@ class VideoGeneration(Base):
     seed = Column(Integer, nullable=True)  # 随机种子
     
     # 首尾帧
-    first_frame_url = Column(Text, nullable=True)  # 首帧图片URL（base64或URL）
-    last_frame_url = Column(Text, nullable=True)  # 尾帧图片URL（base64或URL）
+    first_frame_url = Column(Text, nullable=True)  # 首帧图片URL（对象存储URL或 /api/v1/frames/{frame_id}）
+    last_frame_url = Column(Text, nullable=True)  # 尾帧图片URL（对象存储URL或 /api/v1/frames/{frame_id}）
     
     # 视频信息
     video_url = Column(Text, nullable=True)  # 生成的视频URL（对象存储URL）
@@ -124,6 +128,10 @@ class VideoGeneration(Base):
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     completed_at = Column(DateTime, nullable=True)
     
+    # 即梦任务参数（查询任务状态时使用；旧记录由 scripts/backfill_task_columns.py 从 metadata 回填）
+    req_key = Column(String(100), nullable=True, index=True)  # 提交任务时的 req_key
+    version = Column(String(20), nullable=True, index=True)  # 模型版本（如 3.5pro）
+    
     # 扩展元数据（使用 name 参数映射到数据库的 metadata 列）
     extra_metadata = Column('metadata', JSON, nullable=True)  # 扩展元数据（JSON格式）
     
@@ -133,9 +141,33 @@ class VideoGeneration(Base):
     is_liked = Column(Boolean, default=False)  # 是否点赞
 
 
-# 数据库依赖注入
-def get_db():
-    """获取数据库会话"""
+# 会话泄漏检查：开启后记录泄漏会话（未通过 FastAPI 依赖注入正常结束，如 next(get_db()) 后未关闭、
+# 由垃圾回收释放）的获取位置，check_session_leaks() 抛出的 SessionLeakError 中包含这些位置（用于测试 / 排查连接池耗尽）
+DB_SESSION_LEAK_CHECK = os.getenv("DB_SESSION_LEAK_CHECK", "false").lower() == "true"
+
+_session_stats = {"opened": 0, "closed": 0, "leaked": 0}
+# 上次 check_session_leaks() 时的泄漏数
+_leaks_checked = 0
+# 尚未检查的泄漏会话的获取位置（仅 DB_SESSION_LEAK_CHECK 开启时记录，最多保留 MAX_RECORDED_LEAKS 条）
+_leaks: List[str] = []
+MAX_RECORDED_LEAKS = 100
+# 会话在请求和后台线程中打开，计数需要加锁
+_stats_lock = threading.Lock()
+
+
+class SessionLeakError(RuntimeError):
+    """数据库会话未被正常释放"""
+
+
+@contextmanager
+def session_scope() -> Iterator:
+    """
+    数据库会话（工作单元）；请求处理和后台任务都通过这里获取会话，便于统计和泄漏检查
+    
+    with 块结束时关闭会话、归还连接；块内抛出异常时回滚。不自动提交，写入时由调用方 commit。
+    调用上游 API、对象存储等网络 I/O 前应先结束 with 块，需要写入时再重新打开。
+    后台任务在数据库未配置时应先检查 SessionLocal，避免收到 HTTPException
+    """
     if not SessionLocal:
         raise HTTPException(
             status_code=503,
@@ -143,10 +175,109 @@ def get_db():
         )
     
     db = SessionLocal()
+    with _stats_lock:
+        _session_stats["opened"] += 1
     try:
         yield db
+    except BaseException:
+        db.rollback()
+        raise
     finally:
         db.close()
+        with _stats_lock:
+            _session_stats["closed"] += 1
+
+
+# 数据库依赖注入
+def get_db():
+    """获取数据库会话（FastAPI 依赖；不要通过 next(get_db()) 手动获取）"""
+    stack = traceback.format_stack(limit=8) if DB_SESSION_LEAK_CHECK else None
+    with session_scope() as db:
+        try:
+            yield db
+        except GeneratorExit:
+            # 依赖注入结束时生成器会正常运行到结尾；GeneratorExit 说明会话由垃圾回收或手动 close() 释放。
+            # 这里抛出的异常会被垃圾回收忽略，所以只记录，由 check_session_leaks() 报告
+            with _stats_lock:
+                _session_stats["leaked"] += 1
+                if stack and len(_leaks) < MAX_RECORDED_LEAKS:
+                    _leaks.append("".join(stack))
+            hint = "" if DB_SESSION_LEAK_CHECK else "（设置 DB_SESSION_LEAK_CHECK=true 查看获取位置）"
+            print(f"⚠️ 数据库会话未通过依赖注入释放{hint}")
+            raise
+
+
+def _checked_out_connections() -> int:
+    """连接池中已借出的连接数（SQLite 等使用的连接池不支持时返回 0）"""
+    checkedout = getattr(engine.pool, "checkedout", None) if engine else None
+    return checkedout() if checkedout else 0
+
+
+def check_session_leaks(require_closed: bool = True):
+    """
+    检查会话泄漏（测试结束时或排查问题时调用）
+    
+    Args:
+        require_closed: 同时要求当前没有未关闭的会话和借出的连接（只应在没有进行中请求时使用）
+    
+    Raises:
+        SessionLeakError: 上次检查以来有会话泄漏，或仍有未关闭的会话
+    """
+    global _leaks_checked
+    with _stats_lock:
+        leaked = _session_stats["leaked"] - _leaks_checked
+        _leaks_checked = _session_stats["leaked"]
+        stacks = list(_leaks)
+        _leaks.clear()
+        still_open = _session_stats["opened"] - _session_stats["closed"]
+    if leaked:
+        detail = "获取位置：\n" + "\n".join(stacks) if stacks else "设置 DB_SESSION_LEAK_CHECK=true 查看获取位置"
+        raise SessionLeakError(f"{leaked} 个数据库会话未通过依赖注入释放，{detail}")
+    if require_closed:
+        checked_out = _checked_out_connections()
+        if still_open or checked_out:
+            raise SessionLeakError(f"仍有 {still_open} 个数据库会话未关闭、{checked_out} 个连接未归还")
+
+
+def get_session_stats() -> Dict[str, Any]:
+    """数据库会话统计（checked_out 为当前连接池中已借出的连接数）"""
+    return {
+        **_session_stats,
+        "open": _session_stats["opened"] - _session_stats["closed"],
+        "checked_out": _checked_out_connections(),
+        "leak_check": DB_SESSION_LEAK_CHECK,
+    }
+
+
+# 已有数据库需要补充的列和索引（PostgreSQL，可重复执行）
+SCHEMA_MIGRATIONS = (
+    "ALTER TABLE video_generations ADD COLUMN IF NOT EXISTS req_key VARCHAR(100)",
+    "ALTER TABLE video_generations ADD COLUMN IF NOT EXISTS version VARCHAR(20)",
+    "CREATE INDEX IF NOT EXISTS idx_video_generations_req_key ON video_generations(req_key)",
+    "CREATE INDEX IF NOT EXISTS idx_video_generations_version ON video_generations(version)",
+)
+
+
+def ensure_schema() -> bool:
+    """
+    为已有数据库补充新版本使用的列（应用启动时调用）
+    
+    新列为空时按 metadata 读取；历史记录的回填见 scripts/backfill_task_columns.py
+    
+    Returns:
+        是否已确认表结构（数据库未配置或执行失败时返回 False）
+    """
+    if not engine or engine.dialect.name != "postgresql":
+        return False
+    from sqlalchemy import text
+    try:
+        with engine.begin() as conn:
+            for statement in SCHEMA_MIGRATIONS:
+                conn.execute(text(statement))
+        return True
+    except Exception as e:
+        print(f"[ERROR] 更新数据库表结构失败（请手动执行 supabase_init.sql 中的 ALTER TABLE）: {str(e)}")
+        return False
 
 
 # 初始化数据库表
@@ -0,0 +1,163 @@
+"""
+首帧图片 base64 解码与校验
+对 data URL / 纯 base64 字符串只做一次编码复制，之后通过 memoryview 完成
+前缀解析、字符集校验、补齐填充和解码，避免多 MB 字符串被反复复制
+"""
+import base64
+import binascii
+import io
+import os
+import re
+import sys
+from typing import Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FIRST_FRAME_MAX_PIXELS
+
+# 合法的 base64 正文：字母表字符 + 最多两个 '=' 填充
+_BASE64_BODY = re.compile(rb"[A-Za-z0-9+/]*={0,2}")
+# 需要剔除的空白字符
+_WHITESPACE = b" \t\r\n\v\f"
+_WHITESPACE_PATTERN = re.compile(rb"[ \t\r\n\v\f]")
+# data URL 前缀的最大长度（如 "data:image/png;base64,"）
+_MAX_PREFIX_LENGTH = 128
+# 校验时允许的最短 base64 长度（与原有校验一致）
+MIN_BASE64_LENGTH = 100
+
+
+class FrameDecodeError(ValueError):
+    """首帧数据无效"""
+
+    def __init__(self, message: str, detail: str):
+        super().__init__(detail)
+        self.message = message
+        self.detail = detail
+
+
+class DecodedFrame:
+    """解码后的首帧图片"""
+
+    __slots__ = ("data", "mime_type", "width", "height", "format")
+
+    def __init__(self, data: bytes, mime_type: Optional[str], width: int, height: int, format: Optional[str]):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.format = format
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def to_base64(self) -> str:
+        """重新编码为标准 base64（填充正确、无空白），用于 binary_data_base64"""
+        return base64.b64encode(self.data).decode("ascii")
+
+
+def check_pixels(width: int, height: int, max_pixels: int = FIRST_FRAME_MAX_PIXELS):
+    """
+    校验图片像素数（解码像素前按文件头中的宽高判断）
+
+    Raises:
+        FrameDecodeError: 像素数超过限制
+    """
+    if width * height > max_pixels:
+        raise FrameDecodeError(
+            "首帧图片尺寸过大",
+            f"首帧图片 {width}x{height} 超过 {max_pixels} 像素限制"
+        )
+
+
+def read_image_info(data: bytes):
+    """读取图片尺寸并校验像素数（Pillow 只解析文件头，不解码像素）"""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            image_format = image.format
+    except Image.DecompressionBombError as e:
+        raise FrameDecodeError("首帧图片尺寸过大", str(e))
+    except (UnidentifiedImageError, OSError) as e:
+        raise FrameDecodeError("首帧图片数据无效", f"无法识别的图片格式: {str(e)}")
+    check_pixels(width, height)
+    return width, height, image_format
+
+
+def decode_base64_frame(value: str, max_decoded_bytes: int) -> DecodedFrame:
+    """
+    解析并解码首帧 base64 数据
+
+    Args:
+        value: data URL（data:image/png;base64,...）或纯 base64 字符串
+        max_decoded_bytes: 解码后允许的最大字节数
+
+    Returns:
+        DecodedFrame（解码后的字节、MIME 类型、宽高）
+
+    Raises:
+        FrameDecodeError: 数据格式错误、过短、过大或不是图片
+    """
+    try:
+        # 唯一一次整体复制：str -> bytes（非 ASCII 字符直接判定非法）
+        raw = value.encode("ascii")
+    except UnicodeEncodeError:
+        raise FrameDecodeError("首帧图片数据格式错误", "base64 数据包含非法字符")
+
+    # 解析 data URL 前缀（只在开头的有限范围内查找逗号）
+    mime_type = None
+    start = 0
+    comma = raw.find(b",", 0, _MAX_PREFIX_LENGTH)
+    if comma != -1:
+        prefix = raw[:comma]
+        if prefix.startswith(b"data:"):
+            mime_type = prefix[5:].split(b";", 1)[0].decode("ascii") or None
+        start = comma + 1
+
+    view = memoryview(raw)[start:]
+
+    # 仅在确实存在空白字符时才复制一次并剔除
+    if _WHITESPACE_PATTERN.search(view):
+        view = memoryview(view.tobytes().translate(None, _WHITESPACE))
+
+    length = len(view)
+    if length < MIN_BASE64_LENGTH:
+        raise FrameDecodeError("首帧图片数据无效", "首帧图片 base64 数据格式不正确或数据过短")
+
+    # 解码前先按长度估算大小，超限直接拒绝
+    if length * 3 // 4 > max_decoded_bytes:
+        raise FrameDecodeError(
+            "首帧图片过大",
+            f"首帧图片解码后超过 {max_decoded_bytes // (1024 * 1024)}MB 限制"
+        )
+
+    # 字符集校验（re 直接作用于 memoryview，不复制）
+    if _BASE64_BODY.fullmatch(view) is None:
+        raise FrameDecodeError("首帧图片数据格式错误", "base64 数据包含非法字符")
+
+    remainder = length % 4
+    if remainder == 1:
+        raise FrameDecodeError("首帧图片数据格式错误", "base64 数据长度无效")
+
+    try:
+        if remainder:
+            # 缺少填充：主体部分直接解码，尾部补齐 '=' 后单独解码
+            body = length - remainder
+            data = binascii.a2b_base64(view[:body]) + binascii.a2b_base64(
+                view[body:].tobytes() + b"=" * (4 - remainder)
+            )
+        else:
+            data = binascii.a2b_base64(view)
+    except binascii.Error as e:
+        raise FrameDecodeError("首帧图片数据格式错误", f"base64 解码失败: {str(e)}")
+
+    if len(data) > max_decoded_bytes:
+        raise FrameDecodeError(
+            "首帧图片过大",
+            f"首帧图片解码后超过 {max_decoded_bytes // (1024 * 1024)}MB 限制"
+        )
+
+    width, height, image_format = read_image_info(data)
+    return DecodedFrame(data, mime_type, width, height, image_format)
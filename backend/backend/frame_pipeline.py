@@ -0,0 +1,117 @@
+"""
+首帧图片标准化
+提交前将首帧缩放到目标分辨率以内、转为 JPEG 并去除元数据（EXIF 等），
+结果按源图片内容哈希缓存，重复的首帧不再重复处理
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import sys
+from typing import Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    FIRST_FRAME_TARGET_SIZES, FIRST_FRAME_JPEG_QUALITY, FIRST_FRAME_CACHE_SIZE
+)
+from .frame_codec import FrameDecodeError, check_pixels
+from .lru_cache import LRUCache
+
+
+class NormalizedFrame:
+    """标准化后的首帧图片"""
+
+    __slots__ = ("data", "width", "height", "source_size")
+
+    def __init__(self, data: bytes, width: int, height: int, source_size: int):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.source_size = source_size
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.data).decode("ascii")
+
+
+# 源图片哈希 + 目标分辨率 -> NormalizedFrame
+_cache = LRUCache(FIRST_FRAME_CACHE_SIZE)
+
+
+def _target_box(resolution: str, width: int, height: int) -> Tuple[int, int]:
+    """目标尺寸框（竖图时交换宽高）"""
+    box_width, box_height = FIRST_FRAME_TARGET_SIZES.get(resolution, FIRST_FRAME_TARGET_SIZES["1080p"])
+    if height > width:
+        return box_height, box_width
+    return box_width, box_height
+
+
+def _normalize(data: bytes, resolution: str) -> NormalizedFrame:
+    """缩放 + 转 JPEG + 去除元数据（CPU 密集，在线程中执行）"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        # Image.open 只解析文件头：解码像素前先校验尺寸
+        check_pixels(image.width, image.height)
+        # 按 EXIF 方向旋转后再丢弃元数据
+        image = ImageOps.exif_transpose(image)
+    except Image.DecompressionBombError as e:
+        raise FrameDecodeError("首帧图片尺寸过大", str(e))
+    except (UnidentifiedImageError, OSError) as e:
+        raise FrameDecodeError("首帧图片数据无效", f"无法识别的图片格式: {str(e)}")
+
+    # 只缩小不放大
+    image.thumbnail(_target_box(resolution, image.width, image.height), Image.LANCZOS)
+
+    # 透明通道合成到白色背景，其它模式统一转 RGB
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    output = io.BytesIO()
+    # 不传 exif / icc_profile 参数，输出中不包含元数据
+    image.save(output, format="JPEG", quality=FIRST_FRAME_JPEG_QUALITY, optimize=True)
+    return NormalizedFrame(output.getvalue(), image.width, image.height, len(data))
+
+
+async def normalize_frame(data: bytes, resolution: str = "1080p") -> NormalizedFrame:
+    """
+    标准化首帧图片（带缓存）
+
+    Args:
+        data: 源图片二进制数据
+        resolution: 目标分辨率（如 "1080p"）
+
+    Returns:
+        NormalizedFrame
+
+    Raises:
+        FrameDecodeError: 图片无法识别或尺寸过大
+    """
+    key = (hashlib.sha256(data).hexdigest(), resolution)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    normalized = await asyncio.to_thread(_normalize, data, resolution)
+    _cache.set(key, normalized)
+    print(
+        f"[DEBUG] 首帧标准化: {normalized.source_size} -> {normalized.size} 字节, "
+        f"{normalized.width}x{normalized.height}"
+    )
+    return normalized
+
+
+def get_cache_stats():
+    """缓存统计"""
+    return _cache.stats()
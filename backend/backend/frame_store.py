@@ -0,0 +1,243 @@
+"""
+首帧图片暂存服务
+图片按内容哈希寻址（sha256），上传一次后在生成请求中通过 frame_id 引用；
+配置了对象存储时上传到对象存储并使用其 URL，否则保存在本地磁盘。
+生成记录中只保存图片的 URL（对象存储 URL 或 /api/v1/frames/{frame_id}），不保存 base64 数据
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FRAMES_DIR
+from .frame_codec import read_image_info, decode_base64_frame, FrameDecodeError
+
+# 对象存储中的前缀
+FRAMES_OBJECT_PREFIX = "frames"
+
+# 本地暂存图片的访问路径
+FRAMES_ROUTE = "/api/v1/frames"
+
+# 支持的图片格式 -> (扩展名, MIME 类型)
+FRAME_FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "WEBP": ("webp", "image/webp"),
+    "GIF": ("gif", "image/gif"),
+}
+_EXT_TO_MIME = {ext: mime for ext, mime in FRAME_FORMATS.values()}
+
+# frame_id 格式：sha256 + 扩展名
+_FRAME_ID_PATTERN = re.compile(r"^[0-9a-f]{64}\.(jpg|png|webp|gif)$")
+
+
+class StoredFrame:
+    """已暂存的首帧图片"""
+
+    def __init__(self, frame_id: str, size: int, width: int, height: int, url: Optional[str] = None):
+        self.frame_id = frame_id
+        self.size = size
+        self.width = width
+        self.height = height
+        self.url = url
+
+    def to_dict(self):
+        return {
+            "frame_id": self.frame_id,
+            "size": self.size,
+            "width": self.width,
+            "height": self.height,
+            "url": self.url,
+        }
+
+
+def is_valid_frame_id(frame_id: str) -> bool:
+    """检查 frame_id 格式"""
+    return bool(frame_id) and _FRAME_ID_PATTERN.match(frame_id) is not None
+
+
+def is_inline_frame(value: Optional[str]) -> bool:
+    """是否为内联的图片数据（base64 / data URL），而不是 URL 引用"""
+    return bool(value) and not value.startswith(("http://", "https://", f"{FRAMES_ROUTE}/"))
+
+
+def frame_mime_type(frame_id: str) -> str:
+    """frame_id 对应的 MIME 类型"""
+    return _EXT_TO_MIME.get(frame_id.rsplit(".", 1)[-1], "application/octet-stream")
+
+
+class FrameStore:
+    """内容寻址的首帧图片存储"""
+
+    def __init__(self, local_dir: Path):
+        self.local_dir = local_dir
+        # 已确认上传到对象存储的 frame_id（避免重复上传）
+        self._uploaded = set()
+        # frame_id -> 后台保存中的图片数据（保存完成前通过 load_pending 读取）
+        self._pending: Dict[str, bytes] = {}
+        self._tasks = set()
+
+    def _storage(self):
+        from .storage import get_storage_service
+        return get_storage_service()
+
+    def local_path(self, frame_id: str) -> Path:
+        return self.local_dir / frame_id
+
+    def _identify(self, data: bytes, max_bytes: int) -> StoredFrame:
+        """校验图片并计算 frame_id（不保存）"""
+        if not data:
+            raise FrameDecodeError("首帧图片数据无效", "上传的文件为空")
+        if len(data) > max_bytes:
+            raise FrameDecodeError(
+                "首帧图片过大",
+                f"首帧图片超过 {max_bytes // (1024 * 1024)}MB 限制"
+            )
+
+        width, height, image_format = read_image_info(data)
+        if image_format not in FRAME_FORMATS:
+            raise FrameDecodeError("首帧图片格式不支持", f"不支持的图片格式: {image_format}")
+
+        ext, _ = FRAME_FORMATS[image_format]
+        frame_id = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        return StoredFrame(frame_id, len(data), width, height)
+
+    async def save(self, data: bytes, max_bytes: int) -> StoredFrame:
+        """
+        保存图片
+
+        Args:
+            data: 图片二进制数据
+            max_bytes: 允许的最大字节数
+
+        Raises:
+            FrameDecodeError: 图片过大或格式不支持
+        """
+        stored = self._identify(data, max_bytes)
+        stored.url = await self._store(stored.frame_id, data)
+        return stored
+
+    def save_in_background(self, data: bytes, max_bytes: int) -> StoredFrame:
+        """
+        校验图片后在后台保存（不等待上传），返回的 StoredFrame 不含 URL，
+        图片地址使用 /api/v1/frames/{frame_id}（保存前读取 load_pending，保存后读取本地副本或跳转到对象存储）
+
+        Raises:
+            FrameDecodeError: 图片过大或格式不支持
+        """
+        stored = self._identify(data, max_bytes)
+        frame_id = stored.frame_id
+        if frame_id not in self._pending and frame_id not in self._uploaded:
+            self._pending[frame_id] = data
+            task = asyncio.get_running_loop().create_task(self._store_pending(frame_id, data))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return stored
+
+    async def _store_pending(self, frame_id: str, data: bytes):
+        try:
+            await self._store(frame_id, data)
+        except Exception as e:
+            print(f"首帧图片保存失败 ({frame_id}): {str(e)}")
+        finally:
+            self._pending.pop(frame_id, None)
+
+    def load_pending(self, frame_id: str) -> Optional[bytes]:
+        """后台保存中的图片数据"""
+        return self._pending.get(frame_id)
+
+    async def drain(self):
+        """等待后台保存完成（应用关闭时调用）"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def _store(self, frame_id: str, data: bytes) -> Optional[str]:
+        """上传到对象存储，不可用或失败时保存到本地磁盘；返回对象存储 URL"""
+        url = None
+        storage = self._storage()
+        if storage:
+            object_key = f"{FRAMES_OBJECT_PREFIX}/{frame_id}"
+            if frame_id in self._uploaded:
+                url = storage.get_object_url(object_key)
+            else:
+                url = await storage.upload_bytes(data, object_key, frame_mime_type(frame_id))
+                if url:
+                    self._uploaded.add(frame_id)
+
+        if not url:
+            # 对象存储不可用或上传失败，保存到本地磁盘（在线程中写入，不阻塞事件循环）
+            await asyncio.to_thread(self._write_local, frame_id, data)
+
+        return url
+
+    def _write_local(self, frame_id: str, data: bytes):
+        path = self.local_path(frame_id)
+        if path.exists():
+            return
+        self.local_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def reference(self, stored: StoredFrame) -> str:
+        """保存到生成记录中的图片地址"""
+        return stored.url or f"{FRAMES_ROUTE}/{stored.frame_id}"
+
+    async def externalize(self, value: Optional[str], max_bytes: int) -> Optional[str]:
+        """
+        将内联的 base64 图片保存到存储中，返回图片地址；URL 原样返回
+
+        Raises:
+            FrameDecodeError: base64 数据无效
+        """
+        if not is_inline_frame(value):
+            return value
+        decoded = decode_base64_frame(value, max_bytes)
+        return self.reference(await self.save(decoded.data, max_bytes))
+
+    async def hosted_url(self, frame_id: str) -> Optional[str]:
+        """
+        对象存储中的 URL
+
+        本地存在副本时优先使用本地，返回 None；未确认上传过的图片先查询对象是否存在，不存在或查询失败时返回 None
+        """
+        if self.local_path(frame_id).exists():
+            return None
+        storage = self._storage()
+        if not storage:
+            return None
+        object_key = f"{FRAMES_OBJECT_PREFIX}/{frame_id}"
+        if frame_id not in self._uploaded:
+            try:
+                exists = await storage.object_exists(object_key)
+            except Exception as e:
+                print(f"查询首帧图片是否存在失败 ({frame_id}): {str(e)}")
+                return None
+            if not exists:
+                return None
+            self._uploaded.add(frame_id)
+        return storage.get_object_url(object_key)
+
+    async def load_base64(self, frame_id: str) -> Optional[str]:
+        """读取本地副本（或后台保存中的数据）并编码为 base64（在线程中读取）"""
+        pending = self._pending.get(frame_id)
+        if pending is not None:
+            return base64.b64encode(pending).decode("ascii")
+        return await asyncio.to_thread(self._read_base64, frame_id)
+
+    def _read_base64(self, frame_id: str) -> Optional[str]:
+        path = self.local_path(frame_id)
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode("ascii")
+
+
+frame_store = FrameStore(Path(FRAMES_DIR))
@@ -0,0 +1,116 @@
+"""
+视频生成请求去重
+- 优先使用请求头 Idempotency-Key，否则使用请求内容指纹（提示词、首帧哈希、种子、帧数等）
+- 并发的相同请求合并为一次上游提交（single-flight）；执行提交的请求被取消（如客户端断开）时，
+  等待中的请求重新检查，由其中一个重新执行提交
+- 时间窗口内重复的请求直接返回首次提交的结果（同一个 task_id）
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SUBMIT_DEDUP_WINDOW_SECONDS
+from .lru_cache import LRUCache
+
+# 执行提交的请求被取消时交给等待者的结果（等待者重新执行，不随之取消）
+_LEADER_CANCELLED = object()
+
+
+def content_fingerprint(fields: Dict[str, Any]) -> str:
+    """请求内容指纹"""
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def frame_digest(value: Optional[str]) -> Optional[str]:
+    """首帧数据的哈希（避免把多 MB 的 base64 放进指纹）"""
+    if not value:
+        return None
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class SubmissionDeduplicator:
+    """提交去重（single-flight + 结果窗口缓存）"""
+
+    def __init__(self, window_seconds: float, max_entries: int = 1024):
+        self.window_seconds = window_seconds
+        self._results = LRUCache(max_entries, ttl_seconds=window_seconds)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.replayed = 0
+        self.coalesced = 0
+        self.executed = 0
+
+    async def run(
+        self,
+        key: Optional[str],
+        func: Callable[[], Awaitable[Any]],
+        is_success: Callable[[Any], bool]
+    ) -> Tuple[Any, bool]:
+        """
+        执行提交（相同 key 的请求只执行一次）
+
+        Args:
+            key: 去重键（None 时不去重）
+            func: 实际的提交函数
+            is_success: 判断结果是否成功（只有成功结果会在时间窗口内复用）
+
+        Returns:
+            (结果, 是否为重复请求)
+        """
+        if not key or self.window_seconds <= 0:
+            self.executed += 1
+            return await func(), False
+
+        while True:
+            cached = self._results.get(key)
+            if cached is not None:
+                self.replayed += 1
+                return cached, True
+
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            result = await asyncio.shield(future)
+            if result is not _LEADER_CANCELLED:
+                return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.executed += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # 只取消当前请求：等待者重新检查，其中一个重新执行提交
+            future.set_result(_LEADER_CANCELLED)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            if is_success(result):
+                self._results.set(key, result)
+            future.set_result(result)
+            return result, False
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_seconds": self.window_seconds,
+            "inflight": len(self._inflight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "replayed": self.replayed,
+            "cache": self._results.stats(),
+        }
+
+
+submission_deduplicator = SubmissionDeduplicator(SUBMIT_DEDUP_WINDOW_SECONDS)
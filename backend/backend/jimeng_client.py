@@ -0,0 +1,273 @@
+"""
+即梦 AI 异步客户端
+基于 httpx.AsyncClient，使用 volcengine_auth.generate_signature 签名，
+复用连接池（keep-alive），可在事件循环中并发 await，不再阻塞其他请求
+参考：https://www.volcengine.com/docs/85621/1785204?lang=zh
+"""
+import asyncio
+import json
+from typing import Dict, Any, Optional, List
+from urllib.parse import urlparse
+
+import httpx
+
+from .volcengine_auth import generate_signature, format_query
+
+# 即梦视觉接口的 Action / Version（与官方 SDK VisualService 保持一致）
+SUBMIT_TASK_ACTION = "CVSync2AsyncSubmitTask"
+GET_RESULT_ACTION = "CVSync2AsyncGetResult"
+API_VERSION = "2022-08-31"
+
+# 签名使用的区域和服务名
+REGION = "cn-north-1"
+SERVICE = "cv"
+
+# 业务错误码
+CODE_SUCCESS = 10000
+CODE_ACCESS_DENIED = 50400
+CODE_CONCURRENT_LIMIT = 50430
+
+
+class JimengAPIError(Exception):
+    """即梦 API 返回的业务错误"""
+
+    def __init__(self, message: str, code: Optional[Any] = None):
+        super().__init__(message)
+        self.code = code
+
+    @property
+    def is_concurrency_limit(self) -> bool:
+        """是否为并发限制错误（50430）"""
+        return self.code == CODE_CONCURRENT_LIMIT or "concurrent" in str(self).lower()
+
+
+def extract_task_id(api_result: Dict[str, Any]) -> str:
+    """
+    从提交任务的响应中提取 task_id
+
+    返回的格式可能是：
+    1. 直接返回 {"code": 10000, "data": {"task_id": "..."}, ...}
+    2. 或者返回 {"ResponseMetadata": {...}, "Result": {...}}
+
+    Raises:
+        JimengAPIError: 上游返回错误或响应中没有 task_id
+    """
+    response_code = api_result.get("code")
+    if response_code is None and "ResponseMetadata" in api_result:
+        # 火山引擎格式，检查 ResponseMetadata
+        metadata = api_result["ResponseMetadata"]
+        if "Error" in metadata:
+            error_info = metadata["Error"]
+            error_code = error_info.get("Code", "Unknown")
+            error_message = error_info.get("Message", "未知错误")
+            request_id = metadata.get("RequestId", "")
+            raise JimengAPIError(
+                f"即梦 API 调用失败: 错误码={error_code}, 错误信息={error_message}, RequestId={request_id}",
+                code=error_code
+            )
+        # 如果没有错误，检查 Result
+        result = api_result.get("Result") or {}
+        task_id = result.get("task_id") or result.get("TaskId")
+        if not task_id:
+            raise JimengAPIError("即梦 API 响应格式异常，未找到 task_id")
+        return task_id
+
+    if response_code != CODE_SUCCESS:
+        error_msg = api_result.get("message", "未知错误")
+        request_id = api_result.get("request_id", "")
+
+        # 特殊处理 Access Denied 错误 (50400)
+        if response_code == CODE_ACCESS_DENIED or "Access Denied" in error_msg:
+            raise JimengAPIError(
+                f"即梦 API 认证失败 (50400): {error_msg}\n"
+                f"请检查：\n"
+                f"1. 环境变量 VOLCENGINE_ACCESS_KEY_ID 和 VOLCENGINE_SECRET_ACCESS_KEY 是否正确配置\n"
+                f"2. API 密钥是否有权限访问即梦 API 服务\n"
+                f"3. API 密钥是否已过期或被禁用\n"
+                f"4. 即梦 API 服务是否已开通\n"
+                f"RequestId: {request_id}\n"
+                f"详细说明请查看: jubianai/ACCESS_DENIED_FIX.md",
+                code=response_code
+            )
+
+        # 特殊处理并发限制错误
+        if response_code == CODE_CONCURRENT_LIMIT or "concurrent" in error_msg.lower():
+            raise JimengAPIError(
+                f"即梦 API 并发限制: {error_msg}。请稍后重试，或等待其他任务完成。",
+                code=CODE_CONCURRENT_LIMIT
+            )
+
+        raise JimengAPIError(
+            f"即梦 API 调用失败: code={response_code}, message={error_msg}, request_id={request_id}",
+            code=response_code
+        )
+
+    # 从即梦 API 响应中提取任务 ID
+    task_id = (api_result.get("data") or {}).get("task_id")
+    if not task_id:
+        raise JimengAPIError("即梦 API 响应中未找到 task_id，请检查响应格式")
+    return task_id
+
+
+class JimengClient:
+    """即梦 AI 异步客户端（单个实例内复用 TCP/TLS 连接）"""
+
+    def __init__(
+        self,
+        access_key_id: str,
+        secret_access_key: str,
+        endpoint: str = "https://visual.volcengineapi.com",
+        timeout: float = 60.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10
+    ):
+        """
+        Args:
+            access_key_id: Access Key ID
+            secret_access_key: Secret Access Key
+            endpoint: 即梦 API 地址（如 https://visual.volcengineapi.com）
+            timeout: 单次请求超时（秒）
+            max_connections: 连接池最大连接数
+            max_keepalive_connections: 连接池保持的空闲连接数
+        """
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.endpoint = endpoint.rstrip("/")
+        self.host = urlparse(self.endpoint).netloc
+        self.timeout = timeout
+        # 进行中的请求数（凭证轮换后等这些请求结束再关闭连接池）
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            )
+        )
+
+    @property
+    def is_closed(self) -> bool:
+        return self._client.is_closed
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self._client.aclose()
+
+    async def aclose_when_idle(self):
+        """等待进行中的请求结束后关闭连接池（最多等待一个请求超时时间）"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ 旧即梦客户端仍有 {self._inflight} 个请求未结束，强制关闭")
+        await self.aclose()
+
+    async def _post(self, action: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        发送签名后的 POST 请求
+
+        Returns:
+            即梦 API 返回的 JSON（包括业务错误，如 code=50430）
+        """
+        query = {"Action": action, "Version": API_VERSION}
+        body_str = json.dumps(body, ensure_ascii=False)
+
+        headers = generate_signature(
+            access_key_id=self.access_key_id,
+            secret_access_key=self.secret_access_key,
+            method="POST",
+            uri="/",
+            query=query,
+            headers={"Content-Type": "application/json"},
+            body=body_str,
+            host=self.host,
+            region=REGION,
+            service=SERVICE
+        )
+
+        url = f"{self.endpoint}/?{format_query(query)}"
+        self._inflight += 1
+        self._idle.clear()
+        try:
+            response = await self._client.post(url, content=body_str.encode("utf-8"), headers=headers)
+        except httpx.HTTPError as e:
+            raise Exception(f"请求即梦 API 失败: {type(e).__name__}: {str(e)}")
+        finally:
+            self._inflight -= 1
+            if not self._inflight:
+                self._idle.set()
+
+        # 业务错误（如 50430 并发限制）也以 JSON 返回，交给调用方按 code 处理
+        try:
+            return response.json()
+        except ValueError:
+            raise Exception(f"即梦 API 返回非 JSON 响应: status={response.status_code}, body={response.text[:200]}")
+
+    async def submit_video_task(
+        self,
+        req_key: str,
+        prompt: str,
+        frames: int = 121,
+        seed: int = -1,
+        image_urls: Optional[List[str]] = None,
+        binary_data_base64: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        提交视频生成任务
+
+        Args:
+            req_key: 请求键（如 "i2v_first_v30_1080_jimeng"）
+            prompt: 提示词
+            frames: 帧数（121 或 241）
+            seed: 随机种子（-1 表示随机）
+            image_urls: 图片 URL 列表
+            binary_data_base64: Base64 编码的图片数据列表
+
+        Returns:
+            API 响应结果
+        """
+        params: Dict[str, Any] = {
+            "req_key": req_key,
+            "prompt": prompt,
+            "frames": frames,
+            "seed": seed,
+        }
+
+        # 图片输入二选一：binary_data_base64 优先
+        if binary_data_base64:
+            binary_data_base64 = [str(item) for item in binary_data_base64 if item]
+            if binary_data_base64:
+                params["binary_data_base64"] = binary_data_base64
+        elif image_urls:
+            image_urls = [str(url) for url in image_urls if url]
+            if image_urls:
+                params["image_urls"] = image_urls
+
+        print(f"[DEBUG] 提交参数: req_key={req_key}, prompt长度={len(prompt)}, frames={frames}, seed={seed}")
+        print(f"[DEBUG] 图片数据: binary_data_base64={bool(params.get('binary_data_base64'))}, image_urls={bool(params.get('image_urls'))}")
+
+        return await self._post(SUBMIT_TASK_ACTION, params)
+
+    async def query_video_task(self, req_key: str, task_id: str) -> Dict[str, Any]:
+        """
+        查询视频生成任务状态
+
+        Args:
+            req_key: 请求键
+            task_id: 任务 ID
+
+        Returns:
+            API 响应结果
+        """
+        params = {
+            "req_key": req_key,
+            "task_id": task_id,
+        }
+
+        try:
+            return await self._post(GET_RESULT_ACTION, params)
+        except Exception as e:
+            raise Exception(f"查询任务失败: {str(e)}")
+
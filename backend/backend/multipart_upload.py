@@ -0,0 +1,338 @@
+"""
+对象存储分片上传（COS / OSS / S3 共用）
+- 按分片大小切分，多个分片并发上传，每个分片失败后按指数退避重试
+- 本地文件上传时把 upload_id 和已完成的分片保存到状态目录，中断后再次上传同一文件会从已完成的分片之后继续
+- 按存储后端统计上传字节数、耗时和吞吐量
+
+存储后端只需实现 StorageService 中的同步分片接口（_create_multipart_upload 等），上传逻辑都在这里；
+分片接口通过 StorageService._call 在存储线程池中执行（见 storage_executor.py）
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    STORAGE_PART_SIZE_MB, STORAGE_UPLOAD_CONCURRENCY, STORAGE_PART_MAX_ATTEMPTS, STORAGE_UPLOAD_STATE_DIR
+)
+
+logger = logging.getLogger(__name__)
+
+# 分片大小
+STORAGE_PART_SIZE = STORAGE_PART_SIZE_MB * 1024 * 1024
+# 分片重试的基础等待时间（秒）
+PART_RETRY_BASE_SECONDS = 1
+# 续传状态的有效期（秒）；未完成的分片上传在存储端通常 7 天后被清理
+UPLOAD_STATE_MAX_AGE_SECONDS = 6 * 24 * 3600
+
+
+class UploadMetrics:
+    """一个存储后端的上传统计"""
+
+    __slots__ = ("uploads", "multipart_uploads", "failed", "bytes", "parts", "part_retries", "resumed_parts", "seconds")
+
+    def __init__(self):
+        self.uploads = 0
+        self.multipart_uploads = 0
+        self.failed = 0
+        self.bytes = 0
+        self.parts = 0
+        self.part_retries = 0
+        self.resumed_parts = 0
+        self.seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "uploads": self.uploads,
+            "multipart_uploads": self.multipart_uploads,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "parts": self.parts,
+            "part_retries": self.part_retries,
+            "resumed_parts": self.resumed_parts,
+            "seconds": round(self.seconds, 3),
+            "throughput_bytes_per_second": int(self.bytes / self.seconds) if self.seconds > 0 else 0,
+        }
+
+
+class _UploadState:
+    """本地文件的续传状态（upload_id 和已完成的分片）"""
+
+    def __init__(self, path: Path, data: Dict[str, Any]):
+        self.path = path
+        self.data = data
+
+    @property
+    def upload_id(self) -> Optional[str]:
+        return self.data.get("upload_id")
+
+    @property
+    def parts(self) -> Dict[int, str]:
+        return {int(number): etag for number, etag in self.data.get("parts", {}).items()}
+
+    def add_part(self, part_number: int, etag: str):
+        self.data.setdefault("parts", {})[str(part_number)] = etag
+        self.save()
+
+    def save(self):
+        self.data["updated_at"] = time.time()
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.data), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class MultipartUploader:
+    """分片上传器"""
+
+    def __init__(self, part_size: int, concurrency: int, part_max_attempts: int, state_dir: Path):
+        self.part_size = part_size
+        self.concurrency = max(1, concurrency)
+        self.part_max_attempts = max(1, part_max_attempts)
+        self.state_dir = state_dir
+        self._metrics: Dict[str, UploadMetrics] = {}
+
+    def metrics(self, backend: str) -> UploadMetrics:
+        metrics = self._metrics.get(backend)
+        if metrics is None:
+            metrics = self._metrics[backend] = UploadMetrics()
+        return metrics
+
+    async def _upload_part(self, storage, object_key: str, upload_id: str, part_number: int, data: bytes) -> Dict[str, Any]:
+        """上传一个分片（失败后重试）"""
+        metrics = self.metrics(storage.name)
+        attempt = 1
+        while True:
+            try:
+                part = await storage._call(storage._upload_part, object_key, upload_id, part_number, data)
+                metrics.parts += 1
+                return part
+            except Exception as e:
+                # upload_id 已失效时重试没有意义
+                if attempt >= self.part_max_attempts or storage._is_upload_missing(e):
+                    raise
+                delay = PART_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+                metrics.part_retries += 1
+                logger.warning(f"分片上传失败，{delay}s 后重试 ({object_key} 第 {part_number} 片，第 {attempt} 次): {str(e)}")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _abort(self, storage, object_key: str, upload_id: str):
+        try:
+            await storage._call(storage._abort_multipart_upload, object_key, upload_id)
+        except Exception as e:
+            logger.warning(f"取消分片上传失败 ({object_key}): {str(e)}")
+
+    async def upload_stream(self, storage, chunks: AsyncIterator[bytes], object_key: str, content_type: str) -> str:
+        """
+        分片上传数据流
+
+        数据不足一个分片时直接上传；否则每凑满一个分片就开始上传，最多 concurrency 个分片同时上传，
+        内存占用约为 (concurrency + 1) 个分片。数据流无法续传，失败时取消分片上传
+
+        Returns:
+            对象存储中的URL
+
+        Raises:
+            上传失败时抛出异常
+        """
+        metrics = self.metrics(storage.name)
+        started = time.monotonic()
+        buffer = bytearray()
+        upload_id: Optional[str] = None
+        inflight: List[asyncio.Future] = []
+        parts: List[Dict[str, Any]] = []
+        part_number = 0
+        total = 0
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                total += len(chunk)
+                while len(buffer) >= self.part_size:
+                    data = bytes(buffer[:self.part_size])
+                    del buffer[:self.part_size]
+                    if upload_id is None:
+                        upload_id = await storage._call(storage._create_multipart_upload, object_key, content_type)
+                    if len(inflight) >= self.concurrency:
+                        # 等最早的分片上传完成，限制内存占用
+                        parts.append(await inflight.pop(0))
+                    part_number += 1
+                    inflight.append(asyncio.ensure_future(
+                        self._upload_part(storage, object_key, upload_id, part_number, data)
+                    ))
+
+            if upload_id is None:
+                url = await storage.upload_bytes(bytes(buffer), object_key, content_type)
+                if not url:
+                    raise RuntimeError("上传到对象存储失败")
+            else:
+                if buffer:
+                    part_number += 1
+                    inflight.append(asyncio.ensure_future(
+                        self._upload_part(storage, object_key, upload_id, part_number, bytes(buffer))
+                    ))
+                parts.extend(await asyncio.gather(*inflight))
+                inflight = []
+                await storage._call(storage._complete_multipart_upload, object_key, upload_id, parts)
+                url = storage.get_object_url(object_key)
+                metrics.multipart_uploads += 1
+        except BaseException:
+            metrics.failed += 1
+            for future in inflight:
+                future.cancel()
+            if inflight:
+                # 等待正在上传的分片结束后再取消整个上传
+                await asyncio.gather(*inflight, return_exceptions=True)
+            if upload_id is not None:
+                await self._abort(storage, object_key, upload_id)
+            raise
+
+        metrics.uploads += 1
+        metrics.bytes += total
+        metrics.seconds += time.monotonic() - started
+        return url
+
+    def _load_state(self, storage, file_path: Path, object_key: str) -> _UploadState:
+        """读取文件的续传状态（文件、目标或分片大小变化后状态失效）"""
+        stat = file_path.stat()
+        identity = {
+            "backend": storage.name,
+            "bucket": getattr(storage, "bucket_name", None),
+            "object_key": object_key,
+            "file": str(file_path.resolve()),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "part_size": self.part_size,
+        }
+        digest = hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        path = self.state_dir / f"{digest}.json"
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("identity") == identity and time.time() - data.get("updated_at", 0) < UPLOAD_STATE_MAX_AGE_SECONDS:
+                return _UploadState(path, data)
+        except (FileNotFoundError, ValueError):
+            pass
+        return _UploadState(path, {"identity": identity})
+
+    async def upload_file(self, storage, file_path: Path, object_key: str, content_type: str) -> str:
+        """
+        分片上传本地文件（支持续传）
+
+        已完成的分片记录在状态目录中；上传中断（进程退出、分片重试次数用完）后再次上传同一文件到同一位置时，
+        只上传剩余的分片。存储端报告续传的 upload_id 不存在（NoSuchUpload）时，丢弃续传状态并重新上传一次；
+        其他错误保留续传状态
+
+        Returns:
+            对象存储中的URL
+
+        Raises:
+            上传失败时抛出异常（保留续传状态，不取消分片上传）
+        """
+        file_path = Path(file_path)
+        metrics = self.metrics(storage.name)
+        started = time.monotonic()
+        size = file_path.stat().st_size
+        try:
+            if size <= self.part_size:
+                url = await storage.upload_bytes(await asyncio.to_thread(file_path.read_bytes), object_key, content_type)
+                if not url:
+                    raise RuntimeError("上传到对象存储失败")
+            else:
+                state = self._load_state(storage, file_path, object_key)
+                resumed_upload_id = state.upload_id
+                try:
+                    url = await self._upload_file_parts(storage, state, file_path, size, object_key, content_type)
+                except Exception as e:
+                    if resumed_upload_id is None or not storage._is_upload_missing(e):
+                        raise
+                    # 之前保存的 upload_id 已在存储端失效（过期或被清理），从头重新上传
+                    logger.warning(f"续传的分片上传已不存在，重新上传 ({object_key}): {str(e)}")
+                    state.remove()
+                    state = self._load_state(storage, file_path, object_key)
+                    url = await self._upload_file_parts(storage, state, file_path, size, object_key, content_type)
+                metrics.multipart_uploads += 1
+        except BaseException:
+            metrics.failed += 1
+            raise
+
+        metrics.uploads += 1
+        metrics.bytes += size
+        metrics.seconds += time.monotonic() - started
+        return url
+
+    async def _upload_file_parts(
+        self,
+        storage,
+        state: _UploadState,
+        file_path: Path,
+        size: int,
+        object_key: str,
+        content_type: str
+    ) -> str:
+        metrics = self.metrics(storage.name)
+        if state.upload_id is None:
+            state.data["upload_id"] = await storage._call(storage._create_multipart_upload, object_key, content_type)
+            state.save()
+        upload_id = state.upload_id
+        completed = state.parts
+        part_count = (size + self.part_size - 1) // self.part_size
+        if completed:
+            metrics.resumed_parts += len(completed)
+            logger.info(f"续传 {object_key}：已完成 {len(completed)}/{part_count} 个分片")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        def read_part(part_number: int) -> bytes:
+            with open(file_path, "rb") as f:
+                f.seek((part_number - 1) * self.part_size)
+                return f.read(self.part_size)
+
+        async def upload(part_number: int):
+            async with semaphore:
+                data = await asyncio.to_thread(read_part, part_number)
+                part = await self._upload_part(storage, object_key, upload_id, part_number, data)
+                state.add_part(part_number, part["ETag"])
+
+        pending = [number for number in range(1, part_count + 1) if number not in completed]
+        tasks = [asyncio.ensure_future(upload(number)) for number in pending]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        parts = [{"PartNumber": number, "ETag": etag} for number, etag in sorted(state.parts.items())]
+        await storage._call(storage._complete_multipart_upload, object_key, upload_id, parts)
+        state.remove()
+        return storage.get_object_url(object_key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "part_size": self.part_size,
+            "concurrency": self.concurrency,
+            "part_max_attempts": self.part_max_attempts,
+            "backends": {name: metrics.to_dict() for name, metrics in self._metrics.items()},
+        }
+
+
+multipart_uploader = MultipartUploader(
+    part_size=STORAGE_PART_SIZE,
+    concurrency=STORAGE_UPLOAD_CONCURRENCY,
+    part_max_attempts=STORAGE_PART_MAX_ATTEMPTS,
+    state_dir=Path(STORAGE_UPLOAD_STATE_DIR)
+)
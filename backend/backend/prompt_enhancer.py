@@ -0,0 +1,188 @@
+"""
+RAG 提示词增强服务（进程内单例）
+启动时解析一次 RAG 服务（doubao-rag/backend），可在后台线程中预热；
+增强结果按（规范化提示词, n_references）缓存，并设置延迟预算：
+超过预算时直接使用原始提示词，增强结果在后台完成后写入缓存
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    RAG_ENABLED, RAG_SERVICE_PATH, RAG_LATENCY_BUDGET_MS, RAG_CACHE_SIZE, RAG_CACHE_TTL
+)
+from .lru_cache import LRUCache
+
+
+class EnhancementResult:
+    """提示词增强结果"""
+
+    __slots__ = ("enhanced_prompt", "references", "source")
+
+    def __init__(self, enhanced_prompt: str, references: Optional[List[Any]], source: str):
+        self.enhanced_prompt = enhanced_prompt
+        self.references = references
+        # rag / cache / raw（RAG 不可用）/ timeout（超出延迟预算）/ error
+        self.source = source
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化提示词（去除首尾空白、合并连续空白），作为缓存键"""
+    return " ".join(prompt.split())
+
+
+class PromptEnhancer:
+    """RAG 提示词增强（生命周期由应用启动/关闭管理）"""
+
+    def __init__(
+        self,
+        rag_path: Path,
+        enabled: bool = True,
+        latency_budget_ms: int = 800,
+        cache_size: int = 256,
+        cache_ttl_seconds: float = 3600,
+        max_workers: int = 2
+    ):
+        self.rag_path = rag_path
+        self.enabled = enabled
+        self.latency_budget = latency_budget_ms / 1000
+        self._cache = LRUCache(cache_size, ttl_seconds=cache_ttl_seconds)
+
+        self._rag_class = None
+        self._service = None
+        self._resolved = False
+        self._resolve_error: Optional[str] = None
+        self._lock = threading.Lock()
+        # 独立线程池：RAG 调用慢时不占用默认线程池
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag")
+        # 同一提示词的进行中的增强任务
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+        self.timeouts = 0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and self._rag_class is not None
+
+    def resolve(self):
+        """解析 RAG 服务（只执行一次，RAG 不存在时不会在每个请求上重复 ImportError）"""
+        if self._resolved:
+            return
+        with self._lock:
+            if self._resolved:
+                return
+            if self.enabled:
+                try:
+                    if str(self.rag_path) not in sys.path:
+                        sys.path.insert(0, str(self.rag_path))
+                    from rag_service import RAGService
+                    self._rag_class = RAGService
+                    print(f"[INFO] RAG 服务已加载: {self.rag_path}")
+                except ImportError as e:
+                    self._resolve_error = str(e)
+                    print(f"[INFO] RAG 服务不可用，将使用原始提示词: {e}")
+            self._resolved = True
+
+    def _get_service(self):
+        """创建（或获取已创建的）RAGService 实例"""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self._service = self._rag_class()
+        return self._service
+
+    def start(self, warm: bool = True):
+        """应用启动时调用：解析 RAG 服务，并可在后台线程中预热"""
+        self.resolve()
+        if warm and self.available:
+            def _warm():
+                started = time.time()
+                try:
+                    self._get_service()
+                    print(f"[INFO] RAG 服务预热完成，耗时 {time.time() - started:.1f}s")
+                except Exception as e:
+                    print(f"[WARN] RAG 服务预热失败: {e}")
+
+            threading.Thread(target=_warm, name="rag-warmup", daemon=True).start()
+
+    def shutdown(self):
+        """应用关闭时调用"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _enhance_sync(self, prompt: str, n_references: int) -> Dict[str, Any]:
+        return self._get_service().enhance_prompt(
+            original_prompt=prompt,
+            n_references=n_references
+        )
+
+    async def enhance(self, prompt: str, n_references: int = 3) -> EnhancementResult:
+        """
+        增强提示词
+
+        在延迟预算内返回增强结果；RAG 不可用、出错或超时时返回原始提示词
+        """
+        self.resolve()
+        if not self.available:
+            return EnhancementResult(prompt, None, "raw")
+
+        key = (normalize_prompt(prompt), n_references)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return EnhancementResult(cached["enhanced_prompt"], cached["references"], "cache")
+
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self._enhance_sync, prompt, n_references)
+            self._inflight[key] = future
+
+            def _done(f, key=key):
+                self._inflight.pop(key, None)
+                if not f.cancelled() and f.exception() is None:
+                    # 即使调用方已超时返回，结果仍写入缓存供后续请求使用
+                    self._cache.set(key, f.result())
+
+            future.add_done_callback(_done)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=self.latency_budget)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"RAG 增强超过延迟预算 {self.latency_budget * 1000:.0f}ms，使用原始提示词")
+            return EnhancementResult(prompt, None, "timeout")
+        except Exception as e:
+            self.errors += 1
+            print(f"RAG 增强失败，使用原始提示词: {e}")
+            return EnhancementResult(prompt, None, "error")
+
+        return EnhancementResult(result["enhanced_prompt"], result["references"], "rag")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "available": self.available,
+            "warmed": self._service is not None,
+            "resolve_error": self._resolve_error,
+            "latency_budget_ms": int(self.latency_budget * 1000),
+            "inflight": len(self._inflight),
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "cache": self._cache.stats(),
+        }
+
+
+prompt_enhancer = PromptEnhancer(
+    rag_path=Path(RAG_SERVICE_PATH),
+    enabled=RAG_ENABLED,
+    latency_budget_ms=RAG_LATENCY_BUDGET_MS,
+    cache_size=RAG_CACHE_SIZE,
+    cache_ttl_seconds=RAG_CACHE_TTL
+)
@@ -0,0 +1,91 @@
+"""
+即梦任务状态查询结果缓存
+上游查询只由 StatusTracker 发起，同一任务的并发查询已由轮询表（_polling）合并为一次；
+缓存只负责减少轮询计划之外的查询（如状态请求触发的 refresh、重新加入跟踪的任务）：
+- 进行中的任务：结果有效到该任务下一次计划轮询的时间，计划轮询本身总是查询上游
+- done / not_found / expired：已结束，永久缓存（按最近使用淘汰）
+- 查询失败（code 非 10000）：不缓存
+"""
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import STATUS_CACHE_MAX_ENTRIES
+from .jimeng_client import CODE_SUCCESS
+
+# 上游已结束的任务状态（结果不会再变化）
+TERMINAL_UPSTREAM_STATUSES = ("done", "not_found", "expired")
+
+
+class _CacheEntry:
+    __slots__ = ("result", "expires_at")
+
+    def __init__(self, result: Dict[str, Any], expires_at: Optional[float]):
+        self.result = result
+        # None 表示永久缓存
+        self.expires_at = expires_at
+
+
+class UpstreamStatusCache:
+    """上游任务状态查询缓存（有效期由轮询计划决定）"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取未过期的查询结果
+
+        Returns:
+            query_video_task 的返回结果（调用方不应修改）；没有或已过期时返回 None
+        """
+        entry = self._entries.get(task_id)
+        if entry is not None:
+            if entry.expires_at is None or entry.expires_at > time.time():
+                self.hits += 1
+                self._entries.move_to_end(task_id)
+                return entry.result
+            del self._entries[task_id]
+        self.misses += 1
+        return None
+
+    def put(self, task_id: str, api_result: Dict[str, Any], next_poll_at: float):
+        """
+        保存查询结果
+
+        Args:
+            api_result: query_video_task 的返回结果
+            next_poll_at: 该任务下一次计划轮询的时间戳（进行中任务的结果有效到此时）
+        """
+        if api_result.get("code") != CODE_SUCCESS:
+            return
+        upstream_status = (api_result.get("data") or {}).get("status")
+        expires_at = None if upstream_status in TERMINAL_UPSTREAM_STATUSES else next_poll_at
+        self._entries[task_id] = _CacheEntry(api_result, expires_at)
+        self._entries.move_to_end(task_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        pinned = sum(1 for entry in self._entries.values() if entry.expires_at is None)
+        return {
+            "entries": len(self._entries),
+            "pinned": pinned,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+status_cache = UpstreamStatusCache(max_entries=STATUS_CACHE_MAX_ENTRIES)
@@ -0,0 +1,713 @@
+"""
+即梦任务状态跟踪
+后台任务统一轮询所有未结束的上游任务，结果写入内存状态表，状态变化按批次写入数据库；
+状态查询接口只读取状态表。上游查询量与进行中的任务数成正比，与查看状态的客户端数量无关
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    API_KEY, VOLCENGINE_ACCESS_KEY_ID, VOLCENGINE_SECRET_ACCESS_KEY, JIMENG_API_ENDPOINT,
+    JIMENG_V35_PRO_REQ_KEYS, STATUS_POLL_INTERVAL_SECONDS, STATUS_POLL_CONCURRENCY,
+    STATUS_TASK_TIMEOUT_SECONDS
+)
+from .archiver import video_archiver, ArchiveJob
+from .client_registry import get_jimeng_client
+from .jimeng_client import CODE_SUCCESS, CODE_CONCURRENT_LIMIT
+from .status_cache import status_cache
+from .submission_scheduler import submission_scheduler
+from .task_events import task_events
+from .write_behind import generation_writer
+from .task_status import (
+    STATUS_PENDING, STATUS_PROCESSING, STATUS_COMPLETED, STATUS_FAILED, TERMINAL_STATUSES, can_transition
+)
+
+# 任务阶段（推送给客户端的状态变化）：queued -> generating -> archiving -> completed / failed
+PHASE_QUEUED = "queued"
+PHASE_GENERATING = "generating"
+PHASE_ARCHIVING = "archiving"
+PHASE_COMPLETED = "completed"
+PHASE_FAILED = "failed"
+
+# 已结束任务在状态表中的保留时间（秒），之后从数据库读取
+TERMINAL_RETENTION_SECONDS = 600
+# 后台循环间隔（秒）
+TICK_SECONDS = 1.0
+# task_id -> req_key 路由表的最大条目数（超过后淘汰最久未使用的）
+ROUTE_CACHE_SIZE = 50000
+# 启动时从数据库恢复的未结束任务、未完成转存的任务的时间范围
+HYDRATE_WINDOW = timedelta(days=1)
+
+# 默认 req_key（3.5pro 只有 1080p 首帧）
+DEFAULT_REQ_KEY = JIMENG_V35_PRO_REQ_KEYS["1080p"]["first_frame"]
+
+# 不存在的任务（未在本服务提交、数据库和延迟写入缓冲区中都没有记录）的状态
+STATUS_NOT_FOUND = "not_found"
+
+
+class TaskState:
+    """单个任务的状态"""
+
+    __slots__ = (
+        "task_id", "req_key", "status", "phase", "progress", "video_url", "error", "warning",
+        "upstream_status", "created_at", "updated_at", "finished_at", "version",
+        "next_poll_at", "polls", "finalizing", "archive", "_changed"
+    )
+
+    def __init__(self, task_id: str, req_key: Optional[str] = None, created_at: Optional[float] = None):
+        self.task_id = task_id
+        self.req_key = req_key or DEFAULT_REQ_KEY
+        self.status = STATUS_PENDING
+        self.phase = PHASE_QUEUED
+        self.progress = 0
+        self.video_url: Optional[str] = None
+        self.error: Optional[str] = None
+        self.warning: Optional[str] = None
+        self.upstream_status: Optional[str] = None
+        self.created_at = created_at or time.time()
+        self.updated_at = time.time()
+        self.finished_at: Optional[float] = None
+        # 每次状态变化递增
+        self.version = 0
+        self.next_poll_at = 0.0
+        self.polls = 0
+        # 上游已完成，正在转存视频
+        self.finalizing = False
+        # 转存进度（archiving 阶段）
+        self.archive: Optional[Dict[str, Any]] = None
+        # 等待状态变化的长轮询请求（有等待者时才创建）
+        self._changed: Optional[asyncio.Event] = None
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def matches(self, since: str) -> bool:
+        """状态是否与客户端已知的状态相同（since 为版本号，或 status / phase 名称）"""
+        if since.isdigit():
+            return self.version == int(since)
+        return since in (self.status, self.phase)
+
+    async def wait_changed(self, timeout: float) -> bool:
+        """等待下一次状态变化，超时返回 False"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def notify_changed(self):
+        """唤醒等待状态变化的请求"""
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def to_response(self) -> Dict[str, Any]:
+        """状态查询接口的响应"""
+        response = {
+            "task_id": self.task_id,
+            "status": self.status,
+            "phase": self.phase,
+            "progress": self.progress,
+            "video_url": self.video_url,
+            "version": self.version,
+        }
+        if self.error:
+            response["error"] = self.error
+        if self.warning:
+            response["warning"] = self.warning
+        if self.archive is not None:
+            response["archive"] = self.archive
+        if self.upstream_status and self.upstream_status not in ("in_queue", "generating", "done"):
+            response["status_detail"] = self.upstream_status
+        return response
+
+
+def not_found_response(task_id: str) -> Dict[str, Any]:
+    """不存在的任务的状态查询响应"""
+    return {
+        "task_id": task_id,
+        "status": STATUS_NOT_FOUND,
+        "progress": 0,
+        "video_url": None,
+        "error": "任务不存在",
+    }
+
+
+def _record_req_key(generation) -> Optional[str]:
+    """生成记录中的 req_key（旧记录尚未回填 req_key 列时从 metadata 读取）"""
+    return generation.req_key or (generation.extra_metadata or {}).get("req_key")
+
+
+def _record_fields(generation) -> Dict[str, Any]:
+    """生成记录中状态跟踪需要的字段"""
+    return {
+        "status": generation.status,
+        "video_url": generation.video_url,
+        "error_message": generation.error_message,
+        "req_key": _record_req_key(generation),
+        "created_at": _to_timestamp(generation.created_at),
+    }
+
+
+def _to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    """数据库中的时间（UTC，可能不带时区）转为时间戳"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class StatusTracker:
+    """进行中任务的状态表（由后台任务轮询上游）"""
+
+    def __init__(self, poll_interval: float, concurrency: int, task_timeout: float):
+        self.poll_interval = poll_interval
+        self.task_timeout = task_timeout
+        self._states: Dict[str, TaskState] = {}
+        # task_id -> req_key（提交时记录，状态表清理后仍保留，查询上游时直接使用正确的 req_key）
+        self._routes: "OrderedDict[str, str]" = OrderedDict()
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        # task_id -> 进行中的轮询
+        self._polling: Dict[str, asyncio.Task] = {}
+        # 待写入数据库的状态变化（每轮批量写入）
+        self._db_updates: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.upstream_queries = 0
+        self.upstream_errors = 0
+        self.status_reads = 0
+        self.route_misses = 0
+        self.long_polls = 0
+        self.db_batches = 0
+        self.db_updates = 0
+        self.db_skipped = 0
+        self.rejected_transitions = 0
+
+    # ---------- 状态表 ----------
+
+    def track(
+        self,
+        task_id: str,
+        req_key: Optional[str] = None,
+        created_at: Optional[float] = None
+    ) -> TaskState:
+        """开始跟踪任务（已跟踪时返回现有状态）"""
+        if req_key:
+            self.remember_route(task_id, req_key)
+        state = self._states.get(task_id)
+        if state is None:
+            req_key = req_key or self._routes.get(task_id)
+            if not req_key:
+                # 未知 req_key 时使用默认值
+                self.route_misses += 1
+            state = self._states[task_id] = TaskState(task_id, req_key, created_at)
+        return state
+
+    def remember_route(self, task_id: str, req_key: str):
+        """记录任务的 req_key"""
+        self._routes[task_id] = req_key
+        self._routes.move_to_end(task_id)
+        while len(self._routes) > ROUTE_CACHE_SIZE:
+            self._routes.popitem(last=False)
+
+    def get(self, task_id: str) -> Optional[TaskState]:
+        return self._states.get(task_id)
+
+    def _set(
+        self,
+        state: TaskState,
+        status: str,
+        phase: str,
+        progress: int,
+        video_url: Optional[str] = None,
+        error: Optional[str] = None,
+        upstream_status: Optional[str] = None,
+        video_name: Optional[str] = None,
+        persist: bool = True
+    ):
+        """
+        更新任务状态（有变化时递增版本号、发布状态事件，并记录待写入数据库的变化）
+
+        只有状态转换（或完成后视频地址变化）才写入数据库；不符合状态机的转换（如终态回到进行中）被忽略
+        """
+        state.warning = None
+        if upstream_status is not None:
+            state.upstream_status = upstream_status
+        if (state.status, state.phase, state.progress, state.video_url, state.error) == (status, phase, progress, video_url, error):
+            return
+        previous_status = state.status
+        if status != previous_status and not can_transition(previous_status, status):
+            self.rejected_transitions += 1
+            print(f"⚠️ 忽略无效的状态转换 (task_id={state.task_id}): {previous_status} -> {status}")
+            return
+        previous_video_url = state.video_url
+        state.status = status
+        state.phase = phase
+        state.progress = progress
+        state.video_url = video_url
+        state.error = error
+        if phase != PHASE_ARCHIVING:
+            state.archive = None
+        self._publish(state)
+
+        if state.terminal:
+            state.finished_at = state.updated_at
+            # 释放提交槽位（排队中的任务会继续提交）
+            submission_scheduler.release(state.task_id)
+
+        if persist and (status != previous_status or (video_url and video_url != previous_video_url)):
+            self._db_updates[state.task_id] = {
+                "task_id": state.task_id,
+                "status": status,
+                "video_url": video_url,
+                "video_name": video_name,
+                "error_message": error,
+            }
+
+    @staticmethod
+    def _publish(state: TaskState):
+        """递增版本号、发布状态事件并唤醒长轮询请求"""
+        state.version += 1
+        state.updated_at = time.time()
+        task_events.publish(state.task_id, state.to_response())
+        state.notify_changed()
+
+    # ---------- 状态查询 ----------
+
+    async def status(self, task_id: str) -> Optional[TaskState]:
+        """
+        获取任务状态
+
+        已跟踪的任务直接返回状态表中的结果；未跟踪的任务（如服务重启后）从数据库读取，
+        未结束的任务加入跟踪并立即查询一次上游；任务不存在时返回 None
+        """
+        states = await self.status_many([task_id])
+        return states[task_id]
+
+    async def status_many(self, task_ids: List[str]) -> Dict[str, Optional[TaskState]]:
+        """
+        批量获取任务状态
+
+        未跟踪的任务用一次 IN 查询从数据库读取；需要查询上游的任务并发刷新，
+        与后台轮询及其他请求共享同一次查询。
+        只跟踪确实存在的任务（数据库或延迟写入缓冲区中有记录，或由本服务提交），
+        其余 task_id 返回 None，不加入状态表、不查询上游
+        """
+        self.status_reads += len(task_ids)
+        states = {task_id: self._states[task_id] for task_id in task_ids if task_id in self._states}
+        missing = [task_id for task_id in task_ids if task_id not in states]
+        if not missing:
+            return states
+
+        records = await asyncio.to_thread(self._load_records, missing)
+        # 读取数据库失败时无法判断任务是否存在，按存在处理
+        lookup_failed = records is None
+        records = records or {}
+        refreshing = []
+        for task_id in missing:
+            # 读取数据库期间可能已被其他请求加入跟踪
+            state = self._states.get(task_id)
+            if state is None:
+                record = records.get(task_id)
+                if record is None:
+                    # 尚未写入数据库的记录（延迟写入缓冲区只在事件循环中读取）
+                    pending = generation_writer.get(task_id)
+                    if pending is not None:
+                        record = _record_fields(pending)
+                    elif not lookup_failed and task_id not in self._routes:
+                        # 不是本服务提交的任务，也没有记录
+                        states[task_id] = None
+                        continue
+                state = self._adopt(task_id, record)
+                if not state.terminal:
+                    refreshing.append(state)
+            states[task_id] = state
+        if refreshing:
+            await asyncio.gather(*(self.refresh(state) for state in refreshing))
+        return states
+
+    def _adopt(self, task_id: str, record: Optional[Dict[str, Any]]) -> TaskState:
+        """将数据库中的任务加入状态表（已结束的任务直接使用数据库中的结果）"""
+        state = self.track(
+            task_id,
+            record["req_key"] if record else None,
+            record["created_at"] if record else None
+        )
+        if record and record["status"] in TERMINAL_STATUSES:
+            completed = record["status"] == STATUS_COMPLETED
+            self._set(
+                state,
+                record["status"],
+                PHASE_COMPLETED if completed else PHASE_FAILED,
+                100 if completed else 0,
+                video_url=record["video_url"],
+                error=record["error_message"],
+                persist=False
+            )
+        return state
+
+    async def wait(self, task_id: str, since: str, timeout: float) -> Optional[TaskState]:
+        """
+        长轮询：状态与 since 不同时立即返回，否则等待状态变化或超时（任务不存在时返回 None）
+
+        Args:
+            since: 客户端已知的状态（版本号，或 status / phase 名称）
+            timeout: 最长等待时间（秒）
+        """
+        state = await self.status(task_id)
+        if state is None:
+            return None
+        deadline = time.time() + timeout
+        self.long_polls += 1
+        while state.matches(since) and not state.terminal:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not await state.wait_changed(remaining):
+                break
+        return state
+
+    async def refresh(self, state: TaskState):
+        """立即查询一次上游（与后台轮询共享同一次查询）"""
+        poll = self._polling.get(state.task_id)
+        if poll is None:
+            poll = self._spawn_poll(state)
+        await asyncio.shield(poll)
+
+    @staticmethod
+    def _load_records(task_ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """读取任务记录（读取失败时返回 None）"""
+        from .database import SessionLocal, session_scope
+        from .video_history import VideoHistoryService
+
+        if not SessionLocal:
+            return {}
+        try:
+            with session_scope() as db:
+                # 在线程中执行：不读取延迟写入缓冲区（由 status_many 在事件循环中检查）
+                generations = VideoHistoryService.get_generations_by_task_ids(db, task_ids, include_pending=False)
+                return {task_id: _record_fields(generation) for task_id, generation in generations.items()}
+        except Exception as e:
+            print(f"读取任务记录失败: {str(e)}")
+            return None
+
+    # ---------- 上游轮询 ----------
+
+    def _spawn_poll(self, state: TaskState) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(self._poll(state))
+        self._polling[state.task_id] = task
+        task.add_done_callback(lambda _, task_id=state.task_id: self._polling.pop(task_id, None))
+        return task
+
+    async def _poll(self, state: TaskState):
+        async with self._semaphore:
+            if state.terminal or state.finalizing:
+                return
+            access_key = VOLCENGINE_ACCESS_KEY_ID or API_KEY
+            if not access_key or not VOLCENGINE_SECRET_ACCESS_KEY:
+                state.warning = "即梦 API 认证信息未配置"
+                state.next_poll_at = time.time() + self.poll_interval * 10
+                return
+
+            # 轮询计划之外的查询（如状态请求触发的 refresh）复用下次计划轮询前的结果
+            api_result = status_cache.get(state.task_id)
+            fetched = api_result is None
+            if fetched:
+                client = get_jimeng_client(access_key, VOLCENGINE_SECRET_ACCESS_KEY, JIMENG_API_ENDPOINT)
+                state.polls += 1
+                self.upstream_queries += 1
+                try:
+                    api_result = await client.query_video_task(req_key=state.req_key, task_id=state.task_id)
+                except Exception as e:
+                    self.upstream_errors += 1
+                    print(f"查询任务异常 (task_id={state.task_id}): {str(e)}")
+                    state.next_poll_at = time.time() + self.poll_interval * 2
+                    return
+
+        self._handle_result(state, api_result)
+        if fetched:
+            status_cache.put(state.task_id, api_result, state.next_poll_at)
+
+    def _handle_result(self, state: TaskState, api_result: Dict[str, Any]):
+        now = time.time()
+        response_code = api_result.get("code")
+
+        if response_code == CODE_CONCURRENT_LIMIT:
+            self.upstream_errors += 1
+            state.warning = "API 并发限制，请稍后重试"
+            state.next_poll_at = now + self.poll_interval * 3
+            return
+
+        if response_code != CODE_SUCCESS:
+            self.upstream_errors += 1
+            print(f"查询任务失败 (task_id={state.task_id}, req_key={state.req_key}): code={response_code}, message={api_result.get('message')}")
+            if state.req_key != DEFAULT_REQ_KEY:
+                # 保存的 req_key 查询失败时改用默认 req_key
+                state.req_key = DEFAULT_REQ_KEY
+            state.next_poll_at = now + self.poll_interval * 2
+            return
+
+        data = api_result.get("data") or {}
+        upstream_status = data.get("status", "processing")
+
+        if upstream_status == "done":
+            self._complete(state, data.get("video_url"))
+        elif upstream_status == "in_queue":
+            self._set(state, STATUS_PROCESSING, PHASE_QUEUED, 10, upstream_status=upstream_status)
+            # 排队中的任务变化较慢，降低轮询频率
+            state.next_poll_at = now + self.poll_interval * 2
+        elif upstream_status == "generating":
+            self._set(state, STATUS_PROCESSING, PHASE_GENERATING, 50, upstream_status=upstream_status)
+            state.next_poll_at = now + self.poll_interval
+        elif upstream_status in ("not_found", "expired"):
+            self._set(state, STATUS_FAILED, PHASE_FAILED, 0, error=f"任务状态: {upstream_status}", upstream_status=upstream_status)
+        else:
+            self._set(state, STATUS_PROCESSING, PHASE_GENERATING, 30, upstream_status=upstream_status)
+            state.next_poll_at = now + self.poll_interval
+
+    def _complete(self, state: TaskState, video_url: Optional[str]):
+        """上游已完成：立即以上游 URL 标记完成，视频由转存工作池上传到对象存储后再替换为存储 URL"""
+        from .storage import get_storage_service
+
+        video_name = f"{state.task_id}.mp4"
+        if not video_url or get_storage_service() is None:
+            self._set(state, STATUS_COMPLETED, PHASE_COMPLETED, 100, video_url=video_url, upstream_status="done", video_name=video_name)
+            return
+        self._archive(state, video_url)
+
+    def _archive(self, state: TaskState, video_url: str, persist: bool = True):
+        """
+        以上游 URL 标记完成并提交转存
+
+        数据库中的记录在转存完成前保存上游 URL；服务在转存完成前重启时，
+        _hydrate 按视频地址找到这些记录并重新提交转存
+        """
+        state.finalizing = True
+        state.archive = {"state": "queued", "attempts": 0, "bytes_done": 0, "bytes_total": None}
+        self._set(
+            state, STATUS_COMPLETED, PHASE_ARCHIVING, 100,
+            video_url=video_url, upstream_status="done", video_name=f"{state.task_id}.mp4", persist=persist
+        )
+        video_archiver.submit(
+            state.task_id,
+            video_url,
+            f"{state.task_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp4",
+            on_progress=lambda job: self._archive_progress(state, job),
+            on_done=lambda job: self._archive_done(state, job)
+        )
+
+    def _archive_progress(self, state: TaskState, job: ArchiveJob):
+        if state.phase != PHASE_ARCHIVING:
+            return
+        state.archive = job.to_dict()
+        self._publish(state)
+
+    def _archive_done(self, state: TaskState, job: ArchiveJob):
+        state.finalizing = False
+        self._set(
+            state,
+            STATUS_COMPLETED,
+            PHASE_COMPLETED,
+            100,
+            video_url=job.storage_url or state.video_url,
+            video_name=f"{state.task_id}.mp4",
+            # 转存失败时数据库中已是上游 URL
+            persist=job.storage_url is not None
+        )
+
+    # ---------- 后台任务 ----------
+
+    def _expire(self, now: float):
+        """标记超时任务，清理已结束的任务"""
+        for task_id, state in list(self._states.items()):
+            if state.terminal:
+                # 转存中的任务保留到转存结束（状态表中的 archiving 阶段在数据库中没有记录）
+                if state.phase != PHASE_ARCHIVING and now - state.finished_at > TERMINAL_RETENTION_SECONDS:
+                    self._states.pop(task_id, None)
+            elif not state.finalizing and now - state.created_at > self.task_timeout:
+                elapsed_minutes = (now - state.created_at) / 60
+                print(f"⚠️ 任务 {task_id} 已等待 {elapsed_minutes:.1f} 分钟，标记为失败")
+                self._set(
+                    state,
+                    STATUS_FAILED,
+                    PHASE_FAILED,
+                    0,
+                    error=f"任务超时：已等待 {elapsed_minutes:.1f} 分钟。视频生成通常在1-3分钟内完成，请重新生成。"
+                )
+
+    async def _flush_db_updates(self):
+        if not self._db_updates:
+            return
+        updates = list(self._db_updates.values())
+        self._db_updates = {}
+        try:
+            written, skipped = await asyncio.to_thread(self._write_updates, updates)
+        except Exception as e:
+            print(f"写入任务状态失败: {str(e)}")
+            # 放回队列（期间产生的新状态优先）
+            for update in updates:
+                self._db_updates.setdefault(update["task_id"], update)
+            return
+        self.db_batches += 1
+        self.db_updates += written
+        self.db_skipped += len(skipped)
+        # 未更新的记录可能尚未写入数据库：在事件循环中更新延迟写入缓冲区（不在缓冲区中时忽略）
+        now = datetime.utcnow()
+        for update in skipped:
+            generation_writer.update(
+                update["task_id"],
+                status=update["status"],
+                video_url=update.get("video_url"),
+                video_name=update.get("video_name"),
+                error_message=update.get("error_message"),
+                completed_at=now if update["status"] in TERMINAL_STATUSES else None
+            )
+
+    @staticmethod
+    def _write_updates(updates: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        from .database import SessionLocal, session_scope
+        from .video_history import VideoHistoryService
+
+        if not SessionLocal:
+            return 0, []
+        with session_scope() as db:
+            return VideoHistoryService.apply_status_updates(db, updates)
+
+    @staticmethod
+    def _load_active() -> List[Dict[str, Any]]:
+        from .database import SessionLocal, session_scope
+        from .video_history import VideoHistoryService
+
+        if not SessionLocal:
+            return []
+        with session_scope() as db:
+            return [
+                {
+                    "task_id": generation.task_id,
+                    "req_key": _record_req_key(generation),
+                    "created_at": _to_timestamp(generation.created_at),
+                }
+                for generation in VideoHistoryService.get_active_generations(db, datetime.utcnow() - HYDRATE_WINDOW)
+            ]
+
+    @staticmethod
+    def _load_unarchived() -> List[Dict[str, Any]]:
+        from .database import SessionLocal, session_scope
+        from .storage import get_storage_service
+        from .video_history import VideoHistoryService
+
+        storage_service = get_storage_service()
+        if not SessionLocal or storage_service is None:
+            return []
+        # 对象存储中的视频地址都以该前缀开头，其他地址为尚未转存的上游 URL
+        storage_url_prefix = storage_service.get_object_url("")
+        with session_scope() as db:
+            return [
+                {"task_id": generation.task_id, **_record_fields(generation)}
+                for generation in VideoHistoryService.get_unarchived_generations(
+                    db, datetime.utcnow() - HYDRATE_WINDOW, storage_url_prefix
+                )
+            ]
+
+    async def _hydrate(self):
+        """从数据库恢复未结束的任务和未完成转存的任务（服务重启后继续跟踪、重新提交转存）"""
+        try:
+            records = await asyncio.to_thread(self._load_active)
+        except Exception as e:
+            print(f"恢复未结束任务失败: {str(e)}")
+            records = []
+        for record in records:
+            self.track(record["task_id"], record["req_key"], record["created_at"])
+        if records:
+            print(f"[INFO] 恢复跟踪 {len(records)} 个未结束的任务")
+
+        try:
+            unarchived = await asyncio.to_thread(self._load_unarchived)
+        except Exception as e:
+            print(f"恢复未完成转存的任务失败: {str(e)}")
+            return
+        for record in unarchived:
+            state = self.track(record["task_id"], record["req_key"], record["created_at"])
+            if not state.terminal:
+                # 数据库中已是 completed（上游 URL），不重复写入
+                self._archive(state, record["video_url"], persist=False)
+        if unarchived:
+            print(f"[INFO] 重新提交 {len(unarchived)} 个未完成转存的视频")
+
+    async def _run(self):
+        await self._hydrate()
+        while True:
+            try:
+                now = time.time()
+                self._expire(now)
+                for state in list(self._states.values()):
+                    if (
+                        not state.terminal
+                        and not state.finalizing
+                        and state.next_poll_at <= now
+                        and state.task_id not in self._polling
+                    ):
+                        # 先推迟下次轮询时间，查询结果返回后再按状态调整
+                        state.next_poll_at = now + self.poll_interval
+                        self._spawn_poll(state)
+                await self._flush_db_updates()
+            except Exception as e:
+                print(f"任务状态跟踪失败: {str(e)}")
+            await asyncio.sleep(TICK_SECONDS)
+
+    def start(self):
+        """启动后台轮询任务"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止后台轮询，写入尚未保存的状态变化"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._polling.values()):
+            task.cancel()
+        await self._flush_db_updates()
+
+    def stats(self) -> Dict[str, Any]:
+        active = sum(1 for state in self._states.values() if not state.terminal)
+        return {
+            "tracked": len(self._states),
+            "routes": len(self._routes),
+            "route_misses": self.route_misses,
+            "active": active,
+            "polling": len(self._polling),
+            "archiving": sum(1 for state in self._states.values() if state.finalizing),
+            "poll_interval_seconds": self.poll_interval,
+            "status_reads": self.status_reads,
+            "long_polls": self.long_polls,
+            "upstream_queries": self.upstream_queries,
+            "upstream_errors": self.upstream_errors,
+            "db_batches": self.db_batches,
+            "db_updates": self.db_updates,
+            "db_skipped": self.db_skipped,
+            "rejected_transitions": self.rejected_transitions,
+            "pending_db_updates": len(self._db_updates),
+        }
+
+
+status_tracker = StatusTracker(
+    poll_interval=STATUS_POLL_INTERVAL_SECONDS,
+    concurrency=STATUS_POLL_CONCURRENCY,
+    task_timeout=STATUS_TASK_TIMEOUT_SECONDS
+)
@@ -1,22 +1,58 @@
 """
 对象存储服务
 支持腾讯云 COS、阿里云 OSS 和亚马逊 S3
+
+视频从上游 URL 流式转存：下载的数据按分片大小切分，通过各存储的分片上传（multipart）接口上传，
+下载与上传同时进行；本地大文件（如增强后的视频）并发分片上传并支持续传，见 multipart_upload.py
+
+存储客户端由 storage_registry 按名称（primary / cold）解析一次后复用，连接池随客户端保留
 """
 import os
-from typing import Optional
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 from pathlib import Path
 import logging
 import httpx
 
+from .multipart_upload import multipart_uploader
+from .storage_executor import storage_executor
+
 logger = logging.getLogger(__name__)
 
+# 下载超时（秒）
+DOWNLOAD_TIMEOUT_SECONDS = 300
+# 下载时每次读取的字节数
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
 
 class StorageService:
     """对象存储服务基类"""
     
+    # 存储后端类型（用于上传统计和并发限制；具名的非主存储为 <类型>_<名称>）
+    name = "storage"
+    
+    def _init_env(self, label: str):
+        """
+        设置读取环境变量的前缀
+
+        非主存储（如 cold）优先读取 STORAGE_<名称>_ 前缀的变量（如 STORAGE_COLD_COS_BUCKET），
+        未设置的变量沿用主存储的配置（如共用同一组凭证、只换存储桶）
+        """
+        self.label = label
+        self._env_prefix = f"STORAGE_{label.upper()}_" if label else ""
+        if label:
+            self.name = f"{type(self).name}_{label}"
+    
+    def _env(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        if self._env_prefix:
+            value = os.getenv(self._env_prefix + key)
+            if value:
+                return value
+        return os.getenv(key, default)
+    
     async def upload_video(self, video_url: str, video_name: str) -> Optional[str]:
         """
-        上传视频到对象存储
+        上传视频到对象存储（流式转存，不在内存中保存整个视频）
         
         Args:
             video_url: 视频URL（从即梦API获取）
@@ -25,29 +61,146 @@ class StorageService:
         Returns:
             对象存储中的URL，如果上传失败返回None
         """
+        object_key = f"videos/{video_name}"
+        try:
+            return await self.upload_from_url(video_url, object_key, "video/mp4")
+        except Exception as e:
+            logger.error(f"转存文件到对象存储失败 ({object_key}): {str(e)}")
+            return None
+    
+    async def upload_from_url(
+        self,
+        url: str,
+        object_key: str,
+        content_type: str,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None
+    ) -> Optional[str]:
+        """
+        从 URL 流式转存到对象存储
+        
+        Args:
+            url: 源文件 URL
+            object_key: 对象存储中的键
+            content_type: MIME 类型
+            progress: 进度回调 progress(已下载字节数, 总字节数或 None)，开始下载时以 0 调用一次
+            
+        Returns:
+            对象存储中的URL
+
+        Raises:
+            下载或上传失败时抛出异常（已开始的分片上传会被取消）
+        """
+        async with httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT_SECONDS) as client:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                content_length = response.headers.get("content-length")
+                total = int(content_length) if content_length and content_length.isdigit() else None
+                if progress:
+                    progress(0, total)
+                
+                async def chunks() -> AsyncIterator[bytes]:
+                    downloaded = 0
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        downloaded += len(chunk)
+                        if progress:
+                            progress(downloaded, total)
+                        yield chunk
+                
+                return await self.upload_stream(chunks(), object_key, content_type)
+    
+    async def upload_stream(self, chunks: AsyncIterator[bytes], object_key: str, content_type: str) -> str:
+        """
+        分片上传数据流（数据不足一个分片时直接上传）
+        
+        Returns:
+            对象存储中的URL
+
+        Raises:
+            上传失败时抛出异常（已开始的分片上传会被取消）
+        """
+        return await multipart_uploader.upload_stream(self, chunks, object_key, content_type)
+    
+    async def upload_file(self, file_path: Path, object_key: str, content_type: str) -> str:
+        """
+        分片上传本地文件（并发上传分片，中断后再次上传同一文件时续传）
+        
+        Returns:
+            对象存储中的URL
+
+        Raises:
+            上传失败时抛出异常
+        """
+        return await multipart_uploader.upload_file(self, file_path, object_key, content_type)
+    
+    async def _call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """在存储线程池中执行同步 SDK 调用（不阻塞事件循环，受本后端的并发上限限制）"""
+        return await storage_executor.run(self.name, fn, *args, **kwargs)
+    
+    # 分片上传接口（同步，通过 _call 在存储线程池中调用）
+    
+    def _create_multipart_upload(self, object_key: str, content_type: str) -> str:
+        """开始分片上传，返回 upload_id"""
+        raise NotImplementedError
+    
+    def _upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> Dict[str, Any]:
+        """上传一个分片，返回 {"PartNumber", "ETag"}"""
+        raise NotImplementedError
+    
+    def _complete_multipart_upload(self, object_key: str, upload_id: str, parts: List[Dict[str, Any]]):
+        """完成分片上传"""
+        raise NotImplementedError
+    
+    def _abort_multipart_upload(self, object_key: str, upload_id: str):
+        """取消分片上传"""
+        raise NotImplementedError
+    
+    def _is_upload_missing(self, error: Exception) -> bool:
+        """分片上传接口的异常是否表示 upload_id 不存在（NoSuchUpload）"""
+        return False
+    
+    async def upload_bytes(self, data: bytes, object_key: str, content_type: str) -> Optional[str]:
+        """
+        上传二进制数据到对象存储
+        
+        Args:
+            data: 文件内容
+            object_key: 对象存储中的键（如 frames/xxx.png）
+            content_type: MIME 类型
+            
+        Returns:
+            对象存储中的URL，如果上传失败返回None
+        """
+        raise NotImplementedError
+    
+    def get_object_url(self, object_key: str) -> str:
+        """对象的访问 URL"""
         raise NotImplementedError
     
-    async def download_file(self, url: str) -> bytes:
-        """下载文件（用于上传到对象存储）"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=300)
-            response.raise_for_status()
-            return response.content
+    async def object_exists(self, object_key: str) -> bool:
+        """
+        对象是否存在
 
+        Raises:
+            查询失败时抛出异常
+        """
+        raise NotImplementedError
+    
 
 class TencentCOSStorage(StorageService):
     """腾讯云 COS 存储服务"""
     
-    def __init__(self):
+    name = "tencent_cos"
+    
+    def __init__(self, label: str = ""):
         from qcloud_cos import CosConfig
         from qcloud_cos import CosS3Client
-        from qcloud_cos.cos_exception import CosClientError, CosServiceError
         
-        self.secret_id = os.getenv("COS_SECRET_ID")
-        self.secret_key = os.getenv("COS_SECRET_KEY")
-        self.region = os.getenv("COS_REGION")  # 如: ap-guangzhou
-        self.bucket_name = os.getenv("COS_BUCKET")
-        self.bucket_domain = os.getenv("COS_BUCKET_DOMAIN")  # CDN域名（可选）
+        self._init_env(label)
+        self.secret_id = self._env("COS_SECRET_ID")
+        self.secret_key = self._env("COS_SECRET_KEY")
+        self.region = self._env("COS_REGION")  # 如: ap-guangzhou
+        self.bucket_name = self._env("COS_BUCKET")
+        self.bucket_domain = self._env("COS_BUCKET_DOMAIN")  # CDN域名（可选）
         
         if not all([self.secret_id, self.secret_key, self.region, self.bucket_name]):
             raise ValueError("请配置腾讯云 COS 环境变量：COS_SECRET_ID, COS_SECRET_KEY, COS_REGION, COS_BUCKET")
@@ -63,51 +216,80 @@ class TencentCOSStorage(StorageService):
         # 初始化 COS 客户端
         self.cos_client = CosS3Client(config)
     
-    async def upload_video(self, video_url: str, video_name: str) -> Optional[str]:
-        """上传视频到腾讯云 COS"""
+    def _create_multipart_upload(self, object_key: str, content_type: str) -> str:
+        response = self.cos_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            ContentType=content_type
+        )
+        return response["UploadId"]
+    
+    def _upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> Dict[str, Any]:
+        response = self.cos_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            Body=data,
+            PartNumber=part_number,
+            UploadId=upload_id
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+    
+    def _complete_multipart_upload(self, object_key: str, upload_id: str, parts: List[Dict[str, Any]]):
+        self.cos_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={"Part": parts}
+        )
+    
+    def _abort_multipart_upload(self, object_key: str, upload_id: str):
+        self.cos_client.abort_multipart_upload(Bucket=self.bucket_name, Key=object_key, UploadId=upload_id)
+    
+    def _is_upload_missing(self, error: Exception) -> bool:
+        from qcloud_cos.cos_exception import CosServiceError
+        return isinstance(error, CosServiceError) and error.get_error_code() == "NoSuchUpload"
+    
+    async def upload_bytes(self, data: bytes, object_key: str, content_type: str) -> Optional[str]:
+        """上传二进制数据到腾讯云 COS"""
         try:
-            # 下载视频
-            import requests
-            response = requests.get(video_url, timeout=300)  # 5分钟超时
-            response.raise_for_status()
-            video_data = response.content
-            
-            # 上传到 COS（同步操作）
-            object_key = f"videos/{video_name}"
-            
-            # 上传文件
-            self.cos_client.put_object(
+            await self._call(
+                self.cos_client.put_object,
                 Bucket=self.bucket_name,
-                Body=video_data,
+                Body=data,
                 Key=object_key,
-                ContentType='video/mp4'
+                ContentType=content_type
             )
-            
-            # 返回 COS URL
-            if self.bucket_domain:
-                # 使用 CDN 域名
-                return f"https://{self.bucket_domain}/{object_key}"
-            else:
-                # 使用 COS 域名
-                # 格式: https://{bucket}.cos.{region}.myqcloud.com/{object_key}
-                return f"https://{self.bucket_name}.cos.{self.region}.myqcloud.com/{object_key}"
-                
+            return self.get_object_url(object_key)
         except Exception as e:
-            logger.error(f"上传视频到腾讯云 COS 失败: {str(e)}")
+            logger.error(f"上传文件到腾讯云 COS 失败: {str(e)}")
             return None
+    
+    def get_object_url(self, object_key: str) -> str:
+        if self.bucket_domain:
+            # 使用 CDN 域名
+            return f"https://{self.bucket_domain}/{object_key}"
+        # 使用 COS 域名
+        # 格式: https://{bucket}.cos.{region}.myqcloud.com/{object_key}
+        return f"https://{self.bucket_name}.cos.{self.region}.myqcloud.com/{object_key}"
+    
+    async def object_exists(self, object_key: str) -> bool:
+        return await self._call(self.cos_client.object_exists, Bucket=self.bucket_name, Key=object_key)
 
 
 class AliyunOSSStorage(StorageService):
     """阿里云 OSS 存储服务"""
     
-    def __init__(self):
+    name = "aliyun_oss"
+    
+    def __init__(self, label: str = ""):
         import oss2
         
-        self.access_key_id = os.getenv("ALIYUN_OSS_ACCESS_KEY_ID")
-        self.access_key_secret = os.getenv("ALIYUN_OSS_ACCESS_KEY_SECRET")
-        self.bucket_name = os.getenv("ALIYUN_OSS_BUCKET_NAME")
-        self.endpoint = os.getenv("ALIYUN_OSS_ENDPOINT")  # 如: oss-cn-beijing.aliyuncs.com
-        self.bucket_domain = os.getenv("ALIYUN_OSS_BUCKET_DOMAIN")  # CDN域名（可选）
+        self._init_env(label)
+        self.access_key_id = self._env("ALIYUN_OSS_ACCESS_KEY_ID")
+        self.access_key_secret = self._env("ALIYUN_OSS_ACCESS_KEY_SECRET")
+        self.bucket_name = self._env("ALIYUN_OSS_BUCKET_NAME")
+        self.endpoint = self._env("ALIYUN_OSS_ENDPOINT")  # 如: oss-cn-beijing.aliyuncs.com
+        self.bucket_domain = self._env("ALIYUN_OSS_BUCKET_DOMAIN")  # CDN域名（可选）
         
         if not all([self.access_key_id, self.access_key_secret, self.bucket_name, self.endpoint]):
             raise ValueError("请配置阿里云 OSS 环境变量：ALIYUN_OSS_ACCESS_KEY_ID, ALIYUN_OSS_ACCESS_KEY_SECRET, ALIYUN_OSS_BUCKET_NAME, ALIYUN_OSS_ENDPOINT")
@@ -116,47 +298,64 @@ class AliyunOSSStorage(StorageService):
         auth = oss2.Auth(self.access_key_id, self.access_key_secret)
         self.bucket = oss2.Bucket(auth, f"https://{self.endpoint}", self.bucket_name)
     
-    async def upload_video(self, video_url: str, video_name: str) -> Optional[str]:
-        """上传视频到阿里云 OSS"""
+    def _create_multipart_upload(self, object_key: str, content_type: str) -> str:
+        return self.bucket.init_multipart_upload(object_key, headers={"Content-Type": content_type}).upload_id
+    
+    def _upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> Dict[str, Any]:
+        result = self.bucket.upload_part(object_key, upload_id, part_number, data)
+        return {"PartNumber": part_number, "ETag": result.etag}
+    
+    def _complete_multipart_upload(self, object_key: str, upload_id: str, parts: List[Dict[str, Any]]):
+        from oss2.models import PartInfo
+        self.bucket.complete_multipart_upload(
+            object_key,
+            upload_id,
+            [PartInfo(part["PartNumber"], part["ETag"]) for part in parts]
+        )
+    
+    def _abort_multipart_upload(self, object_key: str, upload_id: str):
+        self.bucket.abort_multipart_upload(object_key, upload_id)
+    
+    def _is_upload_missing(self, error: Exception) -> bool:
+        from oss2.exceptions import NoSuchUpload
+        return isinstance(error, NoSuchUpload)
+    
+    async def upload_bytes(self, data: bytes, object_key: str, content_type: str) -> Optional[str]:
+        """上传二进制数据到阿里云 OSS"""
         try:
-            # 下载视频（使用同步 requests，因为 OSS 客户端是同步的）
-            import requests
-            response = requests.get(video_url, timeout=300)  # 5分钟超时
-            response.raise_for_status()
-            video_data = response.content
-            
-            # 上传到 OSS（同步操作）
-            object_key = f"videos/{video_name}"
-            result = self.bucket.put_object(object_key, video_data)
-            
+            result = await self._call(self.bucket.put_object, object_key, data, headers={"Content-Type": content_type})
             if result.status == 200:
-                # 返回 OSS URL
-                if self.bucket_domain:
-                    # 使用 CDN 域名
-                    return f"https://{self.bucket_domain}/{object_key}"
-                else:
-                    # 使用 OSS 域名
-                    return f"https://{self.bucket_name}.{self.endpoint}/{object_key}"
-            else:
-                logger.error(f"OSS 上传失败: status={result.status}")
-                return None
-                
+                return self.get_object_url(object_key)
+            logger.error(f"OSS 上传失败: status={result.status}")
+            return None
         except Exception as e:
-            logger.error(f"上传视频到 OSS 失败: {str(e)}")
+            logger.error(f"上传文件到 OSS 失败: {str(e)}")
             return None
+    
+    def get_object_url(self, object_key: str) -> str:
+        if self.bucket_domain:
+            # 使用 CDN 域名
+            return f"https://{self.bucket_domain}/{object_key}"
+        # 使用 OSS 域名
+        return f"https://{self.bucket_name}.{self.endpoint}/{object_key}"
+    
+    async def object_exists(self, object_key: str) -> bool:
+        return await self._call(self.bucket.object_exists, object_key)
 
 
 class S3Storage(StorageService):
     """亚马逊 S3 存储服务"""
     
-    def __init__(self):
+    name = "s3"
+    
+    def __init__(self, label: str = ""):
         import boto3
-        from botocore.exceptions import ClientError
         
-        self.aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
-        self.aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-        self.bucket_name = os.getenv("AWS_S3_BUCKET_NAME")
-        self.region = os.getenv("AWS_S3_REGION", "us-east-1")
+        self._init_env(label)
+        self.aws_access_key_id = self._env("AWS_ACCESS_KEY_ID")
+        self.aws_secret_access_key = self._env("AWS_SECRET_ACCESS_KEY")
+        self.bucket_name = self._env("AWS_S3_BUCKET_NAME")
+        self.region = self._env("AWS_S3_REGION", "us-east-1")
         
         if not all([self.aws_access_key_id, self.aws_secret_access_key, self.bucket_name]):
             raise ValueError("请配置 AWS S3 环境变量：AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_S3_BUCKET_NAME")
@@ -169,64 +368,162 @@ class S3Storage(StorageService):
             region_name=self.region
         )
     
-    async def upload_video(self, video_url: str, video_name: str) -> Optional[str]:
-        """上传视频到亚马逊 S3"""
+    def _create_multipart_upload(self, object_key: str, content_type: str) -> str:
+        response = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            ContentType=content_type
+        )
+        return response["UploadId"]
+    
+    def _upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> Dict[str, Any]:
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            PartNumber=part_number,
+            UploadId=upload_id,
+            Body=data
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+    
+    def _complete_multipart_upload(self, object_key: str, upload_id: str, parts: List[Dict[str, Any]]):
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts}
+        )
+    
+    def _abort_multipart_upload(self, object_key: str, upload_id: str):
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=object_key, UploadId=upload_id)
+    
+    def _is_upload_missing(self, error: Exception) -> bool:
+        from botocore.exceptions import ClientError
+        return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") == "NoSuchUpload"
+    
+    async def upload_bytes(self, data: bytes, object_key: str, content_type: str) -> Optional[str]:
+        """上传二进制数据到亚马逊 S3"""
         try:
-            # 下载视频（使用同步 requests，因为 boto3 是同步的）
-            import requests
-            response = requests.get(video_url, timeout=300)  # 5分钟超时
-            response.raise_for_status()
-            video_data = response.content
-            
-            # 上传到 S3（同步操作）
-            object_key = f"videos/{video_name}"
-            self.s3_client.put_object(
+            await self._call(
+                self.s3_client.put_object,
                 Bucket=self.bucket_name,
                 Key=object_key,
-                Body=video_data,
-                ContentType='video/mp4'
+                Body=data,
+                ContentType=content_type
             )
-            
-            # 返回 S3 URL
-            return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{object_key}"
-            
+            return self.get_object_url(object_key)
         except Exception as e:
-            logger.error(f"上传视频到 S3 失败: {str(e)}")
+            logger.error(f"上传文件到 S3 失败: {str(e)}")
             return None
+    
+    def get_object_url(self, object_key: str) -> str:
+        return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{object_key}"
+    
+    async def object_exists(self, object_key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            await self._call(self.s3_client.head_object, Bucket=self.bucket_name, Key=object_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
 
+# STORAGE_TYPE 可用的值 -> 存储类
+STORAGE_BACKENDS = {
+    "tencent_cos": TencentCOSStorage,
+    "cos": TencentCOSStorage,
+    "aliyun_oss": AliyunOSSStorage,
+    "s3": S3Storage,
+}
+# 主存储未配置时依次尝试的存储类型
+PRIMARY_FALLBACK_CHAIN = ("tencent_cos", "aliyun_oss", "s3")
+PRIMARY_STORAGE = "primary"
+COLD_STORAGE = "cold"
 
-def get_storage_service() -> Optional[StorageService]:
+
+class StorageRegistry:
     """
-    根据环境变量获取存储服务实例
-    
-    优先使用腾讯云 COS，如果未配置则尝试其他存储服务
+    名称 -> 存储服务 注册表
+
+    - 每个名称只解析一次（包括未配置的结果），之后复用同一个客户端及其连接池
+    - primary：按 STORAGE_TYPE 选择，未配置时沿 COS -> OSS -> S3 依次尝试（只在解析时尝试一次）
+    - 其他名称（如 cold）：按 STORAGE_<名称>_TYPE 选择，未设置表示不使用
     """
-    storage_type = os.getenv("STORAGE_TYPE", "tencent_cos").lower()
-    
-    # 优先使用腾讯云 COS
-    if storage_type == "tencent_cos" or storage_type == "cos":
-        try:
-            return TencentCOSStorage()
-        except ValueError as e:
-            logger.warning(f"腾讯云 COS 未配置: {e}")
-            # 如果未配置 COS，尝试其他存储服务
-            storage_type = "aliyun_oss"
-    
-    # 使用阿里云 OSS
-    if storage_type == "aliyun_oss":
-        try:
-            return AliyunOSSStorage()
-        except ValueError:
-            logger.warning("阿里云 OSS 未配置，尝试使用 S3")
-            storage_type = "s3"
-    
-    # 使用亚马逊 S3
-    if storage_type == "s3":
-        try:
-            return S3Storage()
-        except ValueError:
-            logger.warning("AWS S3 未配置，对象存储功能不可用")
+
+    def __init__(self):
+        self._services: Dict[str, Optional[StorageService]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str = PRIMARY_STORAGE) -> Optional[StorageService]:
+        """获取（首次调用时解析）指定名称的存储服务，未配置时返回 None"""
+        with self._lock:
+            if name in self._services:
+                self.hits += 1
+                return self._services[name]
+            self.misses += 1
+            service = self._services[name] = self._resolve(name)
+            return service
+
+    def _resolve(self, name: str) -> Optional[StorageService]:
+        if name == PRIMARY_STORAGE:
+            storage_type = os.getenv("STORAGE_TYPE", "tencent_cos").lower()
+            label = ""
+        else:
+            storage_type = os.getenv(f"STORAGE_{name.upper()}_TYPE", "").lower()
+            label = name
+            if not storage_type:
+                return None
+
+        if storage_type not in STORAGE_BACKENDS:
+            logger.warning(f"不支持的存储类型 {storage_type}（{name}），对象存储功能不可用")
             return None
-    
-    return None
 
+        candidates = [storage_type]
+        if name == PRIMARY_STORAGE:
+            # 与原来的回退顺序一致：从所选类型开始往后尝试
+            start = PRIMARY_FALLBACK_CHAIN.index(STORAGE_BACKENDS[storage_type].name)
+            candidates = list(PRIMARY_FALLBACK_CHAIN[start:])
+
+        for candidate in candidates:
+            try:
+                return STORAGE_BACKENDS[candidate](label)
+            except (ValueError, ImportError) as e:
+                logger.warning(f"存储 {name} 无法使用 {candidate}: {e}")
+        logger.warning(f"存储 {name} 未配置，对象存储功能不可用")
+        return None
+
+    def resolve_all(self, names=(PRIMARY_STORAGE, COLD_STORAGE)):
+        """应用启动时调用：解析存储服务并输出所选的存储"""
+        for name in names:
+            service = self.get(name)
+            if service is not None:
+                print(f"[INFO] 对象存储 {name}: {service.name}（bucket={service.bucket_name}）")
+            elif name == PRIMARY_STORAGE:
+                print(f"[INFO] 对象存储 {name}: 未配置，视频使用上游 URL")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backends": {
+                name: {"type": service.name, "bucket": service.bucket_name} if service is not None else None
+                for name, service in self._services.items()
+            },
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+storage_registry = StorageRegistry()
+
+
+def get_storage_service(name: str = PRIMARY_STORAGE) -> Optional[StorageService]:
+    """
+    获取存储服务实例（由 storage_registry 缓存，不会每次重新创建客户端）
+    
+    Args:
+        name: 存储名称，primary（默认）或 cold
+    """
+    return storage_registry.get(name)
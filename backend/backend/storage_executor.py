@@ -0,0 +1,133 @@
+"""
+对象存储 SDK 调用的线程池
+qcloud_cos / oss2 / boto3 都是同步 SDK，直接在协程中调用会阻塞事件循环。所有 SDK 调用都通过这里在独立线程池中执行：
+- 线程池与默认线程池分开，大小单独配置，转存和增强视频上传不占用数据库等其他 to_thread 调用的线程
+- 每个存储后端有并发上限，等待中的调用不占用线程
+- 调用方取消（如请求超时）时，尚未开始的 SDK 调用不再执行；已在执行的调用结束后才释放并发名额
+"""
+import asyncio
+import functools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import STORAGE_THREAD_POOL_SIZE, STORAGE_BACKEND_CONCURRENCY, STORAGE_BACKEND_CONCURRENCY_OVERRIDES
+
+
+class _BackendSlot:
+    """一个存储后端的并发名额和统计"""
+
+    __slots__ = ("limit", "semaphore", "running", "waiting", "calls", "failed", "cancelled")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.running = 0
+        self.waiting = 0
+        self.calls = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
+
+
+class StorageExecutor:
+    """存储 SDK 调用执行器"""
+
+    def __init__(self, max_workers: int, backend_concurrency: int, backend_limits: Optional[Dict[str, int]] = None):
+        self.max_workers = max_workers
+        self.backend_concurrency = backend_concurrency
+        # 单独设置了并发数的存储后端（后端名小写）
+        self.backend_limits = dict(backend_limits or {})
+        # 独立线程池：对象存储上传慢时不占用默认线程池
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+        self._backends: Dict[str, _BackendSlot] = {}
+
+    def _slot(self, backend: str) -> _BackendSlot:
+        slot = self._backends.get(backend)
+        if slot is None:
+            limit = self.backend_limits.get(backend.lower(), self.backend_concurrency)
+            slot = self._backends[backend] = _BackendSlot(limit)
+        return slot
+
+    async def run(self, backend: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在存储线程池中执行同步 SDK 调用
+
+        Args:
+            backend: 存储后端名称（用于并发限制和统计）
+            fn: 同步函数
+
+        Returns:
+            fn 的返回值
+        """
+        slot = self._slot(backend)
+        slot.waiting += 1
+        try:
+            await slot.semaphore.acquire()
+        except asyncio.CancelledError:
+            slot.cancelled += 1
+            raise
+        finally:
+            slot.waiting -= 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            concurrent_future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            slot.semaphore.release()
+            raise
+        slot.running += 1
+        slot.calls += 1
+
+        def _release(_):
+            # 线程中的调用真正结束（或在开始前被取消）后才释放名额
+            slot.running -= 1
+            slot.semaphore.release()
+
+        def _done(f):
+            try:
+                loop.call_soon_threadsafe(_release, f)
+            except RuntimeError:
+                # 事件循环已关闭（应用退出）
+                pass
+
+        concurrent_future.add_done_callback(_done)
+        try:
+            return await asyncio.wrap_future(concurrent_future)
+        except asyncio.CancelledError:
+            # 取消 asyncio future 时，尚未开始执行的调用会一并取消
+            slot.cancelled += 1
+            raise
+        except Exception:
+            slot.failed += 1
+            raise
+
+    def shutdown(self):
+        """应用关闭时调用（未开始的调用被取消）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "backend_concurrency": self.backend_concurrency,
+            "backends": {name: slot.to_dict() for name, slot in self._backends.items()},
+        }
+
+
+storage_executor = StorageExecutor(
+    max_workers=STORAGE_THREAD_POOL_SIZE,
+    backend_concurrency=STORAGE_BACKEND_CONCURRENCY,
+    backend_limits=STORAGE_BACKEND_CONCURRENCY_OVERRIDES
+)
@@ -0,0 +1,341 @@
+"""
+上游提交调度（本地准入控制）
+即梦 API 对每组凭证有并发上限（超出时返回 50430 Concurrent Limit）。
+调度器为每组凭证维护进行中的任务数，超出上限的提交进入 FIFO 队列并返回排队票据；
+状态轮询发现任务结束（release）后自动从队列中取出下一个提交。
+批量提交先预留队列位置（reserve），队列已满时等待而不是被拒绝
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    JIMENG_MAX_INFLIGHT, JIMENG_INFLIGHT_TTL_SECONDS, SUBMIT_QUEUE_MAX_SIZE
+)
+from .jimeng_client import JimengAPIError
+
+# 票据状态
+TICKET_QUEUED = "queued"
+TICKET_SUBMITTING = "submitting"
+TICKET_SUBMITTED = "submitted"
+TICKET_FAILED = "failed"
+
+# 上游返回 50430 后暂停提交的时间（秒）
+CONCURRENCY_BACKOFF_SECONDS = 5
+# 已结束票据的保留时间（秒），供客户端查询结果
+TICKET_RETENTION_SECONDS = 3600
+
+
+class QueueFullError(Exception):
+    """排队队列已满"""
+
+
+class SubmissionTicket:
+    """一次排队的提交"""
+
+    def __init__(self, credential: str, job: Callable[[], Awaitable[str]], user: Optional[str] = None):
+        self.ticket_id = f"tkt_{uuid.uuid4().hex}"
+        self.credential = credential
+        self.user = user
+        self.job = job
+        self.status = TICKET_QUEUED
+        self.task_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # 提交完成（成功或失败）时设置
+        self.done = asyncio.Event()
+
+    def to_dict(self, queue_position: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "ticket_id": self.ticket_id,
+            "status": self.status,
+            "queue_position": queue_position,
+            "task_id": self.task_id,
+            "error": self.error,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+        }
+
+
+class _Lane:
+    """单组凭证的并发槽位和等待队列"""
+
+    def __init__(self):
+        # task_id -> 开始时间（已提交、尚未结束的上游任务）
+        self.inflight: Dict[str, float] = {}
+        # 正在提交中的数量（已占用槽位，尚未拿到 task_id）
+        self.submitting = 0
+        self.queue: Deque[SubmissionTicket] = deque()
+        # 已预留、尚未入队的队列位置数
+        self.reserved = 0
+        # 等待队列位置的预留请求
+        self.space_waiters: Deque[asyncio.Future] = deque()
+        # 在此时间之前不再提交（收到 50430 后退避）
+        self.paused_until = 0.0
+
+
+class SubmissionScheduler:
+    """按凭证限制进行中任务数的提交调度器"""
+
+    def __init__(self, max_inflight: int, inflight_ttl_seconds: float, max_queue_size: int):
+        self.max_inflight = max(1, max_inflight)
+        self.inflight_ttl_seconds = inflight_ttl_seconds
+        self.max_queue_size = max_queue_size
+        self._lanes: Dict[str, _Lane] = {}
+        self._tickets: Dict[str, SubmissionTicket] = {}
+        self._task_lane: Dict[str, str] = {}
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+        self.submitted = 0
+        self.queued = 0
+        self.rejected_upstream = 0
+
+    def _lane(self, credential: str) -> _Lane:
+        lane = self._lanes.get(credential)
+        if lane is None:
+            lane = self._lanes[credential] = _Lane()
+        return lane
+
+    def _has_capacity(self, lane: _Lane) -> bool:
+        if time.time() < lane.paused_until:
+            return False
+        return len(lane.inflight) + lane.submitting < self.max_inflight
+
+    def queue_position(self, ticket: SubmissionTicket) -> Optional[int]:
+        """票据在队列中的位置（从 1 开始），不在队列中时返回 None"""
+        if ticket.status != TICKET_QUEUED:
+            return None
+        lane = self._lanes.get(ticket.credential)
+        if lane is None:
+            return None
+        for index, queued in enumerate(lane.queue):
+            if queued is ticket:
+                return index + 1
+        return None
+
+    def get_ticket(self, ticket_id: str) -> Optional[SubmissionTicket]:
+        return self._tickets.get(ticket_id)
+
+    def _has_space(self, lane: _Lane) -> bool:
+        return len(lane.queue) + lane.reserved < self.max_queue_size
+
+    async def reserve(self, credential: str):
+        """
+        预留一个队列位置（批量提交的背压：队列已满时等待，直到有排队任务被取出）
+
+        预留后必须以 submit(..., reserved=True) 提交，或调用 cancel_reservation 归还
+        """
+        lane = self._lane(credential)
+        while lane.space_waiters or not self._has_space(lane):
+            waiter = asyncio.get_running_loop().create_future()
+            lane.space_waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # 已被唤醒但取消时，把位置让给下一个等待者
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_space_waiter(lane)
+                raise
+            finally:
+                if waiter in lane.space_waiters:
+                    lane.space_waiters.remove(waiter)
+            if self._has_space(lane):
+                break
+        lane.reserved += 1
+        # 还有空位时继续唤醒下一个等待者
+        self._wake_space_waiter(lane)
+
+    def cancel_reservation(self, credential: str):
+        """归还未使用的队列位置"""
+        lane = self._lane(credential)
+        lane.reserved -= 1
+        self._wake_space_waiter(lane)
+
+    def _wake_space_waiter(self, lane: _Lane):
+        while lane.space_waiters and self._has_space(lane):
+            waiter = lane.space_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def submit(
+        self,
+        credential: str,
+        job: Callable[[], Awaitable[str]],
+        user: Optional[str] = None,
+        wait: bool = False,
+        reserved: bool = False
+    ) -> SubmissionTicket:
+        """
+        提交任务
+
+        有空闲槽位时立即执行 job 并等待结果；否则进入队列并返回排队中的票据。
+
+        Args:
+            credential: 凭证标识（如 Access Key）
+            job: 执行上游提交的协程函数，返回 task_id
+            user: 用户标识（仅用于展示）
+            wait: 排队时是否等待直到提交完成
+            reserved: 是否使用 reserve 预留的队列位置（不会因队列已满被拒绝）
+
+        Raises:
+            QueueFullError: 队列已满
+        """
+        lane = self._lane(credential)
+        if reserved:
+            # 先使用预留的位置：之后抛出异常时调用方不需要再 cancel_reservation
+            lane.reserved -= 1
+        ticket = SubmissionTicket(credential, job, user)
+        self._tickets[ticket.ticket_id] = ticket
+
+        if not lane.queue and self._has_capacity(lane):
+            lane.submitting += 1
+            if reserved:
+                self._wake_space_waiter(lane)
+            await self._run(lane, ticket)
+            self._drain(credential)
+        else:
+            self._enqueue(lane, ticket, force=reserved)
+
+        if wait and not ticket.done.is_set():
+            await ticket.done.wait()
+        return ticket
+
+    def _enqueue(self, lane: _Lane, ticket: SubmissionTicket, front: bool = False, force: bool = False):
+        if not front and not force and not self._has_space(lane):
+            self._tickets.pop(ticket.ticket_id, None)
+            raise QueueFullError(f"提交队列已满（{self.max_queue_size}），请稍后重试")
+        ticket.status = TICKET_QUEUED
+        if front:
+            lane.queue.appendleft(ticket)
+        else:
+            lane.queue.append(ticket)
+        self.queued += 1
+        print(f"⏳ 提交进入队列: ticket={ticket.ticket_id}, 位置={self.queue_position(ticket)}, 进行中={len(lane.inflight)}")
+
+    async def _run(self, lane: _Lane, ticket: SubmissionTicket):
+        """执行提交（调用前已通过 lane.submitting 占用槽位，结束时释放）"""
+        ticket.status = TICKET_SUBMITTING
+        ticket.attempts += 1
+        try:
+            task_id = await ticket.job()
+        except JimengAPIError as e:
+            if e.is_concurrency_limit:
+                # 上游槽位已满（可能有其他进程占用），退避后重新排队到队首
+                self.rejected_upstream += 1
+                lane.paused_until = time.time() + CONCURRENCY_BACKOFF_SECONDS
+                self._enqueue(lane, ticket, front=True)
+                return
+            self._finish(ticket, error=str(e))
+        except Exception as e:
+            self._finish(ticket, error=str(e))
+        else:
+            lane.inflight[task_id] = time.time()
+            self._task_lane[task_id] = ticket.credential
+            self.submitted += 1
+            self._finish(ticket, task_id=task_id)
+        finally:
+            lane.submitting -= 1
+
+    def _finish(self, ticket: SubmissionTicket, task_id: Optional[str] = None, error: Optional[str] = None):
+        ticket.task_id = task_id
+        ticket.error = error
+        ticket.status = TICKET_SUBMITTED if task_id else TICKET_FAILED
+        ticket.finished_at = time.time()
+        ticket.done.set()
+
+    def _drain(self, credential: str):
+        """有空闲槽位时从队列中取出下一个提交"""
+        lane = self._lanes.get(credential)
+        if lane is None:
+            return
+        while lane.queue and self._has_capacity(lane):
+            ticket = lane.queue.popleft()
+            lane.submitting += 1
+            asyncio.get_running_loop().create_task(self._run_and_drain(lane, ticket))
+        self._wake_space_waiter(lane)
+
+    async def _run_and_drain(self, lane: _Lane, ticket: SubmissionTicket):
+        await self._run(lane, ticket)
+        self._drain(ticket.credential)
+
+    def release(self, task_id: str):
+        """上游任务已结束（完成或失败），释放槽位并继续提交排队中的任务"""
+        credential = self._task_lane.pop(task_id, None)
+        if credential is None:
+            return
+        lane = self._lanes.get(credential)
+        if lane is not None and lane.inflight.pop(task_id, None) is not None:
+            print(f"✅ 释放提交槽位: task_id={task_id}, 排队中={len(lane.queue)}")
+            self._drain(credential)
+
+    def _expire(self):
+        """回收超时未释放的槽位（没有客户端轮询的任务）和过期票据"""
+        now = time.time()
+        for credential, lane in self._lanes.items():
+            for task_id, started_at in list(lane.inflight.items()):
+                if now - started_at > self.inflight_ttl_seconds:
+                    lane.inflight.pop(task_id, None)
+                    self._task_lane.pop(task_id, None)
+            self._drain(credential)
+
+        for ticket_id, ticket in list(self._tickets.items()):
+            if ticket.finished_at and now - ticket.finished_at > TICKET_RETENTION_SECONDS:
+                self._tickets.pop(ticket_id, None)
+
+    async def _maintenance_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self._expire()
+            except Exception as e:
+                print(f"提交调度维护失败: {str(e)}")
+
+    def start(self, interval: float = CONCURRENCY_BACKOFF_SECONDS):
+        """启动后台维护任务（退避结束后继续提交、回收超时槽位）"""
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.get_running_loop().create_task(self._maintenance_loop(interval))
+
+    async def stop(self):
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+            self._maintenance_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_inflight": self.max_inflight,
+            "submitted": self.submitted,
+            "queued": self.queued,
+            "rejected_upstream": self.rejected_upstream,
+            "lanes": [
+                {
+                    "credential": f"{credential[:6]}***" if credential else "",
+                    "inflight": len(lane.inflight),
+                    "submitting": lane.submitting,
+                    "queue_length": len(lane.queue),
+                    "reserved": lane.reserved,
+                    "waiting_for_space": len(lane.space_waiters),
+                    "paused": time.time() < lane.paused_until,
+                }
+                for credential, lane in self._lanes.items()
+            ],
+        }
+
+
+submission_scheduler = SubmissionScheduler(
+    max_inflight=JIMENG_MAX_INFLIGHT,
+    inflight_ttl_seconds=JIMENG_INFLIGHT_TTL_SECONDS,
+    max_queue_size=SUBMIT_QUEUE_MAX_SIZE
+)
@@ -0,0 +1,186 @@
+"""
+任务状态事件总线
+状态跟踪（status_tracker）在任务状态变化时发布事件，SSE / WebSocket 连接订阅一个或多个 task_id。
+事件按全局递增序号编号，最近的事件保存在环形缓冲区中，断线重连时可按 Last-Event-ID 补发。
+事件 ID 格式为 "{epoch}-{序号}"，服务重启后 epoch 改变，旧的 Last-Event-ID 不会被误认为已是最新
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import STATUS_STREAM_MAX_CONNECTIONS_PER_USER, STATUS_STREAM_BUFFER_SIZE
+
+# 单个订阅的待发送事件上限（客户端读取过慢时断开，由客户端按 Last-Event-ID 重连补发）
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class TooManyConnectionsError(Exception):
+    """单个用户的状态推送连接数超过上限"""
+
+
+class TaskEvent:
+    """一次任务状态变化"""
+
+    __slots__ = ("event_id", "task_id", "data")
+
+    def __init__(self, event_id: int, task_id: str, data: Dict[str, Any]):
+        self.event_id = event_id
+        self.task_id = task_id
+        self.data = data
+
+
+class Subscription:
+    """一个推送连接的订阅"""
+
+    def __init__(self, bus: "TaskEventBus", user: str, task_ids: Iterable[str]):
+        self._bus = bus
+        self.user = user
+        self.task_ids: Set[str] = set(task_ids)
+        self.queue: "asyncio.Queue[Optional[TaskEvent]]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # 队列溢出后置为 True，连接应关闭
+        self.overflowed = False
+
+    def add(self, task_ids: Iterable[str]):
+        self.task_ids.update(task_ids)
+
+    def push(self, event_id: int, data: Dict[str, Any]):
+        """直接加入一个事件（连接建立时的补发或当前状态）"""
+        self._deliver(TaskEvent(event_id, data["task_id"], data))
+
+    def _deliver(self, event: TaskEvent):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # 丢弃未发送的事件，唤醒等待中的读取方，使其关闭连接
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def next(self, timeout: float) -> Optional[TaskEvent]:
+        """等待下一个事件，超时返回 None（用于发送心跳）"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._bus._unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TaskEventBus:
+    """进程内的任务状态事件总线"""
+
+    def __init__(self, buffer_size: int, max_connections_per_user: int):
+        self.max_connections_per_user = max_connections_per_user
+        self.epoch = int(time.time())
+        self._next_id = 1
+        self._buffer: Deque[TaskEvent] = deque(maxlen=max(1, buffer_size))
+        self._subscriptions: List[Subscription] = []
+        self._connections: Dict[str, int] = {}
+
+        self.published = 0
+        self.rejected_connections = 0
+        self.overflows = 0
+
+    @property
+    def last_event_id(self) -> int:
+        return self._next_id - 1
+
+    def format_event_id(self, event_id: int) -> str:
+        return f"{self.epoch}-{event_id}"
+
+    def parse_event_id(self, value: Optional[str]) -> Optional[int]:
+        """解析客户端传回的 Last-Event-ID；格式无效或来自服务重启之前时返回 None"""
+        if not value:
+            return None
+        epoch, _, event_id = value.partition("-")
+        if epoch != str(self.epoch) or not event_id.isdigit():
+            return None
+        return int(event_id)
+
+    def publish(self, task_id: str, data: Dict[str, Any]) -> int:
+        """发布事件，返回事件序号"""
+        event = TaskEvent(self._next_id, task_id, data)
+        self._next_id += 1
+        self._buffer.append(event)
+        self.published += 1
+        for subscription in self._subscriptions:
+            if task_id in subscription.task_ids:
+                was_overflowed = subscription.overflowed
+                subscription._deliver(event)
+                if subscription.overflowed and not was_overflowed:
+                    self.overflows += 1
+        return event.event_id
+
+    def subscribe(self, user: str, task_ids: Iterable[str]) -> Subscription:
+        """
+        订阅任务状态
+
+        Raises:
+            TooManyConnectionsError: 该用户的连接数已达上限
+        """
+        if self._connections.get(user, 0) >= self.max_connections_per_user:
+            self.rejected_connections += 1
+            raise TooManyConnectionsError(
+                f"状态推送连接数已达上限（{self.max_connections_per_user}），请关闭其他页面后重试"
+            )
+        subscription = Subscription(self, user, task_ids)
+        self._subscriptions.append(subscription)
+        self._connections[user] = self._connections.get(user, 0) + 1
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            remaining = self._connections.get(subscription.user, 1) - 1
+            if remaining > 0:
+                self._connections[subscription.user] = remaining
+            else:
+                self._connections.pop(subscription.user, None)
+
+    def replay(self, after_event_id: int, task_ids: Iterable[str]) -> Tuple[List[TaskEvent], bool]:
+        """
+        补发序号大于 after_event_id 的事件
+
+        Returns:
+            (事件列表, 是否完整)；缓冲区中已没有断线期间的全部事件时返回不完整，调用方应发送当前状态快照
+        """
+        task_ids = set(task_ids)
+        complete = not self._buffer or self._buffer[0].event_id <= after_event_id + 1
+        events = [
+            event for event in self._buffer
+            if event.event_id > after_event_id and event.task_id in task_ids
+        ]
+        return events, complete
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_event_id": self.last_event_id,
+            "published": self.published,
+            "buffered": len(self._buffer),
+            "subscriptions": len(self._subscriptions),
+            "users": len(self._connections),
+            "max_connections_per_user": self.max_connections_per_user,
+            "rejected_connections": self.rejected_connections,
+            "overflows": self.overflows,
+        }
+
+
+task_events = TaskEventBus(
+    buffer_size=STATUS_STREAM_BUFFER_SIZE,
+    max_connections_per_user=STATUS_STREAM_MAX_CONNECTIONS_PER_USER
+)
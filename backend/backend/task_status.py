@@ -0,0 +1,24 @@
+"""
+视频生成任务状态及允许的状态转换
+pending -> processing -> completed / failed（pending 也可以直接结束）；completed / failed 为终态
+"""
+from typing import Dict, FrozenSet
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+TERMINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+# 状态 -> 可以转换到该状态的前一状态
+STATUS_PREDECESSORS: Dict[str, FrozenSet[str]] = {
+    STATUS_PENDING: frozenset(),
+    STATUS_PROCESSING: frozenset({STATUS_PENDING}),
+    STATUS_COMPLETED: frozenset({STATUS_PENDING, STATUS_PROCESSING}),
+    STATUS_FAILED: frozenset({STATUS_PENDING, STATUS_PROCESSING}),
+}
+
+
+def can_transition(current: str, new: str) -> bool:
+    """current -> new 是否为有效的状态变化（相同状态不算变化）"""
+    return current in STATUS_PREDECESSORS.get(new, frozenset())
@@ -0,0 +1,193 @@
+"""
+超时任务定时清理
+后台任务定期将长时间处于 pending / processing 的生成记录标记为失败（单条 UPDATE）。
+多实例部署时通过 PostgreSQL 会话级 advisory lock 选出一个实例（leader）执行清理：
+leader 在一个专用连接上持有锁，连接断开（实例退出、网络中断）时锁由数据库释放，其他实例在下一轮接手。
+会话级锁要求连接始终对应同一个数据库会话：SUPABASE_DB_URL 使用事务模式连接池（transaction pooling）时，
+需设置 TIMEOUT_SWEEP_LOCK_DB_URL 为直连或会话模式的连接字符串，leader 连接单独使用该地址。
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TIMEOUT_SWEEP_INTERVAL_SECONDS, TIMEOUT_SWEEP_MINUTES, TIMEOUT_SWEEP_LOCK_DB_URL
+
+# advisory lock 的键（所有实例相同）
+SWEEPER_LOCK_KEY = 0x6A6D5357
+
+
+class TimeoutSweeper:
+    """超时任务清理"""
+
+    def __init__(self, interval_seconds: float, timeout_minutes: int, lock_db_url: Optional[str] = None):
+        self.interval_seconds = interval_seconds
+        self.timeout_minutes = timeout_minutes
+        self.lock_db_url = lock_db_url
+        self._lock_engine = None
+        self._task: Optional[asyncio.Task] = None
+        # 持有 advisory lock 的专用连接（本实例为 leader 时不为 None）
+        self._leader_conn = None
+        # 清理线程与关闭时的释放不能同时使用专用连接
+        self._leader_lock = threading.Lock()
+
+        self.sweeps = 0
+        self.skipped = 0
+        self.failures = 0
+        self.expired = 0
+        self.last_sweep_at: Optional[float] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_conn is not None
+
+    def _get_lock_engine(self):
+        """leader 连接使用的引擎（未单独配置时与应用共用）"""
+        from .database import engine
+
+        if not self.lock_db_url:
+            return engine
+        if self._lock_engine is None:
+            from sqlalchemy import create_engine
+            from sqlalchemy.pool import NullPool
+            self._lock_engine = create_engine(
+                self.lock_db_url,
+                poolclass=NullPool,
+                connect_args={"connect_timeout": 10, "sslmode": "require"}
+            )
+        return self._lock_engine
+
+    def _ensure_leader(self) -> bool:
+        """确认（或尝试成为）leader（在线程池中调用）"""
+        from sqlalchemy import text
+
+        engine = self._get_lock_engine()
+        if engine.dialect.name != "postgresql":
+            return True
+        if self._leader_conn is not None:
+            try:
+                # 专用连接仍然存活，说明锁仍由本实例持有
+                self._leader_conn.execute(text("SELECT 1"))
+                self._leader_conn.commit()
+                return True
+            except Exception as e:
+                print(f"⚠️ 超时清理 leader 连接已断开，放弃 leader: {str(e)}")
+                self._drop_leader_conn()
+
+        conn = engine.connect()
+        try:
+            acquired = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": SWEEPER_LOCK_KEY}
+            ).scalar()
+            # 结束查询事务（会话级锁不随事务释放），避免连接长时间处于 idle in transaction
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._leader_conn = conn
+        print("🧹 本实例成为超时任务清理的 leader")
+        return True
+
+    def _drop_leader_conn(self):
+        conn, self._leader_conn = self._leader_conn, None
+        if conn is not None:
+            try:
+                conn.invalidate()
+            except Exception:
+                pass
+
+    def _release_leader(self):
+        """释放 advisory lock 和专用连接（在线程池中调用）"""
+        from sqlalchemy import text
+
+        with self._leader_lock:
+            conn, self._leader_conn = self._leader_conn, None
+        if conn is None:
+            return
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SWEEPER_LOCK_KEY})
+            conn.commit()
+            conn.close()
+        except Exception:
+            # 连接异常时直接丢弃，数据库在会话结束时释放锁
+            conn.invalidate()
+
+    def sweep_once(self) -> Optional[int]:
+        """
+        执行一轮清理（在线程池中调用）
+
+        Returns:
+            标记为失败的记录数；数据库未配置或本实例不是 leader 时返回 None
+        """
+        from .database import SessionLocal, session_scope
+        from .video_history import VideoHistoryService
+
+        if not SessionLocal:
+            return None
+        with self._leader_lock:
+            if not self._ensure_leader():
+                return None
+            with session_scope() as db:
+                count = VideoHistoryService.cleanup_timeout_tasks(db, timeout_minutes=self.timeout_minutes)
+                db.commit()
+                return count
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                count = await asyncio.to_thread(self.sweep_once)
+            except Exception as e:
+                self.failures += 1
+                print(f"清理超时任务失败: {str(e)}")
+                continue
+            if count is None:
+                self.skipped += 1
+                continue
+            self.sweeps += 1
+            self.expired += count
+            self.last_sweep_at = time.time()
+            if count > 0:
+                print(f"🧹 已将 {count} 个超时任务标记为失败（超过 {self.timeout_minutes} 分钟）")
+
+    def start(self):
+        """启动定时清理"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # 主动释放锁，其他实例在下一轮即可接手
+        await asyncio.to_thread(self._release_leader)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "timeout_minutes": self.timeout_minutes,
+            "leader": self.is_leader,
+            "sweeps": self.sweeps,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "expired": self.expired,
+            "last_sweep_at": self.last_sweep_at,
+        }
+
+
+timeout_sweeper = TimeoutSweeper(
+    interval_seconds=TIMEOUT_SWEEP_INTERVAL_SECONDS,
+    timeout_minutes=TIMEOUT_SWEEP_MINUTES,
+    lock_db_url=TIMEOUT_SWEEP_LOCK_DB_URL
+)
@@ -2,10 +2,14 @@
 视频生成历史记录服务
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy import and_, desc, func, insert, or_, update
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 from .database import VideoGeneration, User
+from .task_status import STATUS_COMPLETED, STATUS_FAILED, STATUS_PREDECESSORS, TERMINAL_STATUSES
+
+# 状态更新写入的列（不属于 build_generation_record 的参数）
+GENERATION_UPDATE_FIELDS = ("video_url", "video_name", "video_size", "error_message", "completed_at")
 
 
 class VideoHistoryService:
@@ -32,15 +36,7 @@ class VideoHistoryService:
         """创建视频生成记录"""
         try:
             print(f"🔍 创建 VideoGeneration 对象: task_id={task_id}, user_id={user_id}, req_key={req_key}, version={version}")
-            
-            # 保存 req_key 和 version 到 extra_metadata
-            extra_metadata = {}
-            if req_key:
-                extra_metadata["req_key"] = req_key
-            if version:
-                extra_metadata["version"] = version
-            
-            generation = VideoGeneration(
+            generation = VideoHistoryService.build_generation_record(
                 task_id=task_id,
                 user_id=user_id,
                 prompt=prompt,
@@ -53,7 +49,8 @@ class VideoHistoryService:
                 first_frame_url=first_frame_url,
                 last_frame_url=last_frame_url,
                 status=status,
-                extra_metadata=extra_metadata if extra_metadata else None
+                req_key=req_key,
+                version=version
             )
             print(f"🔍 添加到数据库会话...")
             db.add(generation)
@@ -71,48 +68,290 @@ class VideoHistoryService:
             raise
     
     @staticmethod
-    def update_generation_status(
+    def build_generation_record(
+        task_id: str,
+        user_id: int,
+        prompt: str,
+        duration: int,
+        fps: int = 24,
+        width: int = 720,
+        height: int = 720,
+        seed: Optional[int] = None,
+        negative_prompt: Optional[str] = None,
+        first_frame_url: Optional[str] = None,
+        last_frame_url: Optional[str] = None,
+        status: str = "pending",
+        req_key: Optional[str] = None,
+        version: Optional[str] = None
+    ) -> VideoGeneration:
+        """构建（未保存的）视频生成记录"""
+        return VideoGeneration(**VideoHistoryService.generation_record_values(
+            task_id=task_id,
+            user_id=user_id,
+            prompt=prompt,
+            duration=duration,
+            fps=fps,
+            width=width,
+            height=height,
+            seed=seed,
+            negative_prompt=negative_prompt,
+            first_frame_url=first_frame_url,
+            last_frame_url=last_frame_url,
+            status=status,
+            req_key=req_key,
+            version=version
+        ))
+    
+    @staticmethod
+    def generation_record_values(
+        task_id: str,
+        user_id: int,
+        prompt: str,
+        duration: int,
+        fps: int = 24,
+        width: int = 720,
+        height: int = 720,
+        seed: Optional[int] = None,
+        negative_prompt: Optional[str] = None,
+        first_frame_url: Optional[str] = None,
+        last_frame_url: Optional[str] = None,
+        status: str = "pending",
+        req_key: Optional[str] = None,
+        version: Optional[str] = None
+    ) -> dict:
+        """视频生成记录的列值（按 ORM 属性名）"""
+        # req_key 和 version 同时保存到 extra_metadata（兼容旧版本读取）
+        extra_metadata = {}
+        if req_key:
+            extra_metadata["req_key"] = req_key
+        if version:
+            extra_metadata["version"] = version
+        
+        return {
+            "task_id": task_id,
+            "user_id": user_id,
+            "prompt": prompt,
+            "duration": duration,
+            "fps": fps,
+            "width": width,
+            "height": height,
+            "seed": seed,
+            "negative_prompt": negative_prompt,
+            "first_frame_url": first_frame_url,
+            "last_frame_url": last_frame_url,
+            "status": status,
+            "req_key": req_key,
+            "version": version,
+            "extra_metadata": extra_metadata if extra_metadata else None,
+        }
+    
+    @staticmethod
+    def insert_generation_records(db: Session, records: List[dict]) -> int:
+        """
+        批量插入视频生成记录（多行 INSERT，单个事务，不回读对象）
+        
+        Args:
+            records: build_generation_record 的参数列表（可额外包含 created_at，
+                以及写入前已收到的状态更新 video_url / video_name / video_size / error_message / completed_at）
+        """
+        if not records:
+            return 0
+        rows = []
+        for record in records:
+            record = dict(record)
+            created_at = record.pop("created_at", None)
+            # 每行都带上这些列（没有时为 NULL），多行 INSERT 的列保持一致
+            updates = {key: record.pop(key, None) for key in GENERATION_UPDATE_FIELDS}
+            row = VideoHistoryService.generation_record_values(**record)
+            row.update(updates)
+            if created_at:
+                row["created_at"] = created_at
+            rows.append(row)
+        try:
+            db.execute(insert(VideoGeneration), rows)
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+    
+    @staticmethod
+    def transition_status(
         db: Session,
         task_id: str,
         status: str,
         video_url: Optional[str] = None,
         video_name: Optional[str] = None,
         video_size: Optional[int] = None,
-        error_message: Optional[str] = None
-    ) -> Optional[VideoGeneration]:
-        """更新视频生成状态"""
-        generation = db.query(VideoGeneration).filter(
-            VideoGeneration.task_id == task_id
-        ).first()
+        error_message: Optional[str] = None,
+        now: Optional[datetime] = None
+    ):
+        """
+        按状态机更新生成状态（单条条件 UPDATE ... RETURNING，不提交事务）
         
-        if not generation:
-            return None
+        只有当前状态可以转换到 status 时才更新；已完成的记录只允许更新视频地址（转存后替换为存储地址）。
+        video_name / completed_at 只在记录中尚无值时写入。
         
-        generation.status = status
+        Returns:
+            更新后的 (id, status, video_url)；记录不存在、状态未变化或转换无效时返回 None
+        """
+        now = now or datetime.utcnow()
+        condition = VideoGeneration.status.in_(STATUS_PREDECESSORS.get(status, ()))
+        if status == STATUS_COMPLETED and video_url:
+            condition = or_(
+                condition,
+                and_(VideoGeneration.status == STATUS_COMPLETED, VideoGeneration.video_url.is_distinct_from(video_url))
+            )
+        
+        values = {"status": status}
         if video_url:
-            generation.video_url = video_url
+            values["video_url"] = video_url
         if video_name:
-            generation.video_name = video_name
+            values["video_name"] = func.coalesce(VideoGeneration.video_name, video_name)
         if video_size:
-            generation.video_size = video_size
+            values["video_size"] = video_size
         if error_message:
-            generation.error_message = error_message
-        if status in ["completed", "failed"]:
-            generation.completed_at = datetime.utcnow()
+            values["error_message"] = error_message
+        if status in TERMINAL_STATUSES:
+            values["completed_at"] = func.coalesce(VideoGeneration.completed_at, now)
+        
+        return db.execute(
+            update(VideoGeneration)
+            .where(VideoGeneration.task_id == task_id, condition)
+            .values(**values)
+            .returning(VideoGeneration.id, VideoGeneration.status, VideoGeneration.video_url)
+            .execution_options(synchronize_session=False)
+        ).first()
+    
+    @staticmethod
+    def update_generation_status(
+        db: Session,
+        task_id: str,
+        status: str,
+        video_url: Optional[str] = None,
+        video_name: Optional[str] = None,
+        video_size: Optional[int] = None,
+        error_message: Optional[str] = None
+    ) -> bool:
+        """
+        更新视频生成状态（记录尚在延迟写入缓冲区中时更新缓冲区）
         
+        Returns:
+            是否有记录被更新（状态未变化或转换无效时返回 False）
+        """
+        row = VideoHistoryService.transition_status(
+            db, task_id, status,
+            video_url=video_url, video_name=video_name, video_size=video_size, error_message=error_message
+        )
         db.commit()
-        db.refresh(generation)
-        return generation
+        if row is not None:
+            return True
+        
+        from .write_behind import generation_writer
+        return generation_writer.update(
+            task_id,
+            status=status,
+            video_url=video_url,
+            video_name=video_name,
+            video_size=video_size,
+            error_message=error_message,
+            completed_at=datetime.utcnow() if status in TERMINAL_STATUSES else None
+        )
+    
+    @staticmethod
+    def apply_status_updates(db: Session, updates: List[dict]) -> Tuple[int, List[dict]]:
+        """
+        批量更新视频生成状态（单个事务，每条为一个条件 UPDATE）
+        
+        在线程池中调用时不访问延迟写入缓冲区：未更新的记录可能尚未写入数据库，
+        由调用方在事件循环中交给 generation_writer.update
+        
+        Args:
+            updates: [{"task_id", "status", "video_url"?, "video_name"?, "error_message"?}, ...]
+        
+        Returns:
+            (实际更新的记录数, 未更新的记录（状态未变化、转换无效或尚在延迟写入缓冲区中）)
+        """
+        if not updates:
+            return 0, []
+        now = datetime.utcnow()
+        skipped = []
+        updated = 0
+        for update_values in {update["task_id"]: update for update in updates}.values():
+            row = VideoHistoryService.transition_status(
+                db,
+                update_values["task_id"],
+                update_values["status"],
+                video_url=update_values.get("video_url"),
+                video_name=update_values.get("video_name"),
+                error_message=update_values.get("error_message"),
+                now=now
+            )
+            if row is None:
+                skipped.append(update_values)
+            else:
+                updated += 1
+        db.commit()
+        return updated, skipped
+    
+    @staticmethod
+    def get_active_generations(db: Session, since: datetime, limit: int = 1000) -> List[VideoGeneration]:
+        """获取指定时间之后创建、尚未结束（pending / processing）的生成记录"""
+        return db.query(VideoGeneration).filter(
+            VideoGeneration.status.in_(["pending", "processing"]),
+            VideoGeneration.created_at >= since
+        ).order_by(VideoGeneration.created_at).limit(limit).all()
+    
+    @staticmethod
+    def get_unarchived_generations(db: Session, since: datetime, storage_url_prefix: str, limit: int = 1000) -> List[VideoGeneration]:
+        """获取指定时间之后创建、已完成但视频地址仍不是对象存储地址（尚未转存）的生成记录"""
+        return db.query(VideoGeneration).filter(
+            VideoGeneration.status == STATUS_COMPLETED,
+            VideoGeneration.created_at >= since,
+            VideoGeneration.video_url.isnot(None),
+            ~VideoGeneration.video_url.startswith(storage_url_prefix, autoescape=True)
+        ).order_by(VideoGeneration.created_at).limit(limit).all()
     
     @staticmethod
     def get_generation_by_task_id(
         db: Session,
         task_id: str
     ) -> Optional[VideoGeneration]:
-        """根据任务ID获取生成记录"""
-        return db.query(VideoGeneration).filter(
+        """根据任务ID获取生成记录（包括尚未写入数据库的记录）"""
+        generation = db.query(VideoGeneration).filter(
             VideoGeneration.task_id == task_id
         ).first()
+        if generation is None:
+            from .write_behind import generation_writer
+            generation = generation_writer.get(task_id)
+        return generation
+    
+    @staticmethod
+    def get_generations_by_task_ids(
+        db: Session,
+        task_ids: List[str],
+        include_pending: bool = True
+    ) -> Dict[str, VideoGeneration]:
+        """
+        根据多个任务ID获取生成记录（一次 IN 查询）
+
+        include_pending 为 True 时包括尚未写入数据库的记录（读取延迟写入缓冲区，只能在事件循环中调用）
+        """
+        if not task_ids:
+            return {}
+        generations = {
+            generation.task_id: generation
+            for generation in db.query(VideoGeneration).filter(VideoGeneration.task_id.in_(task_ids)).all()
+        }
+        if not include_pending:
+            return generations
+        from .write_behind import generation_writer
+        for task_id in task_ids:
+            if task_id not in generations:
+                generation = generation_writer.get(task_id)
+                if generation is not None:
+                    generations[task_id] = generation
+        return generations
     
     @staticmethod
     def get_user_generations(
@@ -172,29 +411,23 @@ class VideoHistoryService:
         db: Session,
         timeout_minutes: int = 5
     ) -> int:
-        """清理超时的任务（pending 或 processing 状态超过指定时间）"""
-        from datetime import datetime, timedelta
+        """
+        将超时的任务（pending 或 processing 状态超过指定时间）标记为失败
         
+        单条 UPDATE 语句，不把记录读入内存；由后台定时清理（timeout_sweeper）调用，提交由调用方负责
+        """
         cutoff_time = datetime.utcnow() - timedelta(minutes=timeout_minutes)
-        
-        # 查找所有超时的 pending 或 processing 任务
-        timeout_tasks = db.query(VideoGeneration).filter(
-            VideoGeneration.status.in_(["pending", "processing"]),
-            VideoGeneration.created_at < cutoff_time
-        ).all()
-        
-        count = len(timeout_tasks)
-        
-        if count > 0:
-            print(f"🧹 清理 {count} 个超时任务（超过 {timeout_minutes} 分钟）")
-            for task in timeout_tasks:
-                elapsed_minutes = (datetime.utcnow() - task.created_at.replace(tzinfo=None) if task.created_at.tzinfo else datetime.utcnow() - task.created_at).total_seconds() / 60
-                task.status = "failed"
-                task.error_message = f"任务超时：已等待 {elapsed_minutes:.1f} 分钟（正常应在1-3分钟内完成）"
-                task.completed_at = datetime.utcnow()
-                print(f"  - 任务 {task.task_id} 已标记为失败（等待 {elapsed_minutes:.1f} 分钟）")
-            
-            db.commit()
-        
-        return count
-
+        result = db.execute(
+            update(VideoGeneration)
+            .where(
+                VideoGeneration.status.in_(STATUS_PREDECESSORS[STATUS_FAILED]),
+                VideoGeneration.created_at < cutoff_time
+            )
+            .values(
+                status=STATUS_FAILED,
+                error_message=f"任务超时：超过 {timeout_minutes} 分钟未完成（正常应在1-3分钟内完成）",
+                completed_at=datetime.utcnow()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount or 0
@@ -184,18 +184,14 @@ class VideoProcessingService:
         return video_path
     
     async def _upload_processed_video(self, video_path: Path) -> str:
-        """上传处理后的视频到对象存储"""
+        """上传处理后的视频到对象存储（分片上传，失败后再次上传同一文件时续传）"""
         from backend.storage import get_storage_service
         
         storage_service = get_storage_service()
         if storage_service:
-            # 生成文件名
-            video_name = f"enhanced_{os.urandom(8).hex()}.mp4"
-            # 上传（注意：这里需要同步读取文件）
-            with open(video_path, 'rb') as f:
-                # 这里需要根据实际的存储服务实现调整
-                # 暂时返回本地路径，实际应该上传到云存储
-                pass
+            # 对象名由临时文件名决定，同一文件重试上传时写入同一位置，才能续传
+            object_key = f"videos/enhanced_{video_path.stem}.mp4"
+            return await storage_service.upload_file(video_path, object_key, "video/mp4")
         
         # 如果没有对象存储，返回临时URL（实际应该上传到云存储）
         # 这里需要根据实际情况实现
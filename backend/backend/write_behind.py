@@ -0,0 +1,425 @@
+"""
+视频生成记录的延迟写入（write-behind）
+提交成功后记录先进入进程内缓冲区，由后台任务按批次以多行 INSERT 写入数据库，
+提交接口不再等待数据库往返。
+- 缓冲区有上限：写满时提交方等待下一次刷新（背压）
+- 尚未写入的记录可以按 task_id 读取和更新状态
+- 写入失败的记录按指数退避留在缓冲区中重试，不会丢弃
+- 应用关闭时刷新缓冲区中的全部记录，仍无法写入的保存到本地文件，下次启动时重新加入缓冲区
+
+缓冲区只在事件循环中读写（add / get / update 必须在事件循环中调用）；线程池中的写入只读取正在写入的记录，
+写入期间收到的更新先记在 changes 中，写入结束后再在事件循环中合并
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL_MS, WRITE_BEHIND_MAX_PENDING,
+    WRITE_BEHIND_DEAD_LETTER_PATH
+)
+
+# 按批次写入失败的次数上限（超过后逐条写入，避免一条坏记录拖住整批）
+MAX_FLUSH_ATTEMPTS = 3
+# 写入失败后的重试间隔（秒）：按失败次数指数增加，不超过上限
+RETRY_BACKOFF_BASE_SECONDS = 1.0
+RETRY_BACKOFF_MAX_SECONDS = 60.0
+# 只通过 update() 写入的字段（不属于 build_generation_record 的参数，插入时单独写入对应的列）
+UPDATE_ONLY_FIELDS = ("video_url", "video_name", "video_size", "error_message", "completed_at")
+# 保存到本地文件时需要转换的时间字段
+DATETIME_FIELDS = ("created_at", "completed_at")
+
+
+class PendingGeneration:
+    """缓冲区中尚未写入数据库的生成记录"""
+
+    __slots__ = ("fields", "x_api_key", "attempts", "retry_at", "changes")
+
+    def __init__(self, fields: Dict[str, Any], x_api_key: Optional[str]):
+        # VideoHistoryService.build_generation_record 的参数（不含 user_id），以及写入前收到的状态更新
+        self.fields = fields
+        self.x_api_key = x_api_key
+        self.attempts = 0
+        # 写入失败后下一次重试的时间（time.monotonic()）
+        self.retry_at = 0.0
+        # 写入过程中收到的状态更新（写入完成后再应用到数据库）
+        self.changes: Optional[Dict[str, Any]] = None
+
+
+class GenerationWriteBehind:
+    """生成记录写入缓冲区"""
+
+    def __init__(self, batch_size: int, flush_interval_ms: int, max_pending: int, dead_letter_path: str):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max(self.batch_size, max_pending)
+        self.dead_letter_path = dead_letter_path
+        self._pending: "OrderedDict[str, PendingGeneration]" = OrderedDict()
+        # 正在写入的记录（写入完成前仍可读取）
+        self._writing: Dict[str, PendingGeneration] = {}
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.backpressure_waits = 0
+
+    @staticmethod
+    def _session_factory():
+        from .database import SessionLocal
+        return SessionLocal
+
+    @property
+    def enabled(self) -> bool:
+        return self._session_factory() is not None
+
+    async def add(self, fields: Dict[str, Any], x_api_key: Optional[str] = None) -> bool:
+        """
+        加入一条生成记录（不等待数据库写入）
+
+        Args:
+            fields: build_generation_record 的参数（不含 user_id，写入时根据 x_api_key 解析）
+            x_api_key: 用户 API Key
+
+        Returns:
+            是否已加入缓冲区（数据库未配置时返回 False）
+        """
+        if not self.enabled:
+            print("⚠️ 数据库未配置，跳过保存历史记录（SUPABASE_DB_URL 未设置）")
+            return False
+
+        if len(self._pending) >= self.max_pending:
+            # 缓冲区已满：等待后台刷新腾出空间
+            self.backpressure_waits += 1
+            self._wakeup.set()
+            async with self._space:
+                await self._space.wait_for(lambda: len(self._pending) < self.max_pending)
+
+        fields = dict(fields)
+        fields.setdefault("created_at", datetime.utcnow())
+        self._pending[fields["task_id"]] = PendingGeneration(fields, x_api_key)
+        self.enqueued += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def get(self, task_id: str):
+        """读取尚未写入数据库的记录（返回未绑定会话的 VideoGeneration），不存在时返回 None"""
+        pending = self._pending.get(task_id) or self._writing.get(task_id)
+        if pending is None:
+            return None
+        from .video_history import VideoHistoryService
+
+        fields = {**pending.fields, **(pending.changes or {})}
+        created_at = fields.pop("created_at", None)
+        extra = {key: fields.pop(key) for key in UPDATE_ONLY_FIELDS if key in fields}
+        generation = VideoHistoryService.build_generation_record(user_id=None, **fields)
+        generation.created_at = created_at
+        for key, value in extra.items():
+            setattr(generation, key, value)
+        return generation
+
+    def update(self, task_id: str, **changes) -> bool:
+        """更新尚未写入数据库的记录（如状态），记录不在缓冲区时返回 False"""
+        changes = {key: value for key, value in changes.items() if value is not None}
+        pending = self._pending.get(task_id)
+        if pending is not None:
+            pending.fields.update(changes)
+            return True
+        pending = self._writing.get(task_id)
+        if pending is None:
+            return False
+        # 正在写入：fields 可能正被写入线程读取，先记下，写入结束后再合并
+        pending.changes = {**(pending.changes or {}), **changes}
+        return True
+
+    def _take_batch(self, drain: bool = False) -> List[PendingGeneration]:
+        """按加入顺序取出一批记录（跳过未到重试时间的记录，drain=True 时不跳过）"""
+        now = time.monotonic()
+        task_ids = []
+        for task_id, pending in self._pending.items():
+            if len(task_ids) >= self.batch_size:
+                break
+            if drain or pending.retry_at <= now:
+                task_ids.append(task_id)
+        return [self._pending.pop(task_id) for task_id in task_ids]
+
+    def _ready_count(self) -> int:
+        now = time.monotonic()
+        return sum(1 for pending in self._pending.values() if pending.retry_at <= now)
+
+    def _write_sync(self, batch: List[PendingGeneration]) -> int:
+        """在一个事务中写入一批记录（在线程池中执行）"""
+        from .auth import AuthService
+        from .database import session_scope
+        from .video_history import VideoHistoryService
+
+        with session_scope() as db:
+            # 同一批次中相同 API Key 只解析一次用户
+            user_ids: Dict[Optional[str], int] = {}
+            records = []
+            for pending in batch:
+                if pending.x_api_key not in user_ids:
+                    user = AuthService.get_user_by_api_key(db, pending.x_api_key) if pending.x_api_key else None
+                    user_ids[pending.x_api_key] = user.id if user else AuthService.get_or_create_default_user(db).id
+                records.append(self._record_values(pending, user_ids[pending.x_api_key]))
+            return VideoHistoryService.insert_generation_records(db, records)
+
+    @staticmethod
+    def _record_values(pending: PendingGeneration, user_id: int) -> Dict[str, Any]:
+        # 写入前已收到的状态更新（video_url 等）随记录一起插入
+        return {**pending.fields, "user_id": user_id}
+
+    @staticmethod
+    def _merge_changes(pending: PendingGeneration) -> Optional[Dict[str, Any]]:
+        """把写入期间收到的更新合并到 fields（在事件循环中调用），返回合并的更新"""
+        changes = pending.changes
+        pending.changes = None
+        if changes:
+            pending.fields.update(changes)
+        return changes
+
+    def _apply_changes_sync(self, updated: List[Dict[str, Any]]):
+        """应用写入过程中收到的状态更新（updated 为事件循环中取出的快照）"""
+        from .database import session_scope
+        from .video_history import VideoHistoryService
+
+        with session_scope() as db:
+            for changes in updated:
+                changes = dict(changes)
+                # 条件更新：写入时已包含的状态不会重复写入
+                VideoHistoryService.transition_status(
+                    db,
+                    changes.pop("task_id"),
+                    changes.pop("status"),
+                    **{key: value for key, value in changes.items() if key in ("video_url", "video_name", "video_size", "error_message")}
+                )
+            db.commit()
+
+    async def _apply_pending_changes(self, written: List[PendingGeneration]):
+        """应用写入期间收到的更新；应用期间又收到的更新在下一轮应用，直到没有新的更新"""
+        while True:
+            updated = []
+            for pending in written:
+                changes = self._merge_changes(pending)
+                if changes:
+                    updated.append({
+                        **changes,
+                        "task_id": pending.fields["task_id"],
+                        "status": pending.fields.get("status", "pending"),
+                    })
+            if not updated:
+                return
+            try:
+                await asyncio.to_thread(self._apply_changes_sync, updated)
+            except Exception as e:
+                print(f"⚠️ 应用生成记录状态更新失败: {str(e)}")
+                return
+
+    def _requeue(self, pending: PendingGeneration, front: bool = True):
+        """放回缓冲区（期间加入的同一 task_id 以新记录为准）"""
+        task_id = pending.fields["task_id"]
+        if task_id in self._pending:
+            return
+        self._pending[task_id] = pending
+        if front:
+            self._pending.move_to_end(task_id, last=False)
+
+    async def _flush_batch(self, batch: List[PendingGeneration], drain: bool = False) -> bool:
+        """
+        写入一个批次，返回是否成功
+
+        写入失败的记录放回缓冲区，按失败次数退避后重试；drain=True 时逐条写入仍失败的记录保存到本地文件
+        """
+        for pending in batch:
+            pending.changes = None
+            self._writing[pending.fields["task_id"]] = pending
+        try:
+            written = await asyncio.to_thread(self._write_sync, batch)
+            self.flushed += written
+            self.flushes += 1
+            await self._apply_pending_changes(batch)
+            return True
+        except Exception as e:
+            self.failures += 1
+            print(f"❌ 批量写入生成记录失败（{len(batch)} 条）: {str(e)}")
+            retry = []
+            dead = []
+            for pending in batch:
+                # 写入失败：期间收到的更新直接合并，重试时一并写入
+                self._merge_changes(pending)
+                pending.attempts += 1
+                if pending.attempts < MAX_FLUSH_ATTEMPTS:
+                    retry.append(pending)
+                    continue
+                # 多次失败：逐条写入，避免一条坏记录拖住整批
+                try:
+                    self.flushed += await asyncio.to_thread(self._write_sync, [pending])
+                    await self._apply_pending_changes([pending])
+                except Exception as row_error:
+                    print(f"❌ 生成记录写入失败: task_id={pending.fields.get('task_id')}, "
+                          f"第 {pending.attempts} 次, {str(row_error)}")
+                    self._merge_changes(pending)
+                    (dead if drain else retry).append(pending)
+            # 放回缓冲区队首，退避后重试
+            now = time.monotonic()
+            for pending in reversed(retry):
+                delay = min(RETRY_BACKOFF_BASE_SECONDS * 2 ** (pending.attempts - 1), RETRY_BACKOFF_MAX_SECONDS)
+                pending.retry_at = now + delay
+                self.retries += 1
+                self._requeue(pending)
+            if dead:
+                self._save_dead_letters(dead)
+            return False
+        finally:
+            for pending in batch:
+                self._writing.pop(pending.fields["task_id"], None)
+
+    async def flush(self, drain: bool = False) -> bool:
+        """
+        写入缓冲区中的记录（缓冲区不足一个批次时停止）；drain=True 时写入全部记录
+
+        Returns:
+            是否全部批次写入成功
+        """
+        ok = True
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._take_batch(drain=drain)
+                if not batch:
+                    break
+                async with self._space:
+                    self._space.notify_all()
+                if not await self._flush_batch(batch, drain=drain):
+                    ok = False
+                    if not drain:
+                        break
+                # drain 时每条记录最多按批次重试 MAX_FLUSH_ATTEMPTS 次，之后逐条写入或保存到文件，不会无限循环
+                if not drain and self._ready_count() < self.batch_size:
+                    break
+        return ok
+
+    def _save_dead_letters(self, records: List[PendingGeneration]):
+        """把无法写入数据库的记录追加到本地文件（下次启动时重新加入缓冲区）"""
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for pending in records:
+                    fields = dict(pending.fields)
+                    for key in DATETIME_FIELDS:
+                        if isinstance(fields.get(key), datetime):
+                            fields[key] = fields[key].isoformat()
+                    f.write(json.dumps({"fields": fields, "x_api_key": pending.x_api_key}, ensure_ascii=False) + "\n")
+            self.dead_lettered += len(records)
+            print(f"💾 {len(records)} 条生成记录无法写入数据库，已保存到 {self.dead_letter_path}")
+        except Exception as e:
+            task_ids = [pending.fields.get("task_id") for pending in records]
+            print(f"❌ 保存未写入的生成记录失败，记录丢失: task_ids={task_ids}, {str(e)}")
+
+    def _load_dead_letters(self) -> int:
+        """把上次关闭时未写入的记录重新加入缓冲区，返回加入的条数"""
+        if not os.path.exists(self.dead_letter_path):
+            return 0
+        try:
+            with open(self.dead_letter_path, "r", encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+            # 读入缓冲区后即删除：之后再次失败的记录在关闭时重新保存
+            os.remove(self.dead_letter_path)
+        except Exception as e:
+            print(f"⚠️ 读取未写入的生成记录失败: {str(e)}")
+            return 0
+        loaded = 0
+        for line in lines:
+            try:
+                item = json.loads(line)
+                fields = item["fields"]
+                for key in DATETIME_FIELDS:
+                    if fields.get(key):
+                        fields[key] = datetime.fromisoformat(fields[key])
+            except Exception as e:
+                print(f"⚠️ 跳过无法解析的生成记录: {str(e)}")
+                continue
+            # 已在缓冲区中的同一 task_id 以缓冲区为准
+            if fields.get("task_id") and fields["task_id"] not in self._pending:
+                self._pending[fields["task_id"]] = PendingGeneration(fields, item.get("x_api_key"))
+                loaded += 1
+        if loaded:
+            print(f"💾 重新加入 {loaded} 条上次未写入的生成记录")
+            self._wakeup.set()
+        return loaded
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping or not self._pending:
+                continue
+            try:
+                ok = await self.flush()
+            except Exception as e:
+                print(f"刷新生成记录失败: {str(e)}")
+                ok = False
+            if not ok:
+                # 写入失败后稍等再重试，避免在数据库不可用时空转
+                await asyncio.sleep(self.flush_interval)
+
+    def start(self):
+        """启动后台刷新任务"""
+        if self._task is None:
+            self._stopping = False
+            if self.enabled:
+                self._load_dead_letters()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止后台刷新任务，并写入缓冲区中剩余的记录"""
+        if self._task is not None:
+            # 等待当前批次写完（不取消，避免丢失正在写入的记录）
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self._pending:
+            print(f"💾 关闭前写入 {len(self._pending)} 条生成记录")
+            await self.flush(drain=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "writing": len(self._writing),
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+
+generation_writer = GenerationWriteBehind(
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval_ms=WRITE_BEHIND_FLUSH_INTERVAL_MS,
+    max_pending=WRITE_BEHIND_MAX_PENDING,
+    dead_letter_path=WRITE_BEHIND_DEAD_LETTER_PATH
+)
@@ -2,10 +2,14 @@
 配置文件
 """
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 后端目录（本地文件默认保存在该目录下，不依赖启动时的工作目录）
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # API 配置
 API_KEY = os.getenv("API_KEY", "")
 SEEDANCE_API_ENDPOINT = os.getenv("SEEDANCE_API_ENDPOINT", "")
@@ -52,3 +56,112 @@ JIMENG_V35_PRO_REQ_KEYS = {
     }
 }
 
+# 首帧图片解码后允许的最大字节数（默认 10MB）
+FIRST_FRAME_MAX_BYTES = int(os.getenv("FIRST_FRAME_MAX_BYTES", 10 * 1024 * 1024))
+# 首帧图片允许的最大像素数（默认 4000 万，按文件头中的宽高在解码像素前校验，防止解压炸弹）
+FIRST_FRAME_MAX_PIXELS = int(os.getenv("FIRST_FRAME_MAX_PIXELS", 40_000_000))
+
+# 首帧标准化：提交前缩放到目标分辨率以内并转为 JPEG（去除元数据）
+FIRST_FRAME_NORMALIZE = os.getenv("FIRST_FRAME_NORMALIZE", "true").lower() == "true"
+FIRST_FRAME_TARGET_SIZES = {
+    "1080p": (1920, 1080),
+}
+FIRST_FRAME_JPEG_QUALITY = int(os.getenv("FIRST_FRAME_JPEG_QUALITY", 90))
+# 标准化结果缓存条目数（按源图片内容哈希）
+FIRST_FRAME_CACHE_SIZE = int(os.getenv("FIRST_FRAME_CACHE_SIZE", 64))
+# 首帧图片本地暂存目录（未配置对象存储时使用；相对路径相对于后端目录）
+FRAMES_DIR = os.path.join(BACKEND_DIR, os.getenv("FRAMES_DIR", "frames"))
+
+# RAG 提示词增强
+RAG_ENABLED = os.getenv("RAG_ENABLED", "true").lower() == "true"
+# RAG 服务代码目录（默认与项目同级的 doubao-rag/backend）
+RAG_SERVICE_PATH = os.getenv(
+    "RAG_SERVICE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "doubao-rag", "backend")
+)
+# 启动时在后台线程中预热 RAG 服务
+RAG_WARMUP = os.getenv("RAG_WARMUP", "true").lower() == "true"
+# 增强的延迟预算（毫秒），超过后使用原始提示词
+RAG_LATENCY_BUDGET_MS = int(os.getenv("RAG_LATENCY_BUDGET_MS", 800))
+# 增强结果缓存
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", 256))
+RAG_CACHE_TTL = int(os.getenv("RAG_CACHE_TTL", 3600))
+
+# 视频生成请求去重窗口（秒）：窗口内相同 Idempotency-Key 或相同请求内容返回首次提交的 task_id
+# （按请求内容去重只对带 API Key 的请求生效，匿名请求只按 Idempotency-Key 去重）
+# 设置为 0 关闭去重
+SUBMIT_DEDUP_WINDOW_SECONDS = int(os.getenv("SUBMIT_DEDUP_WINDOW_SECONDS", 60))
+
+# 即梦 API 每组凭证同时进行中的任务数上限（超出后在本地排队，避免 50430 并发限制）
+JIMENG_MAX_INFLIGHT = int(os.getenv("JIMENG_MAX_INFLIGHT", 2))
+# 进行中任务的最长占用时间（秒），超时后即使未观察到结束也释放槽位
+JIMENG_INFLIGHT_TTL_SECONDS = int(os.getenv("JIMENG_INFLIGHT_TTL_SECONDS", 600))
+# 本地提交队列的最大长度（每组凭证）
+SUBMIT_QUEUE_MAX_SIZE = int(os.getenv("SUBMIT_QUEUE_MAX_SIZE", 200))
+
+# 批量生成：单批最大条目数，以及校验/提交的并发数
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 500))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+
+# 生成记录延迟写入：每批最多写入条数、刷新间隔（毫秒）、缓冲区上限（写满时提交等待刷新）
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 100))
+WRITE_BEHIND_FLUSH_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", 200))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 2000))
+# 关闭时仍无法写入的生成记录保存到该文件（JSON Lines），下次启动时重新加入缓冲区（相对路径相对于后端目录）
+WRITE_BEHIND_DEAD_LETTER_PATH = os.path.join(
+    BACKEND_DIR, os.getenv("WRITE_BEHIND_DEAD_LETTER_PATH", os.path.join("data", "generation_records_unwritten.jsonl"))
+)
+
+# 任务状态跟踪：上游轮询间隔（秒）、并发查询数、任务超时（秒，超过后标记为失败）
+STATUS_POLL_INTERVAL_SECONDS = float(os.getenv("STATUS_POLL_INTERVAL_SECONDS", 3))
+STATUS_POLL_CONCURRENCY = int(os.getenv("STATUS_POLL_CONCURRENCY", 4))
+STATUS_TASK_TIMEOUT_SECONDS = int(os.getenv("STATUS_TASK_TIMEOUT_SECONDS", 300))
+
+# 任务状态推送（SSE / WebSocket）：心跳间隔（秒）、重连间隔（毫秒）、单连接最多订阅任务数、
+# 每个用户的最大连接数、补发事件的缓冲区大小
+STATUS_STREAM_HEARTBEAT_SECONDS = float(os.getenv("STATUS_STREAM_HEARTBEAT_SECONDS", 15))
+STATUS_STREAM_RETRY_MS = int(os.getenv("STATUS_STREAM_RETRY_MS", 3000))
+STATUS_STREAM_MAX_TASKS = int(os.getenv("STATUS_STREAM_MAX_TASKS", 50))
+STATUS_STREAM_MAX_CONNECTIONS_PER_USER = int(os.getenv("STATUS_STREAM_MAX_CONNECTIONS_PER_USER", 6))
+STATUS_STREAM_BUFFER_SIZE = int(os.getenv("STATUS_STREAM_BUFFER_SIZE", 10000))
+
+# 状态长轮询的最长等待时间（秒），需小于反向代理 / Serverless 的请求超时
+STATUS_LONG_POLL_MAX_WAIT_SECONDS = float(os.getenv("STATUS_LONG_POLL_MAX_WAIT_SECONDS", 30))
+
+# 上游状态查询缓存最多缓存的任务数（进行中任务的结果有效到下一次计划轮询，
+# 已结束的任务永久缓存，超过数量时淘汰最久未使用的）
+STATUS_CACHE_MAX_ENTRIES = int(os.getenv("STATUS_CACHE_MAX_ENTRIES", 10000))
+
+# 视频转存（上传到对象存储）：工作协程数、最大尝试次数、重试基础间隔（秒，按次数指数增加）
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", 2))
+ARCHIVE_MAX_ATTEMPTS = int(os.getenv("ARCHIVE_MAX_ATTEMPTS", 5))
+ARCHIVE_RETRY_BASE_SECONDS = float(os.getenv("ARCHIVE_RETRY_BASE_SECONDS", 5))
+
+# 超时任务定时清理：清理间隔（秒）、超时时间（分钟，pending / processing 超过该时间标记为失败）
+TIMEOUT_SWEEP_INTERVAL_SECONDS = float(os.getenv("TIMEOUT_SWEEP_INTERVAL_SECONDS", 60))
+TIMEOUT_SWEEP_MINUTES = int(os.getenv("TIMEOUT_SWEEP_MINUTES", 5))
+# 多实例选举清理 leader 的 advisory lock 使用的数据库地址（直连或会话模式连接池）；
+# 为空时使用 SUPABASE_DB_URL（事务模式连接池下会话级锁不可靠）
+TIMEOUT_SWEEP_LOCK_DB_URL = os.getenv("TIMEOUT_SWEEP_LOCK_DB_URL") or None
+
+# 批量状态查询单次最多的任务数
+STATUS_BATCH_MAX_TASKS = int(os.getenv("STATUS_BATCH_MAX_TASKS", 100))
+
+# 对象存储分片上传：分片大小（MB，S3 要求除最后一片外不小于 5MB）、同一文件同时上传的分片数、
+# 单个分片的最大尝试次数、续传状态目录（保存 upload_id 和已完成的分片）
+STORAGE_PART_SIZE_MB = max(5, int(os.getenv("STORAGE_PART_SIZE_MB", 8)))
+STORAGE_UPLOAD_CONCURRENCY = max(1, int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", 4)))
+STORAGE_PART_MAX_ATTEMPTS = max(1, int(os.getenv("STORAGE_PART_MAX_ATTEMPTS", 3)))
+STORAGE_UPLOAD_STATE_DIR = os.getenv(
+    "STORAGE_UPLOAD_STATE_DIR", os.path.join(tempfile.gettempdir(), "storage_uploads")
+)
+
+# 对象存储 SDK 调用：存储线程池大小、每个存储后端同时执行的 SDK 调用数
+STORAGE_THREAD_POOL_SIZE = max(1, int(os.getenv("STORAGE_THREAD_POOL_SIZE", 8)))
+STORAGE_BACKEND_CONCURRENCY = max(1, int(os.getenv("STORAGE_BACKEND_CONCURRENCY", 4)))
+# 单个存储后端的并发数：STORAGE_BACKEND_CONCURRENCY_<后端名>（如 STORAGE_BACKEND_CONCURRENCY_S3），后端名 -> 并发数
+STORAGE_BACKEND_CONCURRENCY_OVERRIDES = {
+    key[len("STORAGE_BACKEND_CONCURRENCY_"):].lower(): max(1, int(value))
+    for key, value in os.environ.items()
+    if key.startswith("STORAGE_BACKEND_CONCURRENCY_") and value
+}
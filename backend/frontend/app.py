@@ -143,18 +143,58 @@ def generate_video(prompt: str, width: int, height: int, duration: int,
         }
 
 
-def check_video_status(task_id: str, backend_url: str) -> dict:
-    """查询视频生成状态"""
+def check_video_status(task_id: str, backend_url: str, since: Optional[int] = None, wait: int = 25) -> dict:
+    """查询视频生成状态（传入 since 时长轮询：状态未变化则等待变化或超时后再返回）"""
     url = f"{backend_url}/api/v1/video/status/{task_id}"
+    params = {"since": since, "wait": wait} if since is not None else None
     
     try:
-        response = requests.get(url, timeout=30)
+        response = requests.get(url, params=params, timeout=wait + 30)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         return {"status": "error", "error": str(e)}
 
 
+def stream_video_status(task_id: str, backend_url: str, max_wait: float = 240):
+    """
+    订阅视频生成状态（SSE 推送），状态变化时立即返回；推送不可用时回退为轮询
+
+    Yields:
+        状态字典（与 check_video_status 的返回格式相同）
+    """
+    import json
+
+    started = time.time()
+    url = f"{backend_url}/api/v1/video/status/stream"
+    try:
+        with requests.get(url, params={"task_ids": task_id}, stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    status_info = json.loads(line[5:].strip())
+                    yield status_info
+                    if status_info.get("status") in ("completed", "failed"):
+                        return
+                if time.time() - started > max_wait:
+                    return
+    except (requests.exceptions.RequestException, ValueError):
+        pass
+
+    # 推送不可用（旧版本后端、连接数超限等），回退为长轮询
+    since = None
+    while time.time() - started <= max_wait:
+        status_info = check_video_status(task_id, backend_url, since=since)
+        yield status_info
+        if status_info.get("status") in ("completed", "failed"):
+            return
+        since = status_info.get("version")
+        if since is None:
+            # 后端不支持长轮询；如果遇到并发限制，增加等待时间
+            warning = status_info.get("warning")
+            time.sleep(5 if warning and "并发限制" in warning else 2)
+
+
 def main():
     # 创建标签页
     tab1, tab2, tab3 = st.tabs(["🎬 视频生成", "📦 资产管理", "📚 知识库"])
@@ -358,9 +398,10 @@ def video_generation_page():
                         status_placeholder = st.empty()
                         progress_bar = st.progress(0)
                         
-                        max_attempts = 120  # 最多轮询 120 次（约 4 分钟，5秒视频通常需要1-3分钟）
-                        for attempt in range(max_attempts):
-                            status_info = check_video_status(task_id, st.session_state.backend_url)
+                        # 最多等待约 4 分钟（5秒视频通常需要1-3分钟）
+                        wait_started = time.time()
+                        finished = False
+                        for status_info in stream_video_status(task_id, st.session_state.backend_url):
                             status = status_info.get("status", "processing")
                             progress = status_info.get("progress", 0)
                             
@@ -369,7 +410,7 @@ def video_generation_page():
                             note = status_info.get("note")
                             
                             progress_bar.progress(progress / 100)
-                            status_text = f"状态: {status} ({progress}%) - 已等待 {attempt * 2} 秒"
+                            status_text = f"状态: {status_info.get('phase', status)} ({progress}%) - 已等待 {int(time.time() - wait_started)} 秒"
                             if warning:
                                 status_text += f" ⚠️ {warning}"
                             elif note:
@@ -383,22 +424,16 @@ def video_generation_page():
                                     st.video(video_url)
                                     st.session_state.generated_videos[-1]["video_url"] = video_url
                                     st.session_state.generated_videos[-1]["status"] = "completed"
+                                finished = True
                                 break
                             elif status == "failed":
                                 error_msg = status_info.get("error", "未知错误")
                                 st.error(f"❌ 视频生成失败: {error_msg}")
+                                finished = True
                                 break
-                            
-                            # 如果遇到并发限制，增加等待时间
-                            if warning and "并发限制" in warning:
-                                time.sleep(5)  # 并发限制时等待 5 秒
-                            else:
-                                time.sleep(2)  # 正常情况每 2 秒查询一次
                         
-                        if attempt >= max_attempts - 1:
+                        if not finished:
                             st.warning("⏰ 查询超时，请稍后手动刷新状态")
-                        else:
-                            st.warning("⏰ 生成时间较长，请稍后刷新页面查看结果")
                     else:
                         error_msg = result.get('message', '生成失败')
                         error_detail = result.get('detail', result.get('error', ''))
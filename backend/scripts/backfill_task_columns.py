@@ -0,0 +1,111 @@
+"""
+为 video_generations 添加 req_key / version 列并从 metadata 回填
+新版本按列读取 req_key（查询任务状态时直接使用正确的 req_key）。应用启动时会自动添加列和索引，
+本脚本负责把历史记录 metadata 中的值回填到新列（未回填的记录仍按 metadata 读取），可在部署后运行。
+先添加列和索引（已存在时跳过），再按 id 分批回填，每批一个事务，可重复执行。
+
+用法：
+    python scripts/backfill_task_columns.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import and_, bindparam, select, text, update
+
+from backend.database import SCHEMA_MIGRATIONS, SessionLocal, VideoGeneration
+
+
+def ensure_columns(db):
+    for statement in SCHEMA_MIGRATIONS:
+        db.execute(text(statement))
+    db.commit()
+
+
+def backfill(batch_size: int, dry_run: bool):
+    if not SessionLocal:
+        print("[ERROR] 数据库未配置（SUPABASE_DB_URL 未设置）")
+        return
+
+    stats = {"rows": 0, "req_key": 0, "version": 0}
+    started = time.time()
+    last_id = 0
+    table = VideoGeneration.__table__
+
+    db = SessionLocal()
+    try:
+        if dry_run:
+            print("[INFO] --dry-run：不添加列，假设列已存在")
+        else:
+            ensure_columns(db)
+            print("[INFO] req_key / version 列和索引已就绪")
+    finally:
+        db.close()
+
+    while True:
+        db = SessionLocal()
+        try:
+            # 只查询需要的列，按 id 分页（不使用 OFFSET）
+            rows = db.execute(
+                select(VideoGeneration.id, VideoGeneration.req_key, VideoGeneration.version, VideoGeneration.extra_metadata)
+                .where(and_(
+                    VideoGeneration.id > last_id,
+                    VideoGeneration.extra_metadata.isnot(None),
+                    (VideoGeneration.req_key.is_(None)) | (VideoGeneration.version.is_(None))
+                ))
+                .order_by(VideoGeneration.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                metadata = row.extra_metadata if isinstance(row.extra_metadata, dict) else {}
+                req_key = row.req_key or metadata.get("req_key")
+                version = row.version or metadata.get("version")
+                if req_key == row.req_key and version == row.version:
+                    continue
+                stats["req_key"] += req_key != row.req_key
+                stats["version"] += version != row.version
+                updates.append({"_id": row.id, "req_key": req_key, "version": version})
+
+            if updates and not dry_run:
+                db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("_id"))
+                    .values(req_key=bindparam("req_key"), version=bindparam("version")),
+                    updates
+                )
+                db.commit()
+            stats["rows"] += len(updates)
+            print(f"[INFO] 已处理到 id={last_id}，本批回填 {len(updates)} 行")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    action = "将回填" if dry_run else "已回填"
+    print(
+        f"[SUCCESS] {action} {stats['rows']} 行（req_key {stats['req_key']} 个，version {stats['version']} 个），"
+        f"耗时 {time.time() - started:.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="添加 req_key / version 列并从 metadata 回填")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批处理的行数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不修改数据库")
+    args = parser.parse_args()
+    backfill(args.batch_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
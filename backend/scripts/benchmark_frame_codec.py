@@ -0,0 +1,85 @@
+"""
+首帧 base64 处理微基准
+对比 generate_video 原有的多次复制处理流程与 frame_codec.decode_base64_frame
+
+用法：
+    python scripts/benchmark_frame_codec.py [--size-mb 3] [--runs 20]
+"""
+import argparse
+import base64
+import io
+import re
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.frame_codec import decode_base64_frame
+
+
+def legacy_process(first_frame: str) -> str:
+    """原有处理流程（split / strip / re.sub / re.match / 补齐填充）"""
+    base64_data = first_frame
+    if "," in base64_data:
+        base64_data = base64_data.split(",")[-1]
+    base64_data = base64_data.strip()
+    base64_data = re.sub(r'\s+', '', base64_data)
+    if not re.match(r'^[A-Za-z0-9+/=]+$', base64_data):
+        raise ValueError("base64 数据包含非法字符")
+    if len(base64_data) % 4 != 0:
+        base64_data += "=" * (4 - (len(base64_data) % 4))
+    return base64_data
+
+
+def make_frame(size_mb: float) -> str:
+    """构造指定大小的 PNG data URL（随机噪声，几乎不可压缩）"""
+    import os
+    from PIL import Image
+
+    side = int((size_mb * 1024 * 1024 / 3) ** 0.5)
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=0)
+    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    # 模拟前端换行的 base64
+    wrapped = "\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+    return "data:image/png;base64," + wrapped
+
+
+def peak_memory(func, *args) -> int:
+    """函数执行期间的峰值内存（字节）"""
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="首帧 base64 处理微基准")
+    parser.add_argument("--size-mb", type=float, default=3.0, help="图片大小（MB）")
+    parser.add_argument("--runs", type=int, default=20, help="每种方式的运行次数")
+    args = parser.parse_args()
+
+    frame = make_frame(args.size_mb)
+    max_bytes = 64 * 1024 * 1024
+    print(f"首帧 data URL 长度: {len(frame) / 1024 / 1024:.2f}MB")
+
+    legacy = timeit.timeit(lambda: legacy_process(frame), number=args.runs) / args.runs
+    # 新流程额外完成了解码和读取尺寸，为了对比公平，同时给出 legacy + b64decode 的时间
+    legacy_decode = timeit.timeit(
+        lambda: base64.b64decode(legacy_process(frame)), number=args.runs
+    ) / args.runs
+    codec = timeit.timeit(lambda: decode_base64_frame(frame, max_bytes), number=args.runs) / args.runs
+
+    print(f"原有流程（仅校验）:     {legacy * 1000:8.2f} ms, 峰值内存 {peak_memory(legacy_process, frame) / 1024 / 1024:6.2f}MB")
+    print(f"原有流程 + 解码:        {legacy_decode * 1000:8.2f} ms")
+    print(f"decode_base64_frame:   {codec * 1000:8.2f} ms, 峰值内存 {peak_memory(decode_base64_frame, frame, max_bytes) / 1024 / 1024:6.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+将历史记录中内联的首帧/尾帧 base64 数据迁移到图片存储
+video_generations.first_frame_url / last_frame_url 中的 base64（data URL）保存到 frame_store
+（对象存储或本地磁盘），记录中改为保存图片地址。按 id 分批处理，每批一个事务，可重复执行。
+
+用法：
+    python scripts/migrate_frames_to_store.py [--batch-size 50] [--dry-run] [--clear-invalid]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import and_, bindparam, not_, or_, select, update
+
+from backend.database import SessionLocal, VideoGeneration
+from backend.frame_codec import FrameDecodeError
+from backend.frame_store import frame_store, FRAMES_ROUTE
+from config import FIRST_FRAME_MAX_BYTES
+
+FRAME_COLUMNS = ("first_frame_url", "last_frame_url")
+
+# 迁移时允许的最大图片大小（历史数据可能超过当前上传限制）
+MIGRATION_MAX_BYTES = max(FIRST_FRAME_MAX_BYTES, 50 * 1024 * 1024)
+
+
+def _inline_condition(column):
+    """列中保存的是内联图片数据（不是 URL）"""
+    return and_(
+        column.isnot(None),
+        column != "",
+        not_(column.like("http%")),
+        not_(column.like(f"{FRAMES_ROUTE}/%")),
+    )
+
+
+async def _externalize_row(row, clear_invalid: bool, stats: dict) -> dict:
+    """迁移一行中的图片列，返回需要更新的列值"""
+    values = {}
+    for name in FRAME_COLUMNS:
+        value = getattr(row, name)
+        try:
+            reference = await frame_store.externalize(value, MIGRATION_MAX_BYTES)
+        except FrameDecodeError as e:
+            stats["invalid"] += 1
+            print(f"[WARN] id={row.id} {name} 不是有效图片: {e.detail}")
+            if clear_invalid:
+                values[name] = None
+            continue
+        if reference != value:
+            stats["frames"] += 1
+            stats["bytes_removed"] += len(value) - len(reference)
+            values[name] = reference
+    return values
+
+
+async def migrate(batch_size: int, dry_run: bool, clear_invalid: bool):
+    if not SessionLocal:
+        print("[ERROR] 数据库未配置（SUPABASE_DB_URL 未设置）")
+        return
+
+    stats = {"rows": 0, "frames": 0, "invalid": 0, "bytes_removed": 0}
+    started = time.time()
+    last_id = 0
+    condition = or_(*(_inline_condition(getattr(VideoGeneration, name)) for name in FRAME_COLUMNS))
+
+    while True:
+        db = SessionLocal()
+        try:
+            # 只查询需要的列，按 id 分页（不使用 OFFSET）
+            rows = db.execute(
+                select(VideoGeneration.id, VideoGeneration.first_frame_url, VideoGeneration.last_frame_url)
+                .where(and_(VideoGeneration.id > last_id, condition))
+                .order_by(VideoGeneration.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                values = await _externalize_row(row, clear_invalid, stats)
+                if values:
+                    updates.append({"_id": row.id, **{name: values.get(name, getattr(row, name)) for name in FRAME_COLUMNS}})
+
+            if updates and not dry_run:
+                db.execute(
+                    update(VideoGeneration.__table__)
+                    .where(VideoGeneration.__table__.c.id == bindparam("_id"))
+                    .values(first_frame_url=bindparam("first_frame_url"), last_frame_url=bindparam("last_frame_url")),
+                    updates
+                )
+                db.commit()
+            stats["rows"] += len(updates)
+            print(f"[INFO] 已处理到 id={last_id}，本批更新 {len(updates)} 行")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    action = "将更新" if dry_run else "已更新"
+    print(
+        f"[SUCCESS] {action} {stats['rows']} 行，迁移 {stats['frames']} 张图片，"
+        f"记录减少 {stats['bytes_removed'] / (1024 * 1024):.1f}MB，无效数据 {stats['invalid']} 个，"
+        f"耗时 {time.time() - started:.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将历史记录中的 base64 图片迁移到图片存储")
+    parser.add_argument("--batch-size", type=int, default=50, help="每批处理的行数（每行可能包含数 MB 数据）")
+    parser.add_argument("--dry-run", action="store_true", help="只保存图片并统计，不更新数据库")
+    parser.add_argument("--clear-invalid", action="store_true", help="将无法解析为图片的数据置空")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.dry_run, args.clear_invalid))
+
+
+if __name__ == "__main__":
+    main()
@@ -50,6 +50,10 @@ CREATE TABLE IF NOT EXISTS video_generations (
     created_at TIMESTAMP DEFAULT NOW(),
     completed_at TIMESTAMP,
     
+    -- 即梦任务参数
+    req_key VARCHAR(100),
+    version VARCHAR(20),
+    
     -- 扩展元数据
     metadata JSONB,
     
@@ -64,6 +68,14 @@ CREATE INDEX IF NOT EXISTS idx_video_generations_task_id ON video_generations(ta
 CREATE INDEX IF NOT EXISTS idx_video_generations_user_id ON video_generations(user_id);
 CREATE INDEX IF NOT EXISTS idx_video_generations_status ON video_generations(status);
 CREATE INDEX IF NOT EXISTS idx_video_generations_created_at ON video_generations(created_at DESC);
+-- 未结束任务（超时清理、启动时恢复跟踪）
+CREATE INDEX IF NOT EXISTS idx_video_generations_active ON video_generations(created_at) WHERE status IN ('pending', 'processing');
+
+-- 已有表：添加 req_key / version 列（旧记录运行 scripts/backfill_task_columns.py 从 metadata 回填）
+ALTER TABLE video_generations ADD COLUMN IF NOT EXISTS req_key VARCHAR(100);
+ALTER TABLE video_generations ADD COLUMN IF NOT EXISTS version VARCHAR(20);
+CREATE INDEX IF NOT EXISTS idx_video_generations_req_key ON video_generations(req_key);
+CREATE INDEX IF NOT EXISTS idx_video_generations_version ON video_generations(version);
 
 -- 3. 创建资产管理表（可选，如果还没有）
 CREATE TABLE IF NOT EXISTS assets (
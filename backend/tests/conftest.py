@@ -0,0 +1,43 @@
+"""
+测试公共配置
+- 把后端目录加入 sys.path（与 api.py 相同的导入方式：config、backend.*）
+- 不连接真实数据库：db_engine fixture 使用临时 SQLite 文件替换 database.engine / SessionLocal
+- 每个测试结束后检查数据库会话泄漏（check_session_leaks），泄漏时该测试报错
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# 优先于 .env（load_dotenv 不覆盖已有的环境变量），导入 database 时不连接真实数据库
+os.environ["SUPABASE_DB_URL"] = ""
+os.environ["DATABASE_URL"] = ""
+# 记录泄漏会话的获取位置
+os.environ["DB_SESSION_LEAK_CHECK"] = "true"
+
+
+@pytest.fixture(autouse=True)
+def no_session_leaks():
+    """测试结束时所有数据库会话都应已关闭、连接已归还"""
+    yield
+    from backend.database import check_session_leaks
+    check_session_leaks()
+
+
+@pytest.fixture
+def db_engine(tmp_path, monkeypatch):
+    """临时 SQLite 数据库（已建表）"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from backend import database
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    yield engine
+    engine.dispose()
@@ -0,0 +1,40 @@
+"""批量生成接口：单个条目提交出错时仍返回该条目的结果和最后的汇总行"""
+import json
+
+from fastapi.testclient import TestClient
+
+from backend import api
+
+
+def test_submit_errors_are_reported_per_item(monkeypatch):
+    access_key = "ak-batch-submit-error"
+
+    async def prepare(request):
+        return api.PreparedSubmission(
+            request, access_key, "sk", "jimeng_ti2v", "3.5pro", "1080p", request.prompt,
+            frames=121, seed=-1, image_urls=["https://cdn/frame.jpg"], binary_data_base64=None,
+            first_frame_ref="https://cdn/frame.jpg", rag_references=None
+        )
+
+    async def finalize(prepared):
+        pass
+
+    async def broken_run(lane, ticket):
+        raise RuntimeError("scheduler broken")
+
+    monkeypatch.setattr(api, "_prepare_submission", prepare)
+    monkeypatch.setattr(api, "_finalize_submission", finalize)
+    monkeypatch.setattr(api.submission_scheduler, "_run", broken_run)
+
+    response = TestClient(api.app).post(
+        "/api/v1/video/generate/batch",
+        json={"items": [{"prompt": "a cat"}, {"prompt": "a dog"}]}
+    )
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1]
+    assert all(not line["success"] and line["error"] == "scheduler broken" for line in lines[:-1])
+    assert lines[-1] == {"done": True, "total": 2, "submitted": 0, "queued": 0, "failed": 2}
+    # 预留的队列位置已在 submit 中使用，没有残留
+    assert api.submission_scheduler._lanes[access_key].reserved == 0
@@ -0,0 +1,28 @@
+"""数据库会话泄漏检查"""
+import pytest
+
+from backend import database
+from backend.database import SessionLeakError, check_session_leaks, get_db, session_scope
+
+
+def test_leaked_session_is_reported(db_engine):
+    # 手动获取依赖注入的会话后不关闭，会话由垃圾回收释放
+    sessions = get_db()
+    next(sessions)
+    del sessions
+
+    with pytest.raises(SessionLeakError) as excinfo:
+        check_session_leaks()
+    assert "test_leaked_session_is_reported" in str(excinfo.value)
+    # 已报告的泄漏不会重复报告
+    check_session_leaks()
+
+
+def test_open_session_is_reported(db_engine):
+    with session_scope():
+        with pytest.raises(SessionLeakError):
+            check_session_leaks()
+        # 不要求会话已关闭时（如请求进行中）只检查泄漏
+        check_session_leaks(require_closed=False)
+    check_session_leaks()
+    assert database.get_session_stats()["open"] == 0
@@ -0,0 +1,97 @@
+"""提交去重：并发合并、窗口内复用、失败不缓存、执行提交的请求被取消"""
+import asyncio
+
+import pytest
+
+from backend.idempotency import SubmissionDeduplicator
+
+
+def is_success(result):
+    return result.get("success", False)
+
+
+def test_concurrent_requests_are_coalesced_and_replayed():
+    deduplicator = SubmissionDeduplicator(window_seconds=60)
+    calls = []
+
+    async def submit():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"success": True, "task_id": "t1"}
+
+    async def scenario():
+        first, second = await asyncio.gather(
+            deduplicator.run("key", submit, is_success),
+            deduplicator.run("key", submit, is_success)
+        )
+        replay = await deduplicator.run("key", submit, is_success)
+        return first, second, replay
+
+    first, second, replay = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert first == ({"success": True, "task_id": "t1"}, False)
+    assert second == ({"success": True, "task_id": "t1"}, True)
+    assert replay == ({"success": True, "task_id": "t1"}, True)
+    assert deduplicator.stats()["coalesced"] == 1
+    assert deduplicator.stats()["replayed"] == 1
+
+
+def test_failed_results_are_not_replayed():
+    deduplicator = SubmissionDeduplicator(window_seconds=60)
+    results = [{"success": False}, {"success": True, "task_id": "t2"}]
+
+    async def submit():
+        return results.pop(0)
+
+    async def scenario():
+        failed = await deduplicator.run("key", submit, is_success)
+        retried = await deduplicator.run("key", submit, is_success)
+        return failed, retried
+
+    failed, retried = asyncio.run(scenario())
+    assert failed == ({"success": False}, False)
+    assert retried == ({"success": True, "task_id": "t2"}, False)
+
+
+def test_errors_are_shared_with_waiters():
+    deduplicator = SubmissionDeduplicator(window_seconds=60)
+
+    async def submit():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        return await asyncio.gather(
+            deduplicator.run("key", submit, is_success),
+            deduplicator.run("key", submit, is_success),
+            return_exceptions=True
+        )
+
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, RuntimeError) and isinstance(second, RuntimeError)
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    deduplicator = SubmissionDeduplicator(window_seconds=60)
+    calls = []
+
+    async def submit():
+        calls.append(1)
+        await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+        return {"success": True, "task_id": f"t{len(calls)}"}
+
+    async def scenario():
+        leader = asyncio.ensure_future(deduplicator.run("key", submit, is_success))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(deduplicator.run("key", submit, is_success))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    result = asyncio.run(scenario())
+    # 等待者重新执行了提交
+    assert result == ({"success": True, "task_id": "t2"}, False)
+    assert len(calls) == 2
+    assert deduplicator.stats()["inflight"] == 0
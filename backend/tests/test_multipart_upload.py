@@ -0,0 +1,100 @@
+"""分片上传续传：中断后再次上传只上传剩余分片，upload_id 失效时从头上传"""
+import asyncio
+
+import pytest
+
+from backend.multipart_upload import MultipartUploader
+
+
+class UploadMissing(Exception):
+    pass
+
+
+class FakeStorage:
+    """记录分片调用的存储（实现 StorageService 的同步分片接口）"""
+
+    name = "fake"
+    bucket_name = "bucket"
+
+    def __init__(self):
+        self.fail_parts = set()
+        self.missing_uploads = set()
+        self.created = 0
+        self.uploaded = []
+        self.completed = None
+
+    async def _call(self, fn, *args):
+        return fn(*args)
+
+    def _create_multipart_upload(self, object_key, content_type):
+        self.created += 1
+        return f"upload-{self.created}"
+
+    def _upload_part(self, object_key, upload_id, part_number, data):
+        if upload_id in self.missing_uploads:
+            raise UploadMissing(upload_id)
+        if part_number in self.fail_parts:
+            raise RuntimeError(f"part {part_number} failed")
+        self.uploaded.append((upload_id, part_number, data))
+        return {"PartNumber": part_number, "ETag": f"etag-{part_number}"}
+
+    def _complete_multipart_upload(self, object_key, upload_id, parts):
+        self.completed = (upload_id, parts)
+
+    def _abort_multipart_upload(self, object_key, upload_id):
+        pass
+
+    def _is_upload_missing(self, error):
+        return isinstance(error, UploadMissing)
+
+    def get_object_url(self, object_key):
+        return f"https://bucket/{object_key}"
+
+
+@pytest.fixture
+def uploader(tmp_path):
+    return MultipartUploader(part_size=4, concurrency=2, part_max_attempts=1, state_dir=tmp_path / "state")
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"0123456789")  # 3 个分片：4 + 4 + 2 字节
+    return path
+
+
+def test_interrupted_upload_resumes_remaining_parts(uploader, video_file):
+    storage = FakeStorage()
+    storage.fail_parts = {3}
+    with pytest.raises(RuntimeError):
+        asyncio.run(uploader.upload_file(storage, video_file, "videos/v.mp4", "video/mp4"))
+    assert sorted(number for _, number, _ in storage.uploaded) == [1, 2]
+
+    storage.fail_parts = set()
+    storage.uploaded = []
+    url = asyncio.run(uploader.upload_file(storage, video_file, "videos/v.mp4", "video/mp4"))
+
+    assert url == "https://bucket/videos/v.mp4"
+    assert storage.created == 1
+    assert storage.uploaded == [("upload-1", 3, b"89")]
+    assert storage.completed == ("upload-1", [{"PartNumber": n, "ETag": f"etag-{n}"} for n in (1, 2, 3)])
+    assert uploader.metrics("fake").resumed_parts == 2
+    # 上传完成后删除续传状态
+    assert list(uploader.state_dir.iterdir()) == []
+
+
+def test_expired_upload_id_restarts_from_scratch(uploader, video_file):
+    storage = FakeStorage()
+    storage.fail_parts = {3}
+    with pytest.raises(RuntimeError):
+        asyncio.run(uploader.upload_file(storage, video_file, "videos/v.mp4", "video/mp4"))
+
+    # 存储端已清理之前的分片上传
+    storage.fail_parts = set()
+    storage.missing_uploads = {"upload-1"}
+    storage.uploaded = []
+    asyncio.run(uploader.upload_file(storage, video_file, "videos/v.mp4", "video/mp4"))
+
+    assert storage.created == 2
+    assert sorted(number for _, number, _ in storage.uploaded) == [1, 2, 3]
+    assert storage.completed[0] == "upload-2"
@@ -0,0 +1,63 @@
+"""任务状态跟踪：转存中的任务不被清理，重启后重新提交未完成的转存"""
+import asyncio
+import time
+from datetime import datetime
+
+from backend import storage, status_tracker as tracker_module
+from backend.database import VideoGeneration, session_scope
+from backend.status_tracker import PHASE_ARCHIVING, StatusTracker, TERMINAL_RETENTION_SECONDS
+
+
+class FakeStorage:
+    def get_object_url(self, object_key):
+        return f"https://bucket.example.com/{object_key}"
+
+
+def make_tracker():
+    return StatusTracker(poll_interval=3, concurrency=1, task_timeout=300)
+
+
+def add_generation(task_id, status, video_url):
+    with session_scope() as db:
+        db.add(VideoGeneration(
+            task_id=task_id, user_id=1, prompt="a cat", duration=5, status=status,
+            video_url=video_url, created_at=datetime.utcnow()
+        ))
+        db.commit()
+
+
+def test_hydrate_resubmits_completed_tasks_with_upstream_urls(db_engine, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(storage, "get_storage_service", lambda name="primary": FakeStorage())
+    monkeypatch.setattr(
+        tracker_module.video_archiver, "submit",
+        lambda task_id, source_url, video_name, **callbacks: submitted.append((task_id, source_url))
+    )
+    add_generation("upstream", "completed", "https://jimeng.example.com/v.mp4?sign=1")
+    add_generation("archived", "completed", "https://bucket.example.com/videos/archived.mp4")
+    add_generation("running", "processing", None)
+
+    tracker = make_tracker()
+    asyncio.run(tracker._hydrate())
+
+    assert submitted == [("upstream", "https://jimeng.example.com/v.mp4?sign=1")]
+    state = tracker.get("upstream")
+    assert state.phase == PHASE_ARCHIVING and state.finalizing
+    # 数据库中已是 completed，不重复写入
+    assert "upstream" not in tracker._db_updates
+    assert tracker.get("archived") is None
+    assert not tracker.get("running").terminal
+
+
+def test_archiving_tasks_are_not_expired(monkeypatch):
+    monkeypatch.setattr(tracker_module.video_archiver, "submit", lambda *args, **kwargs: None)
+    tracker = make_tracker()
+    archiving = tracker.track("archiving")
+    tracker._archive(archiving, "https://jimeng.example.com/a.mp4")
+    done = tracker.track("done")
+    tracker._set(done, "completed", "completed", 100, video_url="https://bucket.example.com/d.mp4")
+
+    tracker._expire(time.time() + TERMINAL_RETENTION_SECONDS + 1)
+
+    assert tracker.get("archiving") is archiving
+    assert tracker.get("done") is None
@@ -0,0 +1,84 @@
+"""提交调度：并发上限、排队、释放后继续提交、队列位置预留"""
+import asyncio
+
+import pytest
+
+from backend.submission_scheduler import (
+    QueueFullError, SubmissionScheduler, TICKET_FAILED, TICKET_QUEUED, TICKET_SUBMITTED
+)
+
+
+def job(task_id):
+    async def submit():
+        return task_id
+    return submit
+
+
+def make_scheduler(max_queue_size=2):
+    return SubmissionScheduler(max_inflight=1, inflight_ttl_seconds=600, max_queue_size=max_queue_size)
+
+
+def test_queued_submission_runs_after_release():
+    scheduler = make_scheduler()
+
+    async def scenario():
+        first = await scheduler.submit("ak", job("t1"))
+        second = await scheduler.submit("ak", job("t2"))
+        assert first.status == TICKET_SUBMITTED and first.task_id == "t1"
+        assert second.status == TICKET_QUEUED
+        assert scheduler.queue_position(second) == 1
+
+        scheduler.release("t1")
+        await asyncio.wait_for(second.done.wait(), 1)
+        return second
+
+    second = asyncio.run(scenario())
+    assert second.status == TICKET_SUBMITTED and second.task_id == "t2"
+
+
+def test_failed_job_frees_the_slot():
+    scheduler = make_scheduler()
+
+    async def broken():
+        raise RuntimeError("upstream error")
+
+    async def scenario():
+        failed = await scheduler.submit("ak", broken)
+        ok = await scheduler.submit("ak", job("t1"))
+        return failed, ok
+
+    failed, ok = asyncio.run(scenario())
+    assert failed.status == TICKET_FAILED and failed.error == "upstream error"
+    assert ok.status == TICKET_SUBMITTED
+
+
+def test_full_queue_rejects_submission():
+    scheduler = make_scheduler(max_queue_size=1)
+
+    async def scenario():
+        await scheduler.submit("ak", job("t1"))
+        await scheduler.submit("ak", job("t2"))
+        with pytest.raises(QueueFullError):
+            await scheduler.submit("ak", job("t3"))
+
+    asyncio.run(scenario())
+
+
+def test_reserve_waits_for_space():
+    scheduler = make_scheduler(max_queue_size=1)
+
+    async def scenario():
+        await scheduler.submit("ak", job("t1"))
+        await scheduler.reserve("ak")
+        waiting = asyncio.ensure_future(scheduler.reserve("ak"))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        # 归还预留的位置后，等待中的预留继续
+        scheduler.cancel_reservation("ak")
+        await asyncio.wait_for(waiting, 1)
+        ticket = await scheduler.submit("ak", job("t2"), reserved=True)
+        assert ticket.status == TICKET_QUEUED
+        assert scheduler._lanes["ak"].reserved == 0
+
+    asyncio.run(scenario())
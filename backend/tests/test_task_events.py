@@ -0,0 +1,69 @@
+"""任务状态事件：订阅、Last-Event-ID 补发、连接数上限"""
+import asyncio
+
+import pytest
+
+from backend.task_events import TaskEventBus, TooManyConnectionsError
+
+
+def make_bus(buffer_size=10):
+    return TaskEventBus(buffer_size=buffer_size, max_connections_per_user=2)
+
+
+def test_replay_returns_missed_events_for_subscribed_tasks():
+    bus = make_bus()
+    bus.publish("t1", {"task_id": "t1", "version": 1})
+    last_seen = bus.publish("t2", {"task_id": "t2", "version": 1})
+    bus.publish("t1", {"task_id": "t1", "version": 2})
+    bus.publish("t2", {"task_id": "t2", "version": 2})
+
+    events, complete = bus.replay(last_seen, ["t1"])
+    assert complete
+    assert [(event.task_id, event.data["version"]) for event in events] == [("t1", 2)]
+
+
+def test_replay_is_incomplete_after_buffer_overrun():
+    bus = make_bus(buffer_size=2)
+    for version in range(1, 5):
+        bus.publish("t1", {"task_id": "t1", "version": version})
+
+    events, complete = bus.replay(1, ["t1"])
+    assert not complete
+    assert [event.data["version"] for event in events] == [3, 4]
+
+
+def test_event_ids_from_another_epoch_are_ignored():
+    bus = make_bus()
+    event_id = bus.publish("t1", {"task_id": "t1"})
+    assert bus.parse_event_id(bus.format_event_id(event_id)) == event_id
+    assert bus.parse_event_id(f"{bus.epoch - 1}-{event_id}") is None
+    assert bus.parse_event_id("garbage") is None
+
+
+def test_subscribers_receive_only_their_tasks():
+    bus = make_bus()
+
+    async def scenario():
+        with bus.subscribe("user", ["t1"]) as subscription:
+            bus.publish("t2", {"task_id": "t2"})
+            bus.publish("t1", {"task_id": "t1"})
+            event = await subscription.next(timeout=1)
+            assert event.task_id == "t1"
+            assert await subscription.next(timeout=0.01) is None
+        assert bus.stats()["subscriptions"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_connections_per_user_are_limited():
+    bus = make_bus()
+
+    async def scenario():
+        first = bus.subscribe("user", ["t1"])
+        bus.subscribe("user", ["t1"])
+        with pytest.raises(TooManyConnectionsError):
+            bus.subscribe("user", ["t1"])
+        first.close()
+        bus.subscribe("user", ["t1"])
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+"""任务状态转换表与条件状态更新"""
+from datetime import datetime
+
+import pytest
+
+from backend.database import VideoGeneration, session_scope
+from backend.task_status import (
+    STATUS_COMPLETED, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING, can_transition
+)
+from backend.video_history import VideoHistoryService
+
+STATUSES = (STATUS_PENDING, STATUS_PROCESSING, STATUS_COMPLETED, STATUS_FAILED)
+ALLOWED = {
+    (STATUS_PENDING, STATUS_PROCESSING),
+    (STATUS_PENDING, STATUS_COMPLETED),
+    (STATUS_PENDING, STATUS_FAILED),
+    (STATUS_PROCESSING, STATUS_COMPLETED),
+    (STATUS_PROCESSING, STATUS_FAILED),
+}
+
+
+@pytest.mark.parametrize("current", STATUSES)
+@pytest.mark.parametrize("new", STATUSES)
+def test_transition_table(current, new):
+    assert can_transition(current, new) == ((current, new) in ALLOWED)
+
+
+def add_generation(task_id, status, video_url=None):
+    with session_scope() as db:
+        db.add(VideoGeneration(task_id=task_id, user_id=1, prompt="a cat", duration=5, status=status, video_url=video_url))
+        db.commit()
+
+
+def transition(task_id, status, **kwargs):
+    with session_scope() as db:
+        row = VideoHistoryService.transition_status(db, task_id, status, **kwargs)
+        db.commit()
+        return row
+
+
+def load(task_id):
+    with session_scope() as db:
+        row = db.query(VideoGeneration).filter(VideoGeneration.task_id == task_id).one()
+        db.expunge(row)
+        return row
+
+
+@pytest.mark.parametrize("current", STATUSES)
+@pytest.mark.parametrize("new", STATUSES)
+def test_transition_status_follows_table(db_engine, current, new):
+    add_generation("t1", current)
+    row = transition("t1", new, error_message="boom" if new == STATUS_FAILED else None)
+
+    assert (row is not None) == ((current, new) in ALLOWED)
+    assert load("t1").status == (new if row is not None else current)
+
+
+def test_completion_sets_completed_at_once_and_allows_archived_url(db_engine):
+    add_generation("t2", STATUS_PROCESSING)
+    first_time = datetime(2026, 1, 1, 12, 0, 0)
+    assert transition("t2", STATUS_COMPLETED, video_url="https://jimeng/v.mp4", video_name="t2.mp4", now=first_time)
+
+    # 已完成的记录只允许更新视频地址（转存后替换为存储地址），completed_at / video_name 保持不变
+    assert transition("t2", STATUS_COMPLETED, video_url="https://jimeng/v.mp4") is None
+    assert transition("t2", STATUS_COMPLETED, video_url="https://bucket/v.mp4", video_name="other.mp4",
+                      now=datetime(2026, 1, 2)) is not None
+    row = load("t2")
+    assert row.video_url == "https://bucket/v.mp4"
+    assert row.video_name == "t2.mp4"
+    assert row.completed_at == first_time
+    assert transition("t2", STATUS_FAILED, error_message="late failure") is None
@@ -0,0 +1,145 @@
+"""生成记录延迟写入：写入前 / 写入中的状态更新、失败重试和关闭时保存"""
+import asyncio
+import threading
+from datetime import datetime
+
+from backend import write_behind
+from backend.database import VideoGeneration, session_scope
+from backend.write_behind import GenerationWriteBehind
+
+
+def make_writer(tmp_path, batch_size=10):
+    return GenerationWriteBehind(
+        batch_size=batch_size,
+        flush_interval_ms=10,
+        max_pending=100,
+        dead_letter_path=str(tmp_path / "unwritten.jsonl")
+    )
+
+
+def record(task_id):
+    return {"task_id": task_id, "prompt": "a cat", "duration": 5, "req_key": "jimeng_ti2v", "version": "3.5pro"}
+
+
+def load_row(task_id):
+    with session_scope() as db:
+        row = db.query(VideoGeneration).filter(VideoGeneration.task_id == task_id).first()
+        if row is not None:
+            db.expunge(row)
+        return row
+
+
+def test_update_before_flush_is_inserted(db_engine, tmp_path):
+    writer = make_writer(tmp_path)
+    completed_at = datetime(2026, 1, 1, 12, 0, 0)
+
+    async def scenario():
+        await writer.add(record("t1"))
+        assert writer.update(
+            "t1", status="completed", video_url="https://cdn/v.mp4", video_name="v.mp4",
+            video_size=123, completed_at=completed_at
+        )
+        assert writer.get("t1").video_url == "https://cdn/v.mp4"
+        assert await writer.flush(drain=True)
+
+    asyncio.run(scenario())
+    row = load_row("t1")
+    assert row.status == "completed"
+    assert row.video_url == "https://cdn/v.mp4"
+    assert row.video_name == "v.mp4"
+    assert row.video_size == 123
+    assert row.completed_at == completed_at
+    assert writer.get("t1") is None
+
+
+def test_update_while_writing_is_applied_after_insert(db_engine, tmp_path, monkeypatch):
+    writer = make_writer(tmp_path)
+    started = threading.Event()
+    proceed = threading.Event()
+    write_sync = writer._write_sync
+
+    def slow_write(batch):
+        started.set()
+        proceed.wait(5)
+        return write_sync(batch)
+
+    monkeypatch.setattr(writer, "_write_sync", slow_write)
+
+    async def scenario():
+        await writer.add(record("t2"))
+        flushing = asyncio.ensure_future(writer.flush(drain=True))
+        await asyncio.to_thread(started.wait, 5)
+        assert writer.update("t2", status="failed", error_message="boom")
+        assert writer.get("t2").status == "failed"
+        proceed.set()
+        assert await flushing
+
+    asyncio.run(scenario())
+    row = load_row("t2")
+    assert row.status == "failed"
+    assert row.error_message == "boom"
+    assert row.completed_at is not None
+
+
+def test_failed_records_are_retried_with_backoff(db_engine, tmp_path, monkeypatch):
+    writer = make_writer(tmp_path)
+    write_sync = writer._write_sync
+    failures = {"left": write_behind.MAX_FLUSH_ATTEMPTS + 1}
+
+    def flaky_write(batch):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("database unavailable")
+        return write_sync(batch)
+
+    monkeypatch.setattr(writer, "_write_sync", flaky_write)
+
+    async def scenario():
+        await writer.add(record("t3"))
+        # 按批次重试 MAX_FLUSH_ATTEMPTS 次、再逐条写入一次都失败后仍留在缓冲区
+        for _ in range(write_behind.MAX_FLUSH_ATTEMPTS):
+            assert not await writer.flush()
+            pending = writer._pending["t3"]
+            # 未到重试时间的记录不会被立即重试
+            assert writer._take_batch() == []
+            pending.retry_at = 0
+        writer.update("t3", status="processing")
+        assert await writer.flush()
+
+    asyncio.run(scenario())
+    assert writer.stats()["pending"] == 0
+    assert writer.stats()["dead_lettered"] == 0
+    assert load_row("t3").status == "processing"
+
+
+def test_drain_saves_unwritable_records_and_reloads_them(db_engine, tmp_path, monkeypatch):
+    writer = make_writer(tmp_path)
+
+    def broken_write(batch):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(writer, "_write_sync", broken_write)
+    completed_at = datetime(2026, 1, 1, 12, 0, 0)
+
+    async def shutdown():
+        await writer.add(record("t4"))
+        writer.update("t4", status="completed", video_url="https://cdn/v4.mp4", completed_at=completed_at)
+        assert not await writer.flush(drain=True)
+
+    asyncio.run(shutdown())
+    assert writer.stats()["pending"] == 0
+    assert writer.stats()["dead_lettered"] == 1
+
+    restarted = make_writer(tmp_path)
+
+    async def restart():
+        assert restarted._load_dead_letters() == 1
+        assert restarted.get("t4").video_url == "https://cdn/v4.mp4"
+        assert await restarted.flush(drain=True)
+
+    asyncio.run(restart())
+    assert not (tmp_path / "unwritten.jsonl").exists()
+    row = load_row("t4")
+    assert row.status == "completed"
+    assert row.video_url == "https://cdn/v4.mp4"
+    assert row.completed_at == completed_at
@@ -202,6 +202,39 @@ export const useHistoryStore = defineStore('history', {
       this.videos = filtered
     },
 
+    /**
+     * 批量刷新未完成视频的状态（一次请求查询全部未完成任务）
+     * @returns 是否有任务在本次刷新中结束（完成或失败）
+     */
+    async refreshPendingStatuses(backendUrl: string): Promise<boolean> {
+      const pending = this.videos.filter(
+        v => v.task_id && (v.status === 'pending' || v.status === 'processing')
+      )
+      if (pending.length === 0) {
+        return false
+      }
+
+      const response = await $fetch<{ statuses: Record<string, { status: string; progress?: number; video_url?: string }> }>(
+        `${backendUrl}/api/v1/video/status/batch`,
+        { method: 'POST', body: { task_ids: pending.map(v => v.task_id) } }
+      )
+
+      let finished = false
+      for (const video of pending) {
+        const status = response.statuses?.[video.task_id]
+        if (!status || status.status === 'error') {
+          continue
+        }
+        video.status = status.status as VideoHistoryItem['status']
+        video.progress = status.progress ?? video.progress
+        video.video_url = status.video_url || video.video_url
+        if (status.status === 'completed' || status.status === 'failed') {
+          finished = true
+        }
+      }
+      return finished
+    },
+
     setFilters(filters: Partial<HistoryFilters>) {
       this.filters = { ...this.filters, ...filters }
     },
@@ -7,6 +7,7 @@ interface VideoGenerationRequest {
   width?: number
   height?: number
   first_frame?: string | null
+  first_frame_id?: string | null
   last_frame?: string | null
   seed?: number | null
   resolution?: '720p' | '1080p'
@@ -19,11 +20,30 @@ interface VideoGenerationResponse {
   message?: string
   error?: string
   video_url?: string
-  status?: 'pending' | 'processing' | 'done' | 'failed'
+  status?: 'queued' | 'pending' | 'processing' | 'done' | 'failed'
+  ticket_id?: string
+  queue_position?: number | null
+}
+
+interface QueueTicket {
+  ticket_id: string
+  status: 'queued' | 'submitting' | 'submitted' | 'failed'
+  queue_position?: number | null
+  task_id?: string | null
+  error?: string | null
+}
+
+interface FrameUploadResponse {
+  success: boolean
+  frame_id: string
+  url?: string | null
 }
 
 interface VideoStatus {
-  status: 'pending' | 'processing' | 'done' | 'failed'
+  status: 'pending' | 'processing' | 'completed' | 'failed' | 'error'
+  phase?: 'queued' | 'generating' | 'archiving' | 'completed' | 'failed'
+  progress?: number
+  version?: number
   video_url?: string
   message?: string
   error?: string
@@ -38,6 +58,26 @@ export const useVideoStore = defineStore('video', {
   }),
 
   actions: {
+    /**
+     * 上传首帧图片（仅上传一次，生成请求中通过 frame_id 引用）
+     * 上传失败时返回 null，调用方回退为直接发送 base64
+     */
+    async uploadFrame(dataUrl: string, backendUrl: string): Promise<string | null> {
+      try {
+        const blob = await (await fetch(dataUrl)).blob()
+        const formData = new FormData()
+        formData.append('file', blob, 'first_frame')
+        const response = await $fetch<FrameUploadResponse>(
+          `${backendUrl}/api/v1/frames`,
+          { method: 'POST', body: formData, timeout: 60000 }
+        )
+        return response.frame_id || null
+      } catch (error) {
+        console.warn('首帧上传失败，回退为 base64 提交:', error)
+        return null
+      }
+    },
+
     async generateVideo(params: {
       prompt: string
       duration: number
@@ -56,6 +96,18 @@ export const useVideoStore = defineStore('video', {
         const maxRetries = 3
         const retryDelay = 2000 // 2秒
 
+        // 同一次生成的所有重试共用一个幂等键，后端只会提交一次上游任务
+        const idempotencyKey = crypto.randomUUID()
+
+        // 首帧只上传一次，重试时仅发送 frame_id
+        let firstFrameId: string | null = null
+        if (params.firstFrame && !params.firstFrame.startsWith('http')) {
+          const dataUrl = params.firstFrame.startsWith('data:')
+            ? params.firstFrame
+            : `data:application/octet-stream;base64,${params.firstFrame}`
+          firstFrameId = await this.uploadFrame(dataUrl, params.backendUrl)
+        }
+
         for (let attempt = 0; attempt < maxRetries; attempt++) {
           try {
             // 根据分辨率设置宽高（仅支持1080p）
@@ -67,13 +119,15 @@ export const useVideoStore = defineStore('video', {
               `${params.backendUrl}/api/v1/video/generate`,
               {
                 method: 'POST',
+                headers: { 'Idempotency-Key': idempotencyKey },
                 body: {
                   prompt: params.prompt,
                   duration: params.duration,
                   fps: 24,
                   width: width,
                   height: height,
-                  first_frame: params.firstFrame,
+                  first_frame: firstFrameId ? null : params.firstFrame,
+                  first_frame_id: firstFrameId,
                   last_frame: params.lastFrame,
                   seed: null,
                   negative_prompt: null,
@@ -84,6 +138,13 @@ export const useVideoStore = defineStore('video', {
               }
             )
             
+            const onComplete = () => {
+              // 视频生成完成或失败后，触发历史记录刷新事件
+              setTimeout(() => {
+                window.dispatchEvent(new CustomEvent('video-status-updated'))
+              }, 1000)
+            }
+
             // 成功，跳出重试循环
             if (response.success && response.task_id) {
               this.currentVideo = response
@@ -92,12 +153,16 @@ export const useVideoStore = defineStore('video', {
               console.log('视频生成任务已提交:', response.task_id)
               
               // 开始轮询状态，完成后触发历史记录刷新
-              this.pollVideoStatus(response.task_id, params.backendUrl, () => {
-                // 视频生成完成或失败后，触发历史记录刷新事件
-                setTimeout(() => {
-                  window.dispatchEvent(new CustomEvent('video-status-updated'))
-                }, 1000)
-              })
+              this.watchVideoStatus(response.task_id, params.backendUrl, onComplete)
+              return response
+            } else if (response.success && response.ticket_id) {
+              // 并发已满，任务在后端队列中等待提交
+              this.currentVideo = response
+              this.videos.unshift(response)
+              
+              console.log('视频生成任务排队中:', response.ticket_id, '位置:', response.queue_position)
+              
+              this.pollQueueTicket(response.ticket_id, params.backendUrl, onComplete)
               return response
             } else {
               throw new Error(response.message || response.error || '生成失败')
@@ -137,12 +202,116 @@ export const useVideoStore = defineStore('video', {
       }
     },
 
-    async pollVideoStatus(taskId: string, backendUrl: string, onComplete?: () => void) {
-      const maxAttempts = 60 // 最多轮询 60 次（5分钟）
+    async pollQueueTicket(ticketId: string, backendUrl: string, onComplete?: () => void) {
+      const maxAttempts = 120 // 最多轮询 120 次（10分钟）
       let attempts = 0
 
       const poll = async () => {
         if (attempts >= maxAttempts) {
+          this.error = '排队超时，请稍后重试'
+          if (onComplete) onComplete()
+          return
+        }
+
+        try {
+          const ticket = await $fetch<QueueTicket>(
+            `${backendUrl}/api/v1/video/queue/${ticketId}`
+          )
+
+          if (ticket.status === 'submitted' && ticket.task_id) {
+            if (this.currentVideo) {
+              this.currentVideo.task_id = ticket.task_id
+              this.currentVideo.status = 'pending'
+              this.currentVideo.queue_position = null
+            }
+            // 已提交到即梦 API，转为轮询生成状态
+            this.watchVideoStatus(ticket.task_id, backendUrl, onComplete)
+            return
+          }
+
+          if (ticket.status === 'failed') {
+            this.error = ticket.error || '提交失败'
+            if (onComplete) onComplete()
+            return
+          }
+
+          if (this.currentVideo) {
+            this.currentVideo.queue_position = ticket.queue_position
+          }
+        } catch (error: any) {
+          if (error.statusCode === 404) {
+            this.error = '排队任务不存在或已过期'
+            if (onComplete) onComplete()
+            return
+          }
+        }
+
+        attempts++
+        setTimeout(poll, 5000) // 每 5 秒轮询一次
+      }
+
+      poll()
+    },
+
+    /**
+     * 订阅任务状态（SSE 推送），连接被拒绝或浏览器不支持时回退为轮询
+     */
+    watchVideoStatus(taskId: string, backendUrl: string, onComplete?: () => void) {
+      if (typeof EventSource === 'undefined') {
+        this.pollVideoStatus(taskId, backendUrl, onComplete)
+        return
+      }
+
+      const source = new EventSource(
+        `${backendUrl}/api/v1/video/status/stream?task_ids=${encodeURIComponent(taskId)}`
+      )
+      let finished = false
+
+      source.addEventListener('status', (event) => {
+        const status = JSON.parse((event as MessageEvent).data) as VideoStatus
+
+        if (status.status === 'completed' && status.video_url) {
+          finished = true
+          source.close()
+          if (this.currentVideo) {
+            this.currentVideo.video_url = status.video_url
+            this.currentVideo.status = 'done'
+          }
+          if (onComplete) onComplete()
+          return
+        }
+
+        if (status.status === 'failed' || status.status === 'error') {
+          finished = true
+          source.close()
+          this.error = status.message || status.error || '生成失败'
+          if (onComplete) onComplete()
+          return
+        }
+
+        if (this.currentVideo) {
+          this.currentVideo.status = status.phase === 'queued' ? 'pending' : 'processing'
+        }
+      })
+
+      source.onerror = () => {
+        // 网络中断时浏览器会自动重连（带 Last-Event-ID）；连接被拒绝（如连接数超限）时改为轮询
+        if (!finished && source.readyState === EventSource.CLOSED) {
+          this.pollVideoStatus(taskId, backendUrl, onComplete)
+        }
+      }
+    },
+
+    /**
+     * 长轮询任务状态：带上次的 version，状态未变化时后端等待变化或超时后再返回
+     */
+    async pollVideoStatus(taskId: string, backendUrl: string, onComplete?: () => void) {
+      const deadline = Date.now() + 5 * 60 * 1000 // 最多等待 5 分钟
+      const longPollWait = 25 // 单次请求最长等待（秒）
+      let since: number | undefined
+
+      const poll = async () => {
+        if (Date.now() >= deadline) {
           this.error = '生成超时，请稍后重试'
           if (onComplete) onComplete()
           return
@@ -150,7 +319,11 @@ export const useVideoStore = defineStore('video', {
 
         try {
           const status = await $fetch<VideoStatus>(
-            `${backendUrl}/api/v1/video/status/${taskId}`
+            `${backendUrl}/api/v1/video/status/${taskId}`,
+            {
+              query: since === undefined ? {} : { wait: longPollWait, since },
+              timeout: (longPollWait + 10) * 1000
+            }
           )
 
           // 处理不同的响应格式
@@ -179,14 +352,17 @@ export const useVideoStore = defineStore('video', {
             this.currentVideo.status = videoStatus === 'processing' ? 'processing' : 'pending'
           }
 
-          // 继续轮询
-          attempts++
-          setTimeout(poll, 5000) // 每 5 秒轮询一次
+          // 继续轮询：后端支持长轮询（返回 version）时立即发起下一次请求，否则每 5 秒轮询一次
+          if (status.version !== undefined) {
+            since = status.version
+            poll()
+          } else {
+            setTimeout(poll, 5000)
+          }
         } catch (error: any) {
           this.error = error.message || '查询状态失败'
-          // 即使出错也继续轮询，除非达到最大次数
-          attempts++
-          if (attempts < maxAttempts) {
+          // 即使出错也继续轮询，除非超过最长等待时间
+          if (Date.now() < deadline) {
             setTimeout(poll, 5000)
           } else if (onComplete) {
             onComplete()